@@ -0,0 +1 @@
+"""Benchmarks (run: python3 -m bench)"""
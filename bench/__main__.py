@@ -0,0 +1,9 @@
+"""Run all benchmarks"""
+
+import bench.bench_regs
+import bench.bench_startup
+import bench.bench_hexdump
+
+bench.bench_regs.main()
+bench.bench_startup.main()
+bench.bench_hexdump.main()
@@ -0,0 +1,29 @@
+"""ST-Link communication simulated with USB round trip latency"""
+
+import time
+
+
+class LatencyCom():
+    """Com class for Stlink, every transfer takes selected time"""
+
+    def __init__(self, latency=0.0002):
+        self._latency = latency
+        self.transfers = 0
+
+    @property
+    def version(self):
+        """Simulated device version"""
+        return 'V2'
+
+    def xfer(self, command, data=None, rx_length=0, tout=200):
+        """Simulated transfer"""
+        self.transfers += 1
+        time.sleep(self._latency)
+        if command[0] == 0xf1:
+            return [0x26, 0xc6, 0x83, 0x04, 0x48, 0x37]
+        if command[0] == 0xf5:
+            return [0x01, 0x00]
+        if rx_length:
+            # every read word has S_HALT bit of DHCSR, so core is halted
+            return [0x80] + [0x13] * (rx_length - 1)
+        return None
@@ -0,0 +1,86 @@
+"""Benchmark of hex dump formatting: previous per byte formatting vs block formatting"""
+
+import io
+import itertools
+import os
+import time
+import swd._dump
+
+
+def _chunks(data, chunk_size):
+    data = iter(data)
+    while True:
+        chunk = list(itertools.islice(data, 0, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _hex_line32(chunk):
+    result = ' '.join([
+        '%08x' % int.from_bytes(part, byteorder='little')
+        for part in _chunks(chunk, 4)])
+    return result.ljust((16 // 4) * 9 - 1)
+
+
+def _hex_line8(chunk):
+    return ' '.join(['%02x' % part for part in chunk]).ljust(16 * 3 - 1)
+
+
+def _ascii_line(chunk):
+    return ''.join([chr(d) if d >= 32 and d < 127 else '.' for d in chunk])
+
+
+def _print_buffer(output, addr, data, hex_line):
+    """Previous implementation of print_buffer (one print per line)"""
+    prev_chunk = []
+    same_chunk = False
+    for chunk in _chunks(data, 16):
+        if prev_chunk != chunk:
+            print('%08x  %s  %s' % (addr, hex_line(chunk), _ascii_line(chunk)), file=output)
+            prev_chunk = chunk
+            same_chunk = False
+        elif not same_chunk:
+            print('*', file=output)
+            same_chunk = True
+        addr += len(chunk)
+    if same_chunk:
+        print('%08x' % addr, file=output)
+
+
+def _measure(fnc, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fnc()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    """Run benchmark"""
+    size = 256 * 1024
+    data = os.urandom(size)
+    print("hex dump of %d KB (random data):" % (size // 1024))
+    for name, width, hex_line in (('8 bit', 1, _hex_line8), ('32 bit', 4, _hex_line32)):
+        old_output = io.StringIO()
+        new_output = io.BytesIO()
+
+        def old():
+            old_output.seek(0)
+            _print_buffer(old_output, 0x08000000, data, hex_line)
+
+        def new():
+            new_output.seek(0)
+            dump = swd._dump.HexDump(new_output, 0x08000000, width)
+            for offset in range(0, size, 1024):
+                dump.write(data[offset:offset + 1024])
+            dump.close()
+
+        time_old = _measure(old)
+        time_new = _measure(new)
+        assert old_output.getvalue().encode() == new_output.getvalue()
+        print("  %-8s previous %8.2f ms, block %8.2f ms, speedup %6.2fx" % (
+            name, time_old * 1000, time_new * 1000, time_old / time_new))
+
+
+if __name__ == '__main__':
+    main()
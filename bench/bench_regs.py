@@ -0,0 +1,44 @@
+"""Benchmark of full context save: individual register reads vs snapshot of halted core"""
+
+import time
+import swd
+import swd.stlink
+from bench._com import LatencyCom
+
+
+def _measure(name, fnc, com, repeat=10):
+    com.transfers = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fnc()
+    elapsed = (time.perf_counter() - start) / repeat
+    print("  %-12s %8.2f ms %6d transfers" % (name, elapsed * 1000, com.transfers // repeat))
+    return elapsed
+
+
+def main():
+    """Run benchmark"""
+    com = LatencyCom()
+    dev = swd.Swd(driver=swd.stlink.Stlink(com=com))
+
+    def individual():
+        cortexm = swd.CortexM(dev)
+        for reg in swd.CortexM.REGISTERS:
+            cortexm.get_reg(reg)
+        for reg in swd.CortexM.EXTENDED_REGISTERS:
+            cortexm.get_reg_ext(reg)
+
+    def snapshot():
+        cortexm = swd.CortexM(dev)
+        cortexm.halt()
+        cortexm.get_reg_all()
+        cortexm.get_reg_ext_all()
+
+    print("full context save (core + special + FPU registers):")
+    time_individual = _measure('individual', individual, com)
+    time_snapshot = _measure('snapshot', snapshot, com)
+    print("  speedup      %8.2fx" % (time_individual / time_snapshot))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Benchmark of startup: import of module and application without USB access"""
+
+import subprocess
+import sys
+import time
+
+
+def _measure(code, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        subprocess.check_call([sys.executable, '-c', code], stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    """Run benchmark"""
+    print("startup (new python process):")
+    base = _measure('pass')
+    print("  %-12s %8.2f ms" % ('python', base * 1000))
+    for name, code in (
+            ('import swd', 'import swd'),
+            ('pyswd -V', 'import sys, swd._app; sys.argv = ["pyswd", "-V"]; swd._app.main()')):
+        elapsed = _measure(code)
+        print("  %-12s %8.2f ms (+%.2f ms)" % (name, elapsed * 1000, (elapsed - base) * 1000))
+
+
+if __name__ == '__main__':
+    main()
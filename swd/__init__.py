@@ -1,4 +1,37 @@
 """Main module"""
 
-from swd.swd import Swd
-from swd.cortexm import CortexM
+import importlib as _importlib
+
+# public classes are imported from their modules on first access
+_CLASSES = {
+    'Swd': 'swd.swd',
+    'CortexM': 'swd.cortexm',
+    'Rtt': 'swd.rtt',
+    'Sampler': 'swd.sampler',
+    'Signal': 'swd.sampler',
+    'StepTracer': 'swd.tracer',
+    'Trace': 'swd.tracer',
+    'Stm32Flash': 'swd.stm32flash',
+    'StackMonitor': 'swd.stack',
+    'StackRegion': 'swd.stack',
+    'Snapshot': 'swd.snapshot',
+    'SparseImage': 'swd.image',
+    'SparseImageWriter': 'swd.image',
+    'SwdMemoryIO': 'swd.memoryio',
+}
+
+__all__ = list(_CLASSES)
+
+
+def __getattr__(name):
+    """Import public class from its module"""
+    if name not in _CLASSES:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(_importlib.import_module(_CLASSES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """Names of module including not yet imported classes"""
+    return sorted(set(globals()) | set(_CLASSES))
@@ -1,13 +1,14 @@
 """Application"""
 
+import os
 import sys
 import time
 import argparse
 import logging
 import itertools
+import re
 import swd
-import swd.stlink
-import swd.stlinkcom
+import swd.swd
 import swd.__about__
 import swd._log as _log
 
@@ -15,6 +16,8 @@ import swd._log as _log
 class PyswdException(Exception):
     """Exception"""
 
+OUTPUT_FORMATS = ('text', 'json', 'ndjson', 'bin')
+
 _VERSION_STR = "%s %s (%s <%s>)" % (
     swd.__about__.APP_NAME,
     swd.__about__.VERSION,
@@ -22,10 +25,11 @@ _VERSION_STR = "%s %s (%s <%s>)" % (
     swd.__about__.AUTHOR_EMAIL)
 _ACTIONS_HELP_STR = """
 list of available actions:
-  dump8:{addr}[:{size}]     print content of memory 8 bit register or dump
-  dump16:{addr}[:{size}]    print content of memory 16 bit register or dump
-  dump32:{addr}[:{size}]    print content of memory 32 bit register or dump
-  dump:{addr}[:{size}]      print content of memory 32 bit register or 8 bit dump
+  dump8:{addr}[:{size}[:{format}]]     print content of memory 8 bit register or dump
+  dump16:{addr}[:{size}[:{format}]]    print content of memory 16 bit register or dump
+  dump32:{addr}[:{size}[:{format}]]    print content of memory 32 bit register or dump
+  dump:{addr}[:{size}[:{format}]]      print content of memory 32 bit register or 8 bit dump
+                            (format: hex (default), raw, c, json)
 
   set8:{addr}:{data}[:{data}..]     set 8 bit memory
   set16:{addr}:{data}[:{data}..]    set 16 bit memory
@@ -34,19 +38,56 @@ list of available actions:
 
   fill8:{addr}:{size}:{pattern}     fill memory with 8 bit pattern
 
+  verify:{addr}:{file}              compare memory with binary file
+  hash:{addr}:{size}[:{algorithm}]  print hash of memory (crc32, sha256, ..)
+  find:{addr}:{size}:{pattern}[:{count}]
+                                    search memory for hex pattern, '?' is wildcard nibble
+
+  stack:paint:{addr}:{size}[:{addr}:{size}..]  fill stacks with pattern
+  stack:{addr}:{size}[:{addr}:{size}..]        print maximum stack usage
+  stack:full:{addr}:{size}[:{addr}:{size}..]   same, stack is scanned from start
+
+  snapshot:{addr}:{size}:{file}     save memory snapshot into file
+  diff:{file}:{file}[:{file}..]     print changed words between snapshots
+
+  image:{addr}:{size}:{file}        save memory into sparse image (erased areas are skipped)
+  export:{image}:{file}     convert sparse image into .bin, .hex or .srec file
+
+  checkpoint:{file}:{addr}:{size}[:{addr}:{size}..]
+                            halt core and save registers and memory into file
+  restore:{file}            halt core and restore registers and memory from file
+
+  flash:{addr}:{file}       erase and program binary file into STM32 flash
+  erase:all                 mass erase STM32 flash
+  erase:{addr}:{size}       erase STM32 flash sectors in range
+
   reg:all                   print all core register
+  reg:ext                   print all extended (special and FPU) registers
   reg:{reg}                 print content of core register
   reg:{reg}:{data}          set core register
 
+  rtt[:{addr}]              stream RTT channel 0 to stdout (control block address)
+  rtt:{file.elf}            stream RTT channel 0 to stdout (address from ELF symbol)
+  rtt:{addr}:{size}         stream RTT channel 0 to stdout (search RAM range)
+
   sleep:{seconds}           sleep (float) - insert delay between commands
 
-  reset[:halt]              reset core or halt after reset
+  loop:{n}[:{var}] .. end   repeat actions n-times (optional variable with index 0..n-1)
+  let:{var}:{value}         set variable, variables are used as $var or ${var}
+
+  reset[:halt][:{strategy}] reset core or halt after reset, strategy:
+                            sysresetreq (default), vectreset, nrst or under_reset
+                            (hold NRST while connecting, for firmware disabling SWD)
   run[:nodebug]             run core
   step[:{n}]                step core (n-times)
+  trace:{n}[:{file}]        step core n-times and print PC or save trace into file
   halt                      halt core
 
+  (actions can be also read from script with -x {file} or from stdin with -x -,
+   one or more actions per line, text after # is comment)
   (numerical values can be in different formats, like: 42, 0x2a, 0o52, 0b101010, 32K, 1M, ..)
-  (reg: R0, R1, ..., R12, SP, LR, PC, PSR, MSP, PSP)
+  (reg: R0, R1, ..., R12, SP, LR, PC, PSR, MSP, PSP,
+        CONTROL, FAULTMASK, BASEPRI, PRIMASK, FPSCR, S0, ..., S31)
 """
 # TODO unimplemented actions:
 #   dump:core                 print content of core registers (R1, R2, ..)
@@ -62,6 +103,16 @@ list of available actions:
 #   write:{addr}:{file}   write binary file into memory
 #   write:sram:{file}     write binary file into SRAM memory
 
+def convert_frequency(freq):
+    """Convert SWD frequency argument (number or 'auto')"""
+    if freq == 'auto':
+        return freq
+    try:
+        return int(freq)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid frequency: %s" % freq)
+
+
 def _configure_argparse():
     """configure and process command line arguments"""
     parser = argparse.ArgumentParser(
@@ -72,70 +123,45 @@ def _configure_argparse():
     parser.add_argument("-d", "--debug", action="count", help="increase debug output")
     parser.add_argument("-i", "--info", action="count", help="increase info output")
     parser.add_argument("-v", "--verbose", action="count", help="increase verbose output")
-    parser.add_argument("-f", "--freq", type=int, default=1800000, help="set SWD frequency")
+    parser.add_argument(
+        "-f", "--freq", type=convert_frequency, default=1800000,
+        help="set SWD frequency ('auto' select fastest reliable frequency)")
+    parser.add_argument(
+        "--freq-address", type=str, default=None,
+        help="address of 64 Bytes of RAM for 'auto' frequency test (default 0x20000000)")
     parser.add_argument(
         "-s", "--serial", type=str, default='',
         help="select ST-Link by serial number (enough is part of serial number: begin or end")
+    parser.add_argument(
+        "-a", "--attach", action="store_true",
+        help="attach to running debug session (no reconnect, cached probe version)")
+    parser.add_argument(
+        "-x", "--script", type=str,
+        help="read actions from script file after command line actions ('-' is stdin)")
+    parser.add_argument(
+        "-t", "--time", action="store_true", help="print time of each action to stderr")
+    parser.add_argument(
+        "--format", choices=OUTPUT_FORMATS, default='text',
+        help="output format: text, json (array of records), ndjson (record per line)\n"
+        "or bin (raw memory on stdout, records as ndjson on stderr)")
     parser.add_argument('action', nargs='*', help='actions will be processed sequentially')
     return parser.parse_args()
 
-def chunks(data, chunk_size):
-    """Yield chunks"""
-    data = iter(data)
-    while True:
-        chunk = list(itertools.islice(data, 0, chunk_size))
-        if not chunk:
-            return
-        yield chunk
-
-def hex_line8(chunk):
-    """Create 8 bit hex string from bytes in chunk"""
-    result = ' '.join([
-        '%02x' % part
-        for part in chunk])
-    return result.ljust(16 * 3 - 1)
-
-def hex_line16(chunk):
-    """Create 16 bit hex string from bytes in chunk"""
-    result = ' '.join([
-        '%04x' % int.from_bytes(part, byteorder='little')
-        for part in chunks(chunk, 2)])
-    return result.ljust((16 // 2) * 5 - 1)
-
-def hex_line32(chunk):
-    """Create 32 bit hex string from bytes in chunk"""
-    result = ' '.join([
-        '%08x' % int.from_bytes(part, byteorder='little')
-        for part in chunks(chunk, 4)])
-    return result.ljust((16 // 4) * 9 - 1)
-
-def ascii_line(chunk):
-    """Create ASCII string from bytes in chunk"""
-    return ''.join([
-        chr(d) if d >= 32 and d < 127 else '.'
-        for d in chunk])
-
-def print_buffer(addr, data, hex_line=hex_line8, verbose=0):
-    """Print buffer in hex and ASCII"""
-    prev_chunk = []
-    same_chunk = False
-    for chunk in chunks(data, 16):
-        if verbose > 0 or prev_chunk != chunk:
-            print('%08x  %s  %s' % (
-                addr,
-                hex_line(chunk),
-                ascii_line(chunk),
-            ))
-            prev_chunk = chunk
-            same_chunk = False
-        elif not same_chunk:
-            print('*')
-            same_chunk = True
-        elif sys.stdout.isatty() and addr % 0x1000 == 0:
-            print('%08x\r' % addr, end='', flush=True)
-        addr += len(chunk)
-    if same_chunk or verbose > 1:
-        print('%08x' % addr)
+def convert_pattern(pattern):
+    """Convert hex pattern with '?' wildcard nibbles into (pattern, mask)"""
+    if not pattern or len(pattern) % 2:
+        raise PyswdException('%s is not a valid hex pattern' % pattern)
+    data = []
+    mask = []
+    for index in range(0, len(pattern), 2):
+        byte = pattern[index:index + 2]
+        try:
+            data.append(int(byte.replace('?', '0'), 16))
+        except ValueError:
+            raise PyswdException('%s is not a valid hex pattern' % pattern)
+        mask.append(
+            (0x00 if byte[0] == '?' else 0xf0) | (0x00 if byte[1] == '?' else 0x0f))
+    return bytes(data), bytes(mask)
 
 def test_alignment(num, param_name, align):
     """Test if number is aligned"""
@@ -166,6 +192,62 @@ def convert_numeric(num, max_bits=32):
     return ret
 
 
+_VARIABLE_RE = re.compile(r'\$(?:(\w+)|\{(\w+)\})')
+
+
+def parse_script_line(line):
+    """Split script line into actions, text after # is comment"""
+    return line.split('#', 1)[0].split()
+
+def get_loop_depth(actions):
+    """Return number of loops which are not closed by end"""
+    depth = 0
+    for action in actions:
+        if action.split(':')[0] == 'loop':
+            depth += 1
+        elif action == 'end':
+            depth -= 1
+    return depth
+
+def parse_actions(actions):
+    """Parse actions into block with nested loops
+
+    Return:
+        list of action strings and tuples (loop_action, block)
+    """
+    stack = [[]]
+    for action in actions:
+        if action.split(':')[0] == 'loop':
+            block = []
+            stack[-1].append((action, block))
+            stack.append(block)
+        elif action == 'end':
+            if len(stack) == 1:
+                raise PyswdException("end without loop")
+            stack.pop()
+        else:
+            stack[-1].append(action)
+    if len(stack) > 1:
+        raise PyswdException("loop without end")
+    return stack[0]
+
+def substitute_variables(action, variables):
+    """Replace $var and ${var} in action by value of variable"""
+    def replace(match):
+        name = match.group(1) or match.group(2)
+        if name not in variables:
+            raise PyswdException("unknown variable: %s" % name)
+        return str(variables[name])
+    return _VARIABLE_RE.sub(replace, action)
+
+def get_session_exceptions():
+    """Exceptions which stop only current line in interactive session"""
+    import swd.cortexm
+    import swd.stlink
+    return (
+        PyswdException, swd.swd.SwdException, swd.cortexm.CortexMException,
+        swd.stlink.StlinkException)
+
 class Application():
     """Application"""
 
@@ -176,7 +258,15 @@ class Application():
         self._verbose = 0
         self._actions = args.action
         self._swd_frequency = args.freq
+        self._freq_address = args.freq_address
         self._serial_no = args.serial
+        self._attach = args.attach
+        self._script = args.script
+        self._time = args.time
+        self._variables = {}
+        self._format = args.format
+        self._records = None
+        self._action_name = None
         if args.verbose is not None:
             self._verbose = args.verbose
         if args.quite:
@@ -189,10 +279,50 @@ class Application():
             logging.basicConfig(level=logging.WARNING)
 
     def print_device_info(self):
-        """Show device informations"""
+        """Show device informations, skipped (no transfers) if info output is disabled"""
+        if not logging.getLogger().isEnabledFor(logging.INFO):
+            return
         logging.info(self._swd.get_version())
         logging.info("Target voltage: %0.2fV", self._swd.get_target_voltage())
 
+    def print_result(self, text, **fields):
+        """Print result of action as text or write it as record"""
+        if self._records is None:
+            print(text)
+            return
+        record = {'action': self._action_name}
+        record.update(fields)
+        self._records.write(record)
+
+    def get_stream(self, address=None):
+        """Binary stream for data of action (stdout or records with data chunks)"""
+        import swd._output
+        sys.stdout.flush()
+        if self._records is None or self._format == 'bin':
+            return sys.stdout.buffer
+        return swd._output.DataRecords(self._records, {'action': self._action_name}, address)
+
+    def dump_memory(self, addr, size, width, params):
+        """Stream memory to stdout in selected format (hex, raw, c, json)"""
+        import swd._dump
+        dump_format = params[0] if params else 'hex'
+        if params and self._records is not None:
+            raise PyswdException(
+                "dump format %s can not be used with --format %s" % (dump_format, self._format))
+        try:
+            if self._records is not None:
+                # structured output contain raw data in binary or records
+                dump = swd._dump.RawDump(self.get_stream(addr))
+            else:
+                dump = swd._dump.create_dump(
+                    dump_format, self.get_stream(), addr, size, width,
+                    verbose=self._verbose, progress=sys.stdout.isatty())
+        except swd._dump.DumpException as err:
+            raise PyswdException(err)
+        for _, chunk in self._swd.read_chunks(addr, size):
+            dump.write(chunk)
+        dump.close()
+
     def action_dump32(self, params):
         """Dump memory 32 bit"""
         if not params:
@@ -204,12 +334,11 @@ class Application():
                 val = int.from_bytes(data, byteorder='little')
             else:
                 val = self._swd.get_mem32(addr)
-            print("%08x: %08x" % (addr, val))
-        elif len(params) == 2:
+            self.print_result("%08x: %08x" % (addr, val), address=addr, value=val)
+        elif len(params) <= 3:
             size = convert_numeric(params[1])
             test_alignment(size, "Size", 4)
-            data = self._swd.read_mem(addr, size)
-            print_buffer(addr, data, hex_line32, verbose=self._verbose)
+            self.dump_memory(addr, size, 4, params[2:])
         else:
             raise PyswdException("too many parameters")
 
@@ -219,14 +348,16 @@ class Application():
             raise PyswdException("no parameters")
         addr = convert_numeric(params[0])
         if len(params) == 1:
-            data = self._swd.read_mem(addr, 2)
-            val = int.from_bytes(data, byteorder='little')
-            print("%08x: %04x" % (addr, val))
-        elif len(params) == 2:
+            if addr % 2:
+                data = self._swd.read_mem(addr, 2)
+            else:
+                data = self._swd.read_mem16(addr, 2)
+            val = int.from_bytes(bytes(data), byteorder='little')
+            self.print_result("%08x: %04x" % (addr, val), address=addr, value=val)
+        elif len(params) <= 3:
             size = convert_numeric(params[1])
             test_alignment(size, "Size", 2)
-            data = self._swd.read_mem(addr, size)
-            print_buffer(addr, data, hex_line16, verbose=self._verbose)
+            self.dump_memory(addr, size, 2, params[2:])
         else:
             raise PyswdException("too many parameters")
 
@@ -236,12 +367,11 @@ class Application():
             raise PyswdException("no parameters")
         addr = convert_numeric(params[0])
         if len(params) == 1:
-            data = self._swd.read_mem(addr, 1)
-            print("%08x: %02x" % (addr, next(data)))
-        elif len(params) == 2:
+            val = next(self._swd.read_mem(addr, 1))
+            self.print_result("%08x: %02x" % (addr, val), address=addr, value=val)
+        elif len(params) <= 3:
             size = convert_numeric(params[1])
-            data = self._swd.read_mem(addr, size)
-            print_buffer(addr, data, hex_line8, verbose=self._verbose)
+            self.dump_memory(addr, size, 1, params[2:])
         else:
             raise PyswdException("too many parameters")
 
@@ -251,7 +381,7 @@ class Application():
             raise PyswdException("no parameters")
         if len(params) == 1:
             self.action_dump32(params)
-        elif len(params) == 2:
+        elif len(params) <= 3:
             self.action_dump8(params)
         else:
             raise PyswdException("too many parameters")
@@ -277,7 +407,10 @@ class Application():
         data = []
         for i in params[1:]:
             data.extend(convert_numeric(i, 16).to_bytes(2, byteorder='little'))
-        self._swd.write_mem(addr, data)
+        if addr % 2:
+            self._swd.write_mem(addr, data)
+        else:
+            self._swd.write_mem16(addr, data)
 
     def action_set8(self, params):
         """Fill memory with data"""
@@ -307,23 +440,237 @@ class Application():
         pattern = [convert_numeric(i, 8) for i in params[2:]]
         self._swd.fill_mem(addr, pattern, size)
 
+    def action_verify(self, params):
+        """Compare memory with binary file"""
+        if len(params) != 2:
+            raise PyswdException("require 2 parameters")
+        addr = convert_numeric(params[0])
+        try:
+            with open(params[1], 'rb') as bin_file:
+                data = bin_file.read()
+        except OSError as err:
+            raise PyswdException(err)
+        mismatches = self._swd.verify(addr, data)
+        for mismatch_addr, size in mismatches:
+            self.print_result(
+                "%08x: %d bytes differ" % (mismatch_addr, size), address=mismatch_addr, size=size)
+        if mismatches:
+            raise PyswdException("memory differs from file")
+        logging.info("Verified %d bytes", len(data))
+
+    def action_hash(self, params):
+        """Print hash of memory"""
+        if len(params) not in (2, 3):
+            raise PyswdException("require 2 or 3 parameters")
+        addr = convert_numeric(params[0])
+        size = convert_numeric(params[1])
+        algorithm = params[2] if len(params) == 3 else 'crc32'
+        try:
+            checksum = self._swd.checksum(addr, size, algorithm)
+            self.print_result(checksum, algorithm=algorithm, hash=checksum)
+        except swd.swd.SwdException as err:
+            raise PyswdException(err)
+
+    def action_find(self, params):
+        """Search memory for pattern"""
+        if len(params) not in (3, 4):
+            raise PyswdException("require 3 or 4 parameters")
+        addr = convert_numeric(params[0])
+        size = convert_numeric(params[1])
+        pattern, mask = convert_pattern(params[2])
+        count = convert_numeric(params[3]) if len(params) == 4 else None
+        if '?' not in params[2]:
+            mask = None
+        for match in self._swd.find(pattern, addr, addr + size, mask=mask, count=count):
+            self.print_result("%08x" % match, address=match)
+
+    def action_stack(self, params):
+        """Paint stacks or print maximum stack usage"""
+        import swd.stack
+        paint = bool(params) and params[0] == 'paint'
+        full = bool(params) and params[0] == 'full'
+        if paint or full:
+            params = params[1:]
+        if not params or len(params) % 2:
+            raise PyswdException("require pairs of address and size")
+        try:
+            monitor = swd.stack.StackMonitor(self._swd, [
+                (convert_numeric(params[index]), convert_numeric(params[index + 1]))
+                for index in range(0, len(params), 2)])
+        except swd.stack.StackException as err:
+            raise PyswdException(err)
+        if paint:
+            monitor.paint()
+            return
+        for usage in monitor.scan(full):
+            self.print_result(
+                "%08x: used %d of %d bytes%s" % (
+                    usage.region.start, usage.used, usage.region.size,
+                    ' (overflow)' if usage.overflow else ''),
+                address=usage.region.start, size=usage.region.size,
+                used=usage.used, overflow=usage.overflow)
+
+    def action_snapshot(self, params):
+        """Save memory snapshot into file"""
+        import swd.snapshot
+        if len(params) != 3:
+            raise PyswdException("require 3 parameters")
+        addr = convert_numeric(params[0])
+        size = convert_numeric(params[1])
+        try:
+            swd.snapshot.Snapshot.take(self._swd, [(addr, size)]).save(params[2])
+        except OSError as err:
+            raise PyswdException(err)
+
+    def action_diff(self, params):
+        """Print changed words between snapshots"""
+        import swd.snapshot
+        if len(params) < 2:
+            raise PyswdException("require at least 2 parameters")
+        try:
+            snapshots = [swd.snapshot.Snapshot.load(filename) for filename in params]
+            if len(snapshots) == 2:
+                for addr, old, new in swd.snapshot.diff(*snapshots).words:
+                    self.print_result(
+                        "%08x: %08x -> %08x" % (addr, old, new), address=addr, old=old, new=new)
+            else:
+                for addr, count in sorted(swd.snapshot.count_changes(snapshots).items()):
+                    self.print_result(
+                        "%08x: changed %d times" % (addr, count), address=addr, count=count)
+        except (OSError, swd.snapshot.SnapshotException) as err:
+            raise PyswdException(err)
+
+    def action_image(self, params):
+        """Save memory into sparse image"""
+        import swd.image
+        if len(params) != 3:
+            raise PyswdException("require 3 parameters")
+        addr = convert_numeric(params[0])
+        size = convert_numeric(params[1])
+        try:
+            with swd.image.SparseImageWriter(params[2]) as writer:
+                writer.dump(self._swd, addr, size)
+        except OSError as err:
+            raise PyswdException(err)
+
+    @staticmethod
+    def action_export(params):
+        """Convert sparse image into binary, Intel HEX or S-record file"""
+        import swd.image
+        if len(params) != 2:
+            raise PyswdException("require 2 parameters")
+        extension = os.path.splitext(params[1])[1].lower()
+        try:
+            with swd.image.SparseImage(params[0]) as image:
+                if extension == '.bin':
+                    image.to_bin(params[1])
+                elif extension in ('.hex', '.ihex'):
+                    image.to_hex(params[1])
+                elif extension in ('.srec', '.s19', '.s28', '.s37', '.mot'):
+                    image.to_srec(params[1])
+                else:
+                    raise PyswdException("unknown file type: %s" % params[1])
+        except (OSError, swd.image.ImageException) as err:
+            raise PyswdException(err)
+
+    def action_checkpoint(self, params):
+        """Save core registers and memory into file"""
+        if len(params) < 3 or len(params) % 2 == 0:
+            raise PyswdException("require file and pairs of address and size")
+        regions = [
+            (convert_numeric(params[index]), convert_numeric(params[index + 1]))
+            for index in range(1, len(params), 2)]
+        try:
+            self._cortexm.checkpoint(params[0], regions)
+        except OSError as err:
+            raise PyswdException(err)
+
+    def action_restore(self, params):
+        """Restore core registers and memory from file"""
+        import swd.snapshot
+        if len(params) != 1:
+            raise PyswdException("require 1 parameter")
+        try:
+            written = self._cortexm.restore(params[0])
+        except (OSError, swd.snapshot.SnapshotException) as err:
+            raise PyswdException(err)
+        logging.info("Restored, written %d bytes", written)
+        if self._records is not None:
+            self.print_result(None, written=written)
+
+    def _get_flash(self):
+        import swd.stm32flash
+        try:
+            return swd.stm32flash.Stm32Flash(self._swd, self._cortexm)
+        except swd.stm32flash.FlashException as err:
+            raise PyswdException(err)
+
+    def action_flash(self, params):
+        """Erase and program binary file into flash"""
+        import swd.stm32flash
+        if len(params) != 2:
+            raise PyswdException("require 2 parameters")
+        addr = convert_numeric(params[0])
+        try:
+            with open(params[1], 'rb') as bin_file:
+                data = bin_file.read()
+        except OSError as err:
+            raise PyswdException(err)
+        try:
+            with self._get_flash() as flash:
+                logging.info("Flash: %s, %d KB", flash.name, flash.flash_size // 1024)
+                plan = flash.write(addr, data)
+                logging.info(
+                    "Erased %d sectors, skipped %d blank and %d same sectors (saved %.2fs)",
+                    len(plan.erase), len(plan.blank), len(plan.same), plan.time_saved)
+                if self._records is not None:
+                    self.print_result(
+                        None, erased=len(plan.erase), blank=len(plan.blank),
+                        same=len(plan.same))
+        except swd.stm32flash.FlashException as err:
+            raise PyswdException(err)
+
+    def action_erase(self, params):
+        """Erase flash"""
+        import swd.stm32flash
+        try:
+            with self._get_flash() as flash:
+                if len(params) == 1 and params[0] == 'all':
+                    flash.erase_all()
+                elif len(params) == 2:
+                    flash.erase(convert_numeric(params[0]), convert_numeric(params[1]))
+                else:
+                    raise PyswdException("wrong parameters")
+        except swd.stm32flash.FlashException as err:
+            raise PyswdException(err)
+
     def action_reg(self, params):
         """Read/Write core register"""
         if not params:
             raise PyswdException("no parameters")
-        halted = self._cortexm.is_halted()
+        # core halted by previous action is not checked again
+        halted = self._cortexm.is_halted(cached=True)
         if not halted:
             self._cortexm.halt()
         if len(params) == 1:
             if params[0] == 'all':
                 for reg, val in self._cortexm.get_reg_all().items():
-                    print("%s: %08x" % (reg, val))
+                    self.print_result("%s: %08x" % (reg, val), register=reg, value=val)
+            elif params[0] == 'ext':
+                for reg, val in self._cortexm.get_reg_ext_all().items():
+                    self.print_result("%s: %08x" % (reg, val), register=reg, value=val)
+            elif params[0].upper() in swd.CortexM.EXTENDED_REGISTERS:
+                val = self._cortexm.get_reg_ext(params[0])
+                self.print_result("%s: %08x" % (params[0], val), register=params[0], value=val)
             else:
                 val = self._cortexm.get_reg(params[0])
-                print("%s: %08x" % (params[0], val))
+                self.print_result("%s: %08x" % (params[0], val), register=params[0], value=val)
         elif len(params) == 2:
             val = convert_numeric(params[1])
-            self._cortexm.set_reg(params[0], val)
+            if params[0].upper() in swd.CortexM.EXTENDED_REGISTERS:
+                self._cortexm.set_reg_ext(params[0], val)
+            else:
+                self._cortexm.set_reg(params[0], val)
         else:
             raise PyswdException("too many parameters")
         if not halted:
@@ -331,12 +678,18 @@ class Application():
 
     def action_reset(self, params):
         """Reset MCU"""
-        if not params:
-            self._cortexm.reset()
-        elif params[0] == 'halt':
-            self._cortexm.reset_halt()
-        else:
+        halt = bool(params) and params[0] == 'halt'
+        if halt:
+            params = params[1:]
+        if len(params) > 1:
+            raise PyswdException("Wrong parameter")
+        strategy = params[0] if params else swd.CortexM.RESET_SYSRESETREQ
+        if strategy not in swd.CortexM.RESET_STRATEGIES:
             raise PyswdException("Wrong parameter")
+        if halt:
+            self._cortexm.reset_halt(strategy)
+        else:
+            self._cortexm.reset(strategy)
 
     def action_run(self, params):
         """Run core"""
@@ -355,10 +708,50 @@ class Application():
             for _ in range(convert_numeric(params[0])):
                 self._cortexm.step()
 
+    def action_trace(self, params):
+        """Step core and print or save trace of PC"""
+        import swd.tracer
+        if not params:
+            raise PyswdException("no parameters")
+        if len(params) > 2:
+            raise PyswdException("too many parameters")
+        trace = swd.tracer.StepTracer(self._cortexm).trace(convert_numeric(params[0]))
+        if len(params) == 2:
+            trace.save(params[1])
+        elif self._records is not None:
+            self.print_result(None, pc=list(trace.pc))
+        else:
+            sys.stdout.write(''.join(['%08x\n' % pc for pc in trace.pc]))
+
     def action_halt(self, unused_params):
         """Run core"""
         self._cortexm.halt()
 
+    def action_rtt(self, params):
+        """Stream RTT channel 0 to stdout"""
+        import swd._elf
+        import swd.rtt
+        try:
+            if not params:
+                rtt = swd.rtt.Rtt(self._swd)
+            elif len(params) == 1 and os.path.isfile(params[0]):
+                rtt = swd.rtt.Rtt(self._swd, elf=params[0])
+            elif len(params) == 1:
+                rtt = swd.rtt.Rtt(self._swd, address=convert_numeric(params[0]))
+            elif len(params) == 2:
+                rtt = swd.rtt.Rtt(
+                    self._swd,
+                    ram_start=convert_numeric(params[0]),
+                    ram_size=convert_numeric(params[1]))
+            else:
+                raise PyswdException("too many parameters")
+            logging.info("RTT control block at 0x%08x", rtt.address)
+            rtt.stream(self.get_stream())
+        except (swd.rtt.RttException, swd._elf.ElfException) as err:
+            raise PyswdException(err)
+        except KeyboardInterrupt:
+            pass
+
     @staticmethod
     def action_sleep(params):
         """Wait selected time and then continue"""
@@ -372,23 +765,135 @@ class Application():
             except ValueError:
                 raise PyswdException("wrong float value: %s" % params[0])
 
+    def action_let(self, params):
+        """Set variable"""
+        if len(params) < 2:
+            raise PyswdException("no variable name or value")
+        if not re.match(r'^\w+$', params[0]):
+            raise PyswdException("wrong variable name: %s" % params[0])
+        self._variables[params[0]] = ':'.join(params[1:])
+
+    def process_action(self, action):
+        """Process one action
+
+        Errors of core and memory access are reported like errors of action.
+        """
+        import swd.cortexm
+        action = substitute_variables(action, self._variables)
+        logging.debug(action)
+        action_parts = action.split(":")
+        action_name = "action_" + action_parts[0]
+        if not hasattr(self, action_name):
+            raise PyswdException("action '%s' is not implemented" % action)
+        self._action_name = action_parts[0]
+        transfers = self._swd.get_transfers() if self._swd else None
+        start = time.perf_counter()
+        try:
+            getattr(self, action_name)(action_parts[1:])
+        except (PyswdException, swd.cortexm.CortexMException, swd.swd.SwdException) as err:
+            self.write_status(action, start, transfers, str(err))
+            raise PyswdException("%s: %s" % (action_parts[0], err))
+        self.write_status(action, start, transfers)
+
+    def write_status(self, action, start, transfers, error=None):
+        """Write record with action status, time and number of transfers"""
+        elapsed = time.perf_counter() - start
+        if self._records is None:
+            if self._time:
+                sys.stdout.flush()
+                sys.stderr.write("%s: %.3f ms\n" % (action, elapsed * 1000))
+            return
+        record = {
+            'action': self._action_name,
+            'command': action,
+            'status': 'error' if error else 'ok',
+            'time': round(elapsed, 6),
+        }
+        if transfers is not None:
+            record['transfers'] = self._swd.get_transfers() - transfers
+        if error:
+            record['error'] = error
+        self._records.write(record)
+
+    def process_block(self, block):
+        """Process actions and loops"""
+        for item in block:
+            if isinstance(item, str):
+                self.process_action(item)
+                continue
+            loop_action, loop_block = item
+            params = substitute_variables(loop_action, self._variables).split(':')[1:]
+            if not params or len(params) > 2:
+                raise PyswdException("loop: wrong parameters")
+            for index in range(convert_numeric(params[0])):
+                if len(params) == 2:
+                    self._variables[params[1]] = index
+                self.process_block(loop_block)
+
+    def process_script(self):
+        """Process actions from script file or stdin
+
+        Whole script is parsed before it is started, in interactive
+        mode (stdin is terminal) each line is processed when its loops
+        are closed and errors do not stop processing.
+        """
+        if self._script != '-':
+            try:
+                with open(self._script) as script_file:
+                    lines = script_file.readlines()
+            except OSError as err:
+                raise PyswdException("script: %s" % err)
+            self.process_block(parse_actions(itertools.chain.from_iterable(
+                parse_script_line(line) for line in lines)))
+            return
+        if not sys.stdin.isatty():
+            self.process_block(parse_actions(itertools.chain.from_iterable(
+                parse_script_line(line) for line in sys.stdin)))
+            return
+        actions = []
+        session_exceptions = get_session_exceptions()
+        while True:
+            try:
+                line = input('... ' if actions else 'pyswd> ')
+            except EOFError:
+                break
+            actions += parse_script_line(line)
+            if get_loop_depth(actions) > 0:
+                continue
+            try:
+                self.process_block(parse_actions(actions))
+            except session_exceptions as err:
+                logging.error("pyswd error: %s.", err)
+            actions = []
+
     def process_actions(self):
         """Process all actions"""
-        for action in self._actions:
-            logging.debug(action)
-            action_parts = action.split(":")
-            action_name = "action_" + action_parts[0]
-            if not hasattr(self, action_name):
-                raise PyswdException("action '%s' is not implemented" % action)
-            try:
-                getattr(self, action_name)(action_parts[1:])
-            except PyswdException as err:
-                raise PyswdException("%s: %s" % (action_parts[0], err))
+        self.process_block(parse_actions(self._actions))
+        if self._script:
+            self.process_script()
 
     def start(self):
         """Application start point"""
+        import swd._output
+        if self._format == 'bin':
+            self._records = swd._output.RecordWriter(sys.stderr)
+        elif self._format != 'text':
+            self._records = swd._output.RecordWriter(sys.stdout, array=self._format == 'json')
+        try:
+            return self._start()
+        finally:
+            if self._records is not None:
+                self._records.close()
+
+    def _start(self):
+        """Connect and process actions"""
+        import swd.stlink
+        import swd.stlinkcom
         try:
-            self._swd = swd.Swd(swd_frequency=self._swd_frequency, serial_no=self._serial_no)
+            self._swd = swd.Swd(
+                swd_frequency=self._swd_frequency, serial_no=self._serial_no,
+                attach=self._attach, auto_frequency_address=(
+                    convert_numeric(self._freq_address) if self._freq_address else None))
             # reading ID code can generate exception and stop if no MCU is connected
             self._swd.get_idcode()
             self._cortexm = swd.CortexM(self._swd)
@@ -0,0 +1,61 @@
+"""Small persistent cache of probe properties (JSON file in user cache directory)"""
+
+import json as _json
+import os as _os
+
+
+def _get_default_filename():
+    cache_dir = _os.environ.get('XDG_CACHE_HOME') or _os.path.join(
+        _os.path.expanduser('~'), '.cache')
+    return _os.path.join(cache_dir, 'pyswd', 'cache.json')
+
+
+# path of cache file, None disable cache
+CACHE_FILE = _get_default_filename()
+
+
+def _load():
+    if CACHE_FILE is None:
+        return {}
+    try:
+        with open(CACHE_FILE) as cache_file:
+            data = _json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def get(section, key, default=None):
+    """Get cached value
+
+    Arguments:
+        section: name of group of values (e.g. 'stlink')
+        key: key in section (e.g. serial number)
+        default: value returned if it is not cached
+
+    Return:
+        cached value or default
+    """
+    return _load().get(section, {}).get(str(key), default)
+
+
+def put(section, key, value):
+    """Store value into cache, errors are ignored (cache is only optimization)
+
+    Arguments:
+        section: name of group of values
+        key: key in section
+        value: value which can be serialized into JSON
+    """
+    if CACHE_FILE is None:
+        return
+    data = _load()
+    data.setdefault(section, {})[str(key)] = value
+    try:
+        _os.makedirs(_os.path.dirname(CACHE_FILE), exist_ok=True)
+        temp_filename = '%s.%d' % (CACHE_FILE, _os.getpid())
+        with open(temp_filename, 'w') as cache_file:
+            _json.dump(data, cache_file, indent=1, sort_keys=True)
+        _os.replace(temp_filename, CACHE_FILE)
+    except OSError:
+        pass
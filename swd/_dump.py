@@ -0,0 +1,322 @@
+"""Streaming memory dump formatters (hex, raw binary, C array, JSON)
+
+Formatters write bytes into binary stream (like sys.stdout.buffer),
+data are formatted by whole blocks, one write per block.
+"""
+
+import array as _array
+import binascii as _binascii
+import sys as _sys
+
+
+class DumpException(Exception):
+    """Exception"""
+
+
+_WORD_TYPES = {1: 'B', 2: 'H', 4: 'I'}
+
+# printable ASCII characters, others are replaced by '.'
+_ASCII_TABLE = bytes([byte if 32 <= byte < 127 else ord('.') for byte in range(256)])
+
+
+def _to_words(data, width):
+    """Convert little endian bytes into sequence of integers of width bytes"""
+    if width == 1:
+        return data
+    words = _array.array(_WORD_TYPES[width], data)
+    if _sys.byteorder == 'big':
+        words.byteswap()
+    return words
+
+
+def _to_hex(data, width):
+    """Hex digits of little endian values of width bytes (most significant digit first)"""
+    if width == 1:
+        return _binascii.hexlify(data)
+    words = _array.array(_WORD_TYPES[width], data)
+    # byteswap always reverse bytes in item, independently on host byte order
+    words.byteswap()
+    return _binascii.hexlify(words.tobytes())
+
+
+def _fill_column(lines, line_length, column, source, offset, stride, size):
+    """Fill same column in all fixed length lines
+
+    Each character of column is set in all lines at once by extended slice,
+    so number of operations depends on line layout and not on number of lines.
+
+    Arguments:
+        lines: bytearray with fixed length lines
+        line_length: length of one line
+        column: position of item in line
+        source: bytes with items for all lines, stride bytes per line
+        offset: position of item in source line
+        stride: size of source for one line
+        size: size of item
+    """
+    for index in range(size):
+        lines[column + index::line_length] = source[offset + index::stride]
+
+
+class HexDump():
+    """Hex dump with address, values and ASCII, repeated lines are collapsed into '*'
+
+    Data are buffered and formatted by blocks: all lines have same layout,
+    so every column (address, hex digit, ASCII character) is filled for
+    all lines of block by one slice assignment.
+    """
+
+    LINE_SIZE = 16
+    BLOCK_SIZE = 16384
+
+    def __init__(self, output, address, width=1, verbose=0, progress=False):
+        """Hex dump
+
+        Arguments:
+            output: binary stream
+            address: address of first byte
+            width: size of values in bytes (1, 2 or 4)
+            verbose: 0 collapse repeated lines, 1 print all lines,
+                2 also print address after last line
+            progress: print address while skipping repeated lines (for terminal)
+        """
+        if width not in _WORD_TYPES:
+            raise DumpException("Wrong width: %d" % width)
+        self._output = output
+        self._address = address
+        self._width = width
+        self._verbose = verbose
+        self._progress = progress
+        self._rest = b''
+        self._prev_line = None
+        self._same_line = False
+        count = HexDump.LINE_SIZE // width
+        self._hex_size = count * (width * 2 + 1) - 1
+        # address, 2 spaces, hex values, 2 spaces, ASCII, new line
+        self._ascii_column = 8 + 2 + self._hex_size + 2
+        self._line_length = self._ascii_column + HexDump.LINE_SIZE + 1
+        self._template = bytes(b' ' * (self._line_length - 1) + b'\n')
+
+    def _format_block(self, address, data):
+        """Format full lines, return bytearray with fixed length lines"""
+        line_size = HexDump.LINE_SIZE
+        line_length = self._line_length
+        lines = bytearray(self._template * (len(data) // line_size))
+        addresses = _array.array('I', range(address, address + len(data), line_size))
+        if _sys.byteorder == 'little':
+            addresses.byteswap()
+        _fill_column(lines, line_length, 0, _binascii.hexlify(addresses.tobytes()), 0, 8, 8)
+        hex_data = _to_hex(data, self._width)
+        digits = self._width * 2
+        for index in range(line_size // self._width):
+            _fill_column(
+                lines, line_length, 10 + index * (digits + 1),
+                hex_data, index * digits, line_size * 2, digits)
+        _fill_column(
+            lines, line_length, self._ascii_column,
+            data.translate(_ASCII_TABLE), 0, line_size, line_size)
+        return lines
+
+    @staticmethod
+    def _has_repeated_lines(data):
+        """Fast check if some line can be same as previous line
+
+        Data are compared with data shifted by one line (XOR of big integers),
+        repeated line is run of zeros with size of line.
+        """
+        line_size = HexDump.LINE_SIZE
+        size = len(data) - line_size
+        if size <= 0:
+            return False
+        diff = int.from_bytes(data[line_size:], byteorder='little') ^ int.from_bytes(
+            data[:size], byteorder='little')
+        return bytes(line_size) in diff.to_bytes(size, byteorder='little')
+
+    def _collapse(self, address, data, lines):
+        """Select lines to print, repeated lines are replaced by '*'"""
+        line_size = HexDump.LINE_SIZE
+        line_length = self._line_length
+        prev_line = self._prev_line
+        if data[:line_size] != prev_line and not self._has_repeated_lines(data):
+            self._prev_line = data[-line_size:]
+            self._same_line = False
+            return lines
+        result = []
+        start = None
+        for index, offset in enumerate(range(0, len(data), line_size)):
+            line = data[offset:offset + line_size]
+            if line != prev_line:
+                if start is None:
+                    start = index
+                prev_line = line
+                self._same_line = False
+                continue
+            if start is not None:
+                result.append(lines[start * line_length:index * line_length])
+                start = None
+            if not self._same_line:
+                result.append(b'*\n')
+                self._same_line = True
+            elif self._progress and (address + offset) % 0x1000 == 0:
+                result.append(b'%08x\r' % (address + offset))
+        if start is not None:
+            result.append(lines[start * line_length:])
+        self._prev_line = prev_line
+        return b''.join(result)
+
+    def write(self, data):
+        """Format data, data are buffered until block is complete"""
+        self._rest += bytes(data)
+        if len(self._rest) >= HexDump.BLOCK_SIZE:
+            self._write_lines()
+
+    def _write_lines(self):
+        """Format all full lines, incomplete line is kept until next write or close"""
+        data = self._rest
+        size = len(data) - len(data) % HexDump.LINE_SIZE
+        self._rest = data[size:]
+        if not size:
+            return
+        data = data[:size]
+        lines = self._format_block(self._address, data)
+        if self._verbose > 0:
+            self._output.write(lines)
+        else:
+            self._output.write(self._collapse(self._address, data, lines))
+        self._address += size
+
+    def close(self):
+        """Format incomplete last line and address after collapsed lines"""
+        self._write_lines()
+        lines = []
+        if self._rest:
+            # last line is shorter and is not aligned to width
+            data = self._rest
+            size = len(data) - len(data) % self._width
+            value_format = '%%0%dx' % (self._width * 2)
+            hex_line = ' '.join([
+                value_format % word for word in _to_words(data[:size], self._width)])
+            lines.append('%08x  %s  %s\n' % (
+                self._address, hex_line.ljust(self._hex_size),
+                data.translate(_ASCII_TABLE).decode('ascii')))
+            self._address += len(data)
+            self._rest = b''
+            self._same_line = False
+        if self._same_line or self._verbose > 1:
+            lines.append('%08x\n' % self._address)
+        self._output.write(''.join(lines).encode('ascii'))
+        self._output.flush()
+
+
+class RawDump():
+    """Raw binary data"""
+
+    def __init__(self, output):
+        self._output = output
+
+    def write(self, data):
+        """Write data"""
+        self._output.write(data)
+
+    def close(self):
+        """Flush output"""
+        self._output.flush()
+
+
+class CArrayDump():
+    """C array with values of selected width, 16 bytes per line"""
+
+    LINE_SIZE = 16
+    _TYPES = {1: 'uint8_t', 2: 'uint16_t', 4: 'uint32_t'}
+
+    def __init__(self, output, address, size, width=1):
+        """C array
+
+        Arguments:
+            output: binary stream
+            address: address of first byte (used in array name)
+            size: number of bytes, must be aligned to width
+            width: size of values in bytes (1, 2 or 4)
+        """
+        if width not in _WORD_TYPES:
+            raise DumpException("Wrong width: %d" % width)
+        if size % width:
+            raise DumpException("Size is not aligned to %d Bytes" % width)
+        self._output = output
+        self._width = width
+        self._rest = b''
+        value_format = '0x%%0%dx,' % (width * 2)
+        self._value_format = value_format
+        self._line_format = '   %s\n' % ((' ' + value_format) * (CArrayDump.LINE_SIZE // width))
+        self._output.write(('const %s mem_%08x[%d] = {\n' % (
+            CArrayDump._TYPES[width], address, size // width)).encode('ascii'))
+
+    def write(self, data):
+        """Format data, incomplete line is kept until next write or close"""
+        data = self._rest + bytes(data)
+        line_size = CArrayDump.LINE_SIZE
+        size = len(data) - len(data) % line_size
+        self._rest = data[size:]
+        words = _to_words(data[:size], self._width)
+        count = line_size // self._width
+        line_format = self._line_format
+        self._output.write(''.join([
+            line_format % tuple(words[index:index + count])
+            for index in range(0, len(words), count)]).encode('ascii'))
+
+    def close(self):
+        """Format last line and end of array"""
+        lines = []
+        if self._rest:
+            words = _to_words(self._rest, self._width)
+            lines.append('    %s\n' % ' '.join([self._value_format % word for word in words]))
+            self._rest = b''
+        lines.append('};\n')
+        self._output.write(''.join(lines).encode('ascii'))
+        self._output.flush()
+
+
+class JsonDump():
+    """JSON object with address, size and data as hex string, streamed while data come"""
+
+    def __init__(self, output, address, size):
+        self._output = output
+        self._output.write(('{"address": %d, "size": %d, "data": "' % (address, size)).encode())
+
+    def write(self, data):
+        """Write data as hex"""
+        self._output.write(_binascii.hexlify(data))
+
+    def close(self):
+        """Close JSON object"""
+        self._output.write(b'"}\n')
+        self._output.flush()
+
+
+FORMATS = ('hex', 'raw', 'c', 'json')
+
+
+def create_dump(dump_format, output, address, size, width=1, verbose=0, progress=False):
+    """Create formatter
+
+    Arguments:
+        dump_format: one of FORMATS
+        output: binary stream
+        address: address of first byte
+        size: number of bytes
+        width: size of values in bytes (1, 2 or 4)
+        verbose: verbosity of hex dump
+        progress: print progress in hex dump
+
+    Return:
+        formatter with methods write(data) and close()
+    """
+    if dump_format == 'hex':
+        return HexDump(output, address, width, verbose, progress)
+    if dump_format == 'raw':
+        return RawDump(output)
+    if dump_format == 'c':
+        return CArrayDump(output, address, size, width)
+    if dump_format == 'json':
+        return JsonDump(output, address, size)
+    raise DumpException("Unknown format: %s (%s)" % (dump_format, ', '.join(FORMATS)))
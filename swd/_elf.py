@@ -0,0 +1,53 @@
+"""Minimal ELF reader (only what is needed to locate symbols)"""
+
+import struct as _struct
+
+
+class ElfException(Exception):
+    """Exception"""
+
+
+_ELF_MAGIC = b'\x7fELF'
+_ELFCLASS32 = 1
+_ELFDATA2LSB = 1
+_SHT_SYMTAB = 2
+
+
+def get_symbol_address(filename, name):
+    """Find address of symbol in ELF file
+
+    Only 32 bit little endian ELF files are supported (Cortex-M).
+
+    Arguments:
+        filename: path to ELF file
+        name: symbol name
+
+    Return:
+        address of symbol
+
+    Raises:
+        ElfException if file is not supported or symbol is not found
+    """
+    with open(filename, 'rb') as elf_file:
+        elf = elf_file.read()
+    if elf[:4] != _ELF_MAGIC:
+        raise ElfException("Not an ELF file")
+    if elf[4] != _ELFCLASS32 or elf[5] != _ELFDATA2LSB:
+        raise ElfException("Only 32 bit little endian ELF is supported")
+    shoff, = _struct.unpack_from('<I', elf, 0x20)
+    shentsize, shnum = _struct.unpack_from('<HH', elf, 0x2e)
+    sections = [
+        _struct.unpack_from('<IIIIIIIIII', elf, shoff + index * shentsize)
+        for index in range(shnum)]
+    name = name.encode()
+    for section in sections:
+        if section[1] != _SHT_SYMTAB:
+            continue
+        sym_offset, sym_size, link, entsize = section[4], section[5], section[6], section[9]
+        str_offset = sections[link][4]
+        for offset in range(sym_offset, sym_offset + sym_size, entsize):
+            st_name, st_value = _struct.unpack_from('<II', elf, offset)
+            start = str_offset + st_name
+            if elf[start:elf.index(b'\0', start)] == name:
+                return st_value
+    raise ElfException("Symbol '%s' not found" % name.decode())
@@ -0,0 +1,92 @@
+"""Reentrant lock of one probe with contention statistics"""
+
+import threading as _threading
+import time as _time
+
+
+class ProbeLock():
+    """Reentrant lock, which serialize commands of one probe
+
+    Lock is held for whole command/data/response exchange, it can be held
+    by user for sequence of commands (with statement). Counts how many
+    times thread had to wait for lock and how long.
+    """
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self._owner = None
+        self._count = 0
+        self._acquisitions = 0
+        self._contentions = 0
+        self._wait_time = 0.0
+
+    @property
+    def acquisitions(self):
+        """Number of acquisitions (nested acquisitions are not counted)"""
+        return self._acquisitions
+
+    @property
+    def contentions(self):
+        """Number of acquisitions when lock was held by other thread"""
+        return self._contentions
+
+    @property
+    def wait_time(self):
+        """Total time in seconds spent by waiting for lock"""
+        return self._wait_time
+
+    def is_owned(self):
+        """Check if lock is held by calling thread"""
+        return self._owner == _threading.get_ident()
+
+    def acquire(self):
+        """Acquire lock, wait if it is held by other thread"""
+        ident = _threading.get_ident()
+        if self._owner == ident:
+            self._count += 1
+            return
+        if self._lock.acquire(blocking=False):
+            contention = None
+        else:
+            start = _time.perf_counter()
+            self._lock.acquire()
+            contention = _time.perf_counter() - start
+        # statistics are updated when lock is held
+        self._owner = ident
+        self._count = 1
+        self._acquisitions += 1
+        if contention is not None:
+            self._contentions += 1
+            self._wait_time += contention
+
+    def release(self):
+        """Release lock"""
+        if self._owner != _threading.get_ident():
+            raise RuntimeError("Lock is not held by this thread")
+        self._count -= 1
+        if not self._count:
+            self._owner = None
+            self._lock.release()
+
+    def yield_lock(self):
+        """Release lock for a moment so waiting thread can do its commands
+
+        Nested acquisitions are restored after lock is acquired again.
+        """
+        if self._owner != _threading.get_ident():
+            return
+        count = self._count
+        self._count = 0
+        self._owner = None
+        self._lock.release()
+        # switch thread, so waiting thread can acquire lock
+        _time.sleep(0)
+        self.acquire()
+        self._count = count
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,71 @@
+"""Machine readable output of application (JSON, NDJSON)"""
+
+import binascii as _binascii
+import json as _json
+
+
+class RecordWriter():
+    """Write records (dictionaries) into text stream
+
+    NDJSON is one JSON object per line, JSON is one array of objects,
+    both are written while records come, so output is never buffered whole.
+    """
+
+    def __init__(self, output, array=False):
+        """Record writer
+
+        Arguments:
+            output: text stream
+            array: write JSON array instead of NDJSON
+        """
+        self._output = output
+        self._array = array
+        self._count = 0
+
+    def write(self, record):
+        """Write one record"""
+        line = _json.dumps(record, sort_keys=False)
+        if self._array:
+            line = ('[' if not self._count else ',') + '\n' + line
+        else:
+            line += '\n'
+        self._output.write(line)
+        self._count += 1
+
+    def close(self):
+        """Finish output (close JSON array)"""
+        if self._array:
+            self._output.write('[]\n' if not self._count else '\n]\n')
+        self._output.flush()
+
+
+class DataRecords():
+    """Binary stream which write data as records with hex chunks"""
+
+    def __init__(self, writer, record, address=None):
+        """Data records
+
+        Arguments:
+            writer: RecordWriter
+            record: dictionary with common items of all records (like action)
+            address: address of first byte, None if data has no address (like stream)
+        """
+        self._writer = writer
+        self._record = record
+        self._address = address
+
+    def write(self, data):
+        """Write chunk of data as one record"""
+        record = dict(self._record)
+        if self._address is not None:
+            record['address'] = self._address
+            self._address += len(data)
+        record['data'] = _binascii.hexlify(data).decode()
+        self._writer.write(record)
+        return len(data)
+
+    def flush(self):
+        """Nothing to flush, records are written directly"""
+
+    def close(self):
+        """Nothing to close, writer is closed by application"""
@@ -1,16 +1,51 @@
 """Cortex-Mx definitions"""
 
+import time as _time
+import swd.stubs as _stubs
+import swd.snapshot as _snapshot
+
 class CortexMException(Exception):
     """Exception"""
 
+class _RegisterFile():
+    """Snapshot of core registers of halted core"""
+    __slots__ = ('values', 'pending', 'extended')
+
+    def __init__(self):
+        self.values = None
+        self.pending = {}
+        self.extended = {}
+
+
+def _get_extended_registers():
+    """name: (register selector, bit shift, bit mask)"""
+    # CONTROL, FAULTMASK, BASEPRI and PRIMASK are packed in one register
+    registers = {
+        'CONTROL': (20, 24, 0xff),
+        'FAULTMASK': (20, 16, 0xff),
+        'BASEPRI': (20, 8, 0xff),
+        'PRIMASK': (20, 0, 0xff),
+        'FPSCR': (33, 0, 0xffffffff),
+    }
+    for index in range(32):
+        registers['S%d' % index] = (64 + index, 0, 0xffffffff)
+    return registers
+
+
 class CortexM():
     """Definitions for Cortex-M MCUs"""
     REGISTERS = [
         'R0', 'R1', 'R2', 'R3', 'R4', 'R5',
         'R6', 'R7', 'R8', 'R9', 'R10', 'R11', 'R12',
         'SP', 'LR', 'PC', 'PSR', 'MSP', 'PSP']
+    _REGISTERS_INDEX = {reg: index for index, reg in enumerate(REGISTERS)}
+    EXTENDED_REGISTERS = list(_get_extended_registers())
+    _EXTENDED_REGISTERS_SEL = _get_extended_registers()
+    _SPECIAL_REGSEL = 20
+    _FPU_REGSEL = 33
 
     AIRCR_REG = 0xe000ed0c
+    MVFR0_REG = 0xe000ef40
     DHCSR_REG = 0xe000edf0
     DEMCR_REG = 0xe000edfc
     DWTCTRL_REG = 0xe0001000
@@ -30,73 +65,545 @@ class CortexM():
     AIRCR_KEY = 0x05fa0000
     AIRCR_SYSRESETREQ_BIT = 0x00000004
     AIRCR_SYSRESETREQ = AIRCR_KEY | AIRCR_SYSRESETREQ_BIT
+    AIRCR_VECTRESET_BIT = 0x00000001
+    AIRCR_VECTRESET = AIRCR_KEY | AIRCR_VECTRESET_BIT
 
     DHCSR_KEY = 0xa05f0000
     DHCSR_DEBUGEN_BIT = 0x00000001
     DHCSR_HALT_BIT = 0x00000002
     DHCSR_STEP_BIT = 0x00000004
+    DHCSR_MASKINTS_BIT = 0x00000008
     DHCSR_STATUS_HALT_BIT = 0x00020000
+    DHCSR_STATUS_RESET_BIT = 0x02000000
     DHCSR_DEBUGDIS = DHCSR_KEY
     DHCSR_DEBUGEN = DHCSR_KEY | DHCSR_DEBUGEN_BIT
     DHCSR_HALT = DHCSR_KEY | DHCSR_DEBUGEN_BIT | DHCSR_HALT_BIT
     DHCSR_STEP = DHCSR_KEY | DHCSR_DEBUGEN_BIT | DHCSR_STEP_BIT
+    DHCSR_HALT_MASKINTS = DHCSR_HALT | DHCSR_MASKINTS_BIT
+    DHCSR_DEBUGEN_MASKINTS = DHCSR_DEBUGEN | DHCSR_MASKINTS_BIT
+
+    PSR_THUMB_BIT = 0x01000000
+
+    # reset strategies
+    RESET_SYSRESETREQ = 'sysresetreq'
+    RESET_VECTRESET = 'vectreset'
+    RESET_NRST = 'nrst'
+    RESET_UNDER_RESET = 'under_reset'
+    RESET_STRATEGIES = (RESET_SYSRESETREQ, RESET_VECTRESET, RESET_NRST, RESET_UNDER_RESET)
+    RESET_TIMEOUT = 1.0
 
     DEMCR_RUN_AFTER_RESET = 0x00000000
     DEMCR_HALT_AFTER_RESET = 0x00000001
 
-    def __init__(self, swd):
+    STUB_ADDRESS = 0x20000000
+    STUB_TIMEOUT = 5.0
+    # additional timeout for each processed byte, enough for slow clock
+    STUB_TIMEOUT_PER_BYTE = 0.00001
+
+    def __init__(self, swd, stub_address=STUB_ADDRESS, buffer_writes=False):
         self._swd = swd
+        # register snapshot is used only while core is known to be halted
+        self._halted = False
+        self._buffer_writes = buffer_writes
+        self._regs = None
+        self._has_fpu = None
+        self._stub_address = stub_address
+        self._loaded_stub = None
+        self._running_stub = None
 
     @classmethod
     def _get_reg_index(cls, reg):
-        if reg.upper() not in cls.REGISTERS:
+        try:
+            return cls._REGISTERS_INDEX[reg.upper()]
+        except KeyError:
             raise CortexMException("Not a register")
-        return cls.REGISTERS.index(reg)
+
+    def _get_regs(self):
+        if self._regs is None:
+            self._regs = _RegisterFile()
+        return self._regs
+
+    def _load_regs(self):
+        regs = self._get_regs()
+        if regs.values is None:
+            regs.values = list(self._swd.get_reg_all())
+        return regs
+
+    def _drop_regs(self):
+        self._regs = None
+
+    def flush_regs(self):
+        """Write buffered register changes into core"""
+        if self._regs is None:
+            return
+        for index, data in sorted(self._regs.pending.items()):
+            self._swd.set_reg(index, data)
+        self._regs.pending = {}
 
     def get_reg(self, reg):
-        """Read register"""
-        return self._swd.get_reg(CortexM._get_reg_index(reg))
+        """Read register
+
+        While core is halted all registers are read at once
+        and next reads are served from snapshot.
+        """
+        index = CortexM._get_reg_index(reg)
+        if not self._halted:
+            return self._swd.get_reg(index)
+        regs = self._get_regs()
+        if index in regs.pending:
+            return regs.pending[index]
+        return self._load_regs().values[index]
 
     def set_reg(self, reg, data):
-        """Read register"""
-        return self._swd.set_reg(CortexM._get_reg_index(reg), data)
+        """Write register
+
+        Register is written into core and register snapshot is updated.
+        With buffer_writes (see constructor) writes to halted core are buffered
+        and written into core by flush_regs(), run(), step() or nodebug(),
+        buffered writes are lost by reset.
+        """
+        index = CortexM._get_reg_index(reg)
+        if not self._halted:
+            self._swd.set_reg(index, data)
+            return
+        regs = self._get_regs()
+        if self._buffer_writes:
+            regs.pending[index] = data
+            return
+        self._swd.set_reg(index, data)
+        if regs.values is not None:
+            regs.values[index] = data
 
     def get_reg_all(self):
         """Read all registers"""
-        return dict(zip(CortexM.REGISTERS, self._swd.get_reg_all()))
+        if not self._halted:
+            return dict(zip(CortexM.REGISTERS, self._swd.get_reg_all()))
+        regs = self._load_regs()
+        values = list(regs.values)
+        for index, data in regs.pending.items():
+            values[index] = data
+        return dict(zip(CortexM.REGISTERS, values))
+
+    def has_fpu(self):
+        """Check if core has FPU"""
+        if self._has_fpu is None:
+            self._has_fpu = self._swd.get_mem32(CortexM.MVFR0_REG) != 0
+        return self._has_fpu
+
+    @classmethod
+    def _get_ext_reg_sel(cls, reg):
+        try:
+            return cls._EXTENDED_REGISTERS_SEL[reg.upper()]
+        except KeyError:
+            raise CortexMException("Not an extended register")
+
+    def _get_ext_values(self, regsels):
+        """Read extended registers by selectors, cached while core is halted"""
+        if not self._halted:
+            return dict(zip(regsels, self._swd.get_reg_list(regsels)))
+        extended = self._get_regs().extended
+        missing = [regsel for regsel in regsels if regsel not in extended]
+        if missing:
+            extended.update(zip(missing, self._swd.get_reg_list(missing)))
+        return extended
 
-    def reset(self):
-        """Reset"""
+    def get_reg_ext(self, reg):
+        """Read extended register (special and FPU registers)
+
+        Arguments:
+            reg: register name (e.g. 'CONTROL', 'PRIMASK', 'FPSCR', 'S0', ...)
+
+        Return:
+            register value
+        """
+        regsel, shift, mask = CortexM._get_ext_reg_sel(reg)
+        if regsel >= CortexM._FPU_REGSEL and not self.has_fpu():
+            raise CortexMException("Core has no FPU")
+        return (self._get_ext_values([regsel])[regsel] >> shift) & mask
+
+    def get_reg_ext_all(self):
+        """Read all extended registers
+
+        Packed special registers are read once, FPU registers only if core
+        has FPU, while core is halted values are kept in register snapshot.
+
+        Return:
+            dictionary with register name and value
+        """
+        regsels = [CortexM._SPECIAL_REGSEL]
+        if self.has_fpu():
+            regsels.extend(sorted(set(
+                regsel for regsel, _, _ in CortexM._EXTENDED_REGISTERS_SEL.values()
+                if regsel >= CortexM._FPU_REGSEL)))
+        values = self._get_ext_values(regsels)
+        result = {}
+        for reg in CortexM.EXTENDED_REGISTERS:
+            regsel, shift, mask = CortexM._EXTENDED_REGISTERS_SEL[reg]
+            if regsel in values:
+                result[reg] = (values[regsel] >> shift) & mask
+        return result
+
+    def set_reg_ext(self, reg, data):
+        """Write extended register (special and FPU registers)
+
+        Writes are not buffered.
+
+        Arguments:
+            reg: register name (e.g. 'CONTROL', 'PRIMASK', 'FPSCR', 'S0', ...)
+            data: register value
+        """
+        regsel, shift, mask = CortexM._get_ext_reg_sel(reg)
+        if regsel >= CortexM._FPU_REGSEL and not self.has_fpu():
+            raise CortexMException("Core has no FPU")
+        if mask != 0xffffffff:
+            value = self._get_ext_values([regsel])[regsel]
+            data = (value & ~(mask << shift)) | ((data & mask) << shift)
+        self._swd.set_reg(regsel, data)
+        if self._halted:
+            self._get_regs().extended[regsel] = data
+
+    def _clear_state(self):
+        """Forget state of core which is lost by reset"""
+        self._halted = False
+        self._drop_regs()
+        self._loaded_stub = None
+
+    def _trigger_reset(self, strategy):
+        """Request reset by selected strategy (NRST is released for connect under reset)"""
+        if strategy == CortexM.RESET_SYSRESETREQ:
+            self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_SYSRESETREQ)
+        elif strategy == CortexM.RESET_VECTRESET:
+            self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_VECTRESET)
+        elif strategy == CortexM.RESET_NRST:
+            self._swd.pulse_nrst()
+        elif strategy == CortexM.RESET_UNDER_RESET:
+            self._swd.set_nrst(False)
+
+    def _start_reset(self, strategy, timeout):
+        """Check strategy and prepare core for reset"""
+        if strategy not in CortexM.RESET_STRATEGIES:
+            raise CortexMException("Unknown reset strategy: %s (%s)" % (
+                strategy, ', '.join(CortexM.RESET_STRATEGIES)))
+        self._clear_state()
+        if strategy == CortexM.RESET_UNDER_RESET:
+            # MCU is held in reset, so running firmware can not disable SWD
+            self._swd.connect_under_reset()
+        elif timeout is not None:
+            # read clears sticky S_RESET_ST from previous reset
+            self._swd.get_mem32(CortexM.DHCSR_REG)
+
+    def reset(self, strategy=RESET_SYSRESETREQ, timeout=RESET_TIMEOUT):
+        """Reset
+
+        Arguments:
+            strategy: one of RESET_STRATEGIES:
+                'sysresetreq' reset whole MCU by AIRCR SYSRESETREQ,
+                'vectreset' reset only core by AIRCR VECTRESET (ARMv7-M only),
+                'nrst' pulse on NRST pin,
+                'under_reset' hold NRST, connect SWD again and release NRST
+            timeout: wait until reset is done (seconds), None don't wait
+        """
+        self._start_reset(strategy, timeout)
         self._swd.set_mem32(CortexM.DEMCR_REG, CortexM.DEMCR_RUN_AFTER_RESET)
-        self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_SYSRESETREQ)
-        # self._swd.get_mem32(CortexM.AIRCR_REG)
+        self._trigger_reset(strategy)
+        if timeout is not None:
+            self.wait_reset_done(timeout)
+
+    def reset_halt(self, strategy=RESET_SYSRESETREQ, timeout=RESET_TIMEOUT):
+        """Reset and halt
+
+        Core is halted at reset vector (DEMCR VC_CORERESET).
 
-    def reset_halt(self):
-        """Reset and halt"""
+        Arguments:
+            strategy: one of RESET_STRATEGIES (see reset())
+            timeout: wait until core is halted after reset (seconds),
+                None don't wait (use is_halted() to check it)
+        """
+        self._start_reset(strategy, timeout)
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT)
         self._swd.set_mem32(CortexM.DEMCR_REG, CortexM.DEMCR_HALT_AFTER_RESET)
-        self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_SYSRESETREQ)
-        # self._swd.get_mem32(CortexM.AIRCR_REG)
+        self._trigger_reset(strategy)
+        if timeout is not None:
+            self.wait_reset_done(timeout, halted=True)
+
+    def _wait_status(self, timeout, reset, halted):
+        """Poll DHCSR without delay until reset was done and/or core is halted
+
+        S_RESET_ST is sticky and cleared by read, so it is collected across reads,
+        in most cases first read already confirms both.
+        """
+        deadline = _time.monotonic() + timeout
+        reset_done = not reset
+        while True:
+            dhcsr = self._swd.get_mem32(CortexM.DHCSR_REG)
+            if dhcsr & CortexM.DHCSR_STATUS_RESET_BIT:
+                reset_done = True
+            if reset_done and (not halted or dhcsr & CortexM.DHCSR_STATUS_HALT_BIT):
+                break
+            if _time.monotonic() > deadline:
+                if not reset_done:
+                    raise CortexMException("Timeout waiting for reset")
+                raise CortexMException("Timeout waiting for halted core")
+        if halted:
+            self._halted = True
+
+    def wait_reset_done(self, timeout=RESET_TIMEOUT, halted=False):
+        """Wait until core was reset (DHCSR S_RESET_ST)
+
+        Arguments:
+            timeout: timeout in seconds, CortexMException is raised after it
+            halted: wait also until core is halted (DHCSR S_HALT)
+        """
+        self._wait_status(timeout, reset=True, halted=halted)
 
-    def halt(self):
-        """Halt"""
+    def wait_halted(self, timeout=RESET_TIMEOUT):
+        """Wait until core is halted (DHCSR S_HALT)
+
+        Arguments:
+            timeout: timeout in seconds, CortexMException is raised after it
+        """
+        self._wait_status(timeout, reset=False, halted=True)
+
+    def halt(self, timeout=RESET_TIMEOUT):
+        """Halt
+
+        Arguments:
+            timeout: wait until core is halted (seconds), None don't wait
+                (core is not known to be halted, use is_halted() to check it)
+        """
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT)
+        if timeout is not None:
+            self.wait_halted(timeout)
 
     def step(self):
         """Step"""
+        self.flush_regs()
+        self._drop_regs()
+        self._loaded_stub = None
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_STEP)
 
     def run(self):
         """Enable debug"""
+        self.flush_regs()
+        self._halted = False
+        self._drop_regs()
+        self._loaded_stub = None
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGEN)
 
     def nodebug(self):
         """Disable debug"""
+        self.flush_regs()
+        self._halted = False
+        self._drop_regs()
+        self._loaded_stub = None
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGDIS)
 
-    def is_halted(self):
-        """check if core is halted"""
-        return self._swd.get_mem32(CortexM.DHCSR_REG) & CortexM.DHCSR_STATUS_HALT_BIT > 0
+    def is_halted(self, cached=False):
+        """check if core is halted
+
+        Arguments:
+            cached: don't read DHCSR if core is known to be halted
+                (by halt(), reset_halt(), wait_halted() or stopped stub)
+        """
+        if cached and self._halted:
+            return True
+        halted = self._swd.get_mem32(CortexM.DHCSR_REG) & CortexM.DHCSR_STATUS_HALT_BIT > 0
+        if not halted:
+            self._drop_regs()
+        self._halted = halted
+        return halted
+
+    def _is_stub_in_memory(self, address, stub):
+        """Check code of loaded stub, memory could be overwritten by direct writes"""
+        return bytes(self._swd.read_mem(address, len(stub.code))) == stub.code
+
+    def load_stub(self, stub, address=None):
+        """Copy stub into SRAM
+
+        Stub is not copied again if it is already loaded at same address
+        and its code is still in SRAM (checked by one read), after reset
+        or when core was running it is always copied.
+
+        Arguments:
+            stub: instance of Stub
+            address: address in SRAM (default is stub_address from constructor)
+
+        Return:
+            address of loaded stub
+        """
+        if address is None:
+            address = self._stub_address
+        if self._loaded_stub != (address, stub) or not self._is_stub_in_memory(address, stub):
+            self._swd.write_mem(address, stub.code, retry=True)
+            self._loaded_stub = (address, stub)
+        return address
+
+    def start_stub(self, stub, args=(), address=None):
+        """Load stub and run it, don't wait for finish
+
+        Core is halted if it is running, registers are set with buffered
+        writes and stub runs with masked interrupts.
+
+        Arguments:
+            stub: instance of Stub
+            args: up to four arguments passed in R0-R3
+            address: address in SRAM (default is stub_address from constructor)
+        """
+        if len(args) > 4:
+            raise CortexMException("Too many stub arguments")
+        if not self._halted:
+            self.halt()
+        address = self.load_stub(stub, address)
+        for index, arg in enumerate(args):
+            self.set_reg('R%d' % index, arg & 0xffffffff)
+        self.set_reg('PC', address)
+        self.set_reg('PSR', CortexM.PSR_THUMB_BIT)
+        self.flush_regs()
+        self._halted = False
+        self._drop_regs()
+        self._running_stub = (address, stub)
+        # C_MASKINTS can be changed only while core is halted
+        self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT_MASKINTS)
+        self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGEN_MASKINTS)
+
+    def wait_stub(self, timeout=STUB_TIMEOUT):
+        """Wait until running stub stops on BKPT
+
+        Arguments:
+            timeout: maximum time in seconds, then core is halted
+
+        Return:
+            value of R0
+        """
+        if self._running_stub is None:
+            raise CortexMException("No stub is running")
+        address, stub = self._running_stub
+        self._running_stub = None
+        deadline = _time.monotonic() + timeout
+        while not self.is_halted():
+            if _time.monotonic() > deadline:
+                self.halt()
+                raise CortexMException("Timeout in stub %s" % stub.name)
+        regs = self.get_reg_all()
+        if not address <= regs['PC'] < address + len(stub.code):
+            raise CortexMException(
+                "Stub %s stopped at 0x%08x" % (stub.name, regs['PC']))
+        return regs['R0']
+
+    def call_stub(self, stub, args=(), address=None, timeout=STUB_TIMEOUT):
+        """Run stub and wait for its result
+
+        Core registers and SRAM under stub are not restored.
+
+        Arguments:
+            stub: instance of Stub
+            args: up to four arguments passed in R0-R3
+            address: address in SRAM (default is stub_address from constructor)
+            timeout: maximum time in seconds
+
+        Return:
+            value of R0
+        """
+        self.start_stub(stub, args, address)
+        return self.wait_stub(timeout)
+
+    @classmethod
+    def _get_stub_timeout(cls, size):
+        return cls.STUB_TIMEOUT + size * cls.STUB_TIMEOUT_PER_BYTE
+
+    def crc32(self, address, size, crc=0):
+        """Compute CRC32 of memory on target
+
+        Result is same as zlib.crc32(data, crc), only result is transferred.
+
+        Arguments:
+            address: start address
+            size: number of bytes
+            crc: starting value (result of previous part)
+
+        Return:
+            CRC32 value
+        """
+        result = self.call_stub(
+            _stubs.CRC32, (address, size, crc ^ 0xffffffff),
+            timeout=CortexM._get_stub_timeout(size))
+        return result ^ 0xffffffff
+
+    def memset(self, address, value, size):
+        """Fill memory on target by byte value
+
+        Arguments:
+            address: start address
+            value: byte value
+            size: number of bytes
+        """
+        stub_address = self._stub_address
+        if address < stub_address + len(_stubs.MEMSET.code) and stub_address < address + size:
+            raise CortexMException("Memory overlaps stub")
+        self.call_stub(
+            _stubs.MEMSET, (address, value & 0xff, size),
+            timeout=CortexM._get_stub_timeout(size))
+
+    def memcmp(self, address1, address2, size):
+        """Compare two memory areas on target
+
+        Arguments:
+            address1: start address of first area
+            address2: start address of second area
+            size: number of bytes
+
+        Return:
+            offset of first different byte or None if areas are same
+        """
+        offset = self.call_stub(
+            _stubs.MEMCMP, (address1, address2, size),
+            timeout=CortexM._get_stub_timeout(size))
+        return offset if offset < size else None
+
+    def checkpoint(self, filename, regions):
+        """Halt core and save registers and RAM regions into file
+
+        Arguments:
+            filename: checkpoint file
+            regions: list of tuples (address, size) with saved memory
+
+        Return:
+            instance of swd.snapshot.Checkpoint
+        """
+        if not self.is_halted():
+            self.halt()
+        registers = self.get_reg_all()
+        registers.update(self.get_reg_ext_all())
+        snapshot = _snapshot.Snapshot.take(self._swd, regions)
+        checkpoint = _snapshot.Checkpoint(snapshot.regions, registers)
+        checkpoint.save(filename)
+        return checkpoint
+
+    def restore(self, filename):
+        """Halt core and restore registers and RAM regions from file
+
+        Only memory blocks which differ from checkpoint are written.
+        Core stays halted, state of peripherals is not restored.
+
+        Arguments:
+            filename: checkpoint file
+
+        Return:
+            number of written bytes of memory
+        """
+        checkpoint = _snapshot.Checkpoint.load(filename)
+        if not self.is_halted():
+            self.halt()
+        # restored RAM can overwrite loaded stub
+        self._loaded_stub = None
+        written = checkpoint.write_changed(self._swd)
+        for reg, value in checkpoint.registers.items():
+            if reg in CortexM._REGISTERS_INDEX:
+                self.set_reg(reg, value)
+            elif reg in CortexM._EXTENDED_REGISTERS_SEL:
+                self.set_reg_ext(reg, value)
+        self.flush_regs()
+        return written
 
     # def get_num_breakpoints(self):
     #     """Return number of HW break points"""
@@ -0,0 +1,285 @@
+"""Sparse memory image which stores only non-erased extents"""
+
+import bisect as _bisect
+import struct as _struct
+import zlib as _zlib
+
+
+class ImageException(Exception):
+    """Exception"""
+
+
+_HEADER = _struct.Struct('<8sIB3x')
+_INDEX_ENTRY = _struct.Struct('<IIQII')
+_FOOTER = _struct.Struct('<Q8s')
+_FLAG_ZLIB = 0x00000001
+
+
+class SparseImageWriter():
+    """Write sparse image while data are streamed
+
+    Data are split into blocks aligned to block size, blocks which are
+    fully erased are not stored, neighbouring stored blocks are joined
+    into extents. Index of extents is written at end of file by close().
+    """
+
+    MAGIC = b'PYSWDIMG'
+    INDEX_MAGIC = b'PYSWDIDX'
+    VERSION = 1
+    BLOCK_SIZE = 256
+    EXTENT_SIZE = 0x10000
+
+    def __init__(self, filename, compress=True, erased=0xff, block_size=BLOCK_SIZE):
+        """Sparse image writer
+
+        Arguments:
+            filename: image file
+            compress: compress extents by zlib
+            erased: value of erased byte
+            block_size: granularity of skipped erased areas
+        """
+        self._file = open(filename, 'wb')
+        self._compress = compress
+        self._erased = erased
+        self._erased_block = bytes([erased]) * block_size
+        self._block_size = block_size
+        self._block_address = None
+        self._block = None
+        self._extent_address = None
+        self._extent = None
+        self._index = []
+        self._file.write(_HEADER.pack(SparseImageWriter.MAGIC, SparseImageWriter.VERSION, erased))
+
+    def write(self, address, data):
+        """Append data
+
+        Arguments:
+            address: address of data
+            data: bytes
+        """
+        if self._block is not None and self._block_address + len(self._block) != address:
+            self._flush_block()
+        if self._block is None:
+            self._block_address = address
+            self._block = bytearray()
+        self._block += data
+        while True:
+            size = self._block_size - self._block_address % self._block_size
+            if len(self._block) < size:
+                break
+            self._add_block(self._block_address, bytes(self._block[:size]))
+            del self._block[:size]
+            self._block_address += size
+
+    def dump(self, swd, address, size):
+        """Stream memory into image
+
+        Arguments:
+            swd: instance of Swd
+            address: address in memory
+            size: number of bytes
+        """
+        for chunk_address, chunk in swd.read_chunks(address, size):
+            self.write(chunk_address, chunk)
+
+    def _flush_block(self):
+        if self._block:
+            self._add_block(self._block_address, bytes(self._block))
+        self._block = None
+
+    def _add_block(self, address, block):
+        if block == self._erased_block[:len(block)]:
+            self._flush_extent()
+            return
+        if (self._extent is not None
+                and self._extent_address + len(self._extent) == address
+                and len(self._extent) < SparseImageWriter.EXTENT_SIZE):
+            self._extent += block
+            return
+        self._flush_extent()
+        self._extent_address = address
+        self._extent = bytearray(block)
+
+    def _flush_extent(self):
+        if self._extent is None:
+            return
+        data = bytes(self._extent)
+        flags = 0
+        if self._compress:
+            data = _zlib.compress(data)
+            flags |= _FLAG_ZLIB
+        self._index.append((
+            self._extent_address, len(self._extent), self._file.tell(), len(data), flags))
+        self._file.write(data)
+        self._extent = None
+
+    def close(self):
+        """Write remaining data and index"""
+        if self._file is None:
+            return
+        self._flush_block()
+        self._flush_extent()
+        index_offset = self._file.tell()
+        self._file.write(_struct.pack('<I', len(self._index)))
+        for entry in self._index:
+            self._file.write(_INDEX_ENTRY.pack(*entry))
+        self._file.write(_FOOTER.pack(index_offset, SparseImageWriter.INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SparseImage():
+    """Read sparse image"""
+
+    def __init__(self, filename):
+        """Open sparse image and load its index
+
+        Arguments:
+            filename: image file
+        """
+        self._file = open(filename, 'rb')
+        magic, version, self._erased = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != SparseImageWriter.MAGIC or version != SparseImageWriter.VERSION:
+            self._file.close()
+            raise ImageException("Not a sparse image file")
+        self._file.seek(-_FOOTER.size, 2)
+        index_offset, index_magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+        if index_magic != SparseImageWriter.INDEX_MAGIC:
+            self._file.close()
+            raise ImageException("Sparse image has no index")
+        self._file.seek(index_offset)
+        count, = _struct.unpack('<I', self._file.read(4))
+        self._index = [
+            _INDEX_ENTRY.unpack(self._file.read(_INDEX_ENTRY.size)) for _ in range(count)]
+        self._starts = [entry[0] for entry in self._index]
+        self._cache = None
+
+    @property
+    def erased(self):
+        """Value of erased byte"""
+        return self._erased
+
+    @property
+    def extents(self):
+        """List of stored extents (address, size)"""
+        return [(address, size) for address, size, _, _, _ in self._index]
+
+    @property
+    def start(self):
+        """Address of first stored byte"""
+        return self._index[0][0] if self._index else 0
+
+    @property
+    def end(self):
+        """Address after last stored byte"""
+        return self._index[-1][0] + self._index[-1][1] if self._index else 0
+
+    def _read_extent(self, entry):
+        if self._cache is not None and self._cache[0] is entry:
+            return self._cache[1]
+        _, _, offset, stored_size, flags = entry
+        self._file.seek(offset)
+        data = self._file.read(stored_size)
+        if flags & _FLAG_ZLIB:
+            data = _zlib.decompress(data)
+        self._cache = (entry, data)
+        return data
+
+    def read(self, address, size):
+        """Read memory from image, not stored bytes are erased
+
+        Arguments:
+            address: address in memory
+            size: number of bytes
+
+        Return:
+            bytes
+        """
+        result = bytearray([self._erased]) * size
+        first = max(_bisect.bisect_right(self._starts, address) - 1, 0)
+        for entry in self._index[first:]:
+            extent_address, extent_size = entry[0], entry[1]
+            if extent_address >= address + size:
+                break
+            start = max(address, extent_address)
+            end = min(address + size, extent_address + extent_size)
+            if start >= end:
+                continue
+            data = self._read_extent(entry)
+            result[start - address:end - address] = data[
+                start - extent_address:end - extent_address]
+        return bytes(result)
+
+    def iter_extents(self):
+        """Iterate over stored extents
+
+        Return:
+            iterable of tuples (address, bytes)
+        """
+        for entry in self._index:
+            yield entry[0], self._read_extent(entry)
+
+    def close(self):
+        """Close image file"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def to_bin(self, filename):
+        """Export into binary file from first to last stored byte, gaps are erased"""
+        with open(filename, 'wb') as bin_file:
+            position = self.start
+            for address, data in self.iter_extents():
+                bin_file.write(bytes([self._erased]) * (address - position))
+                bin_file.write(data)
+                position = address + len(data)
+
+    def to_hex(self, filename, line_size=16):
+        """Export into Intel HEX file, only stored extents"""
+        with open(filename, 'w') as hex_file:
+            upper = None
+            for address, data in self.iter_extents():
+                offset = 0
+                while offset < len(data):
+                    line_address = address + offset
+                    # line must not cross 64 KB segment
+                    size = min(line_size, len(data) - offset, 0x10000 - (line_address & 0xffff))
+                    if line_address >> 16 != upper:
+                        upper = line_address >> 16
+                        hex_file.write(self._hex_record(
+                            0x04, 0, upper.to_bytes(2, byteorder='big')))
+                    hex_file.write(self._hex_record(
+                        0x00, line_address & 0xffff, data[offset:offset + size]))
+                    offset += size
+            hex_file.write(self._hex_record(0x01, 0, b''))
+
+    @staticmethod
+    def _hex_record(record_type, address, data):
+        record = bytes([len(data), (address >> 8) & 0xff, address & 0xff, record_type]) + data
+        return ':%s%02X\n' % (record.hex().upper(), -sum(record) & 0xff)
+
+    def to_srec(self, filename, line_size=16):
+        """Export into Motorola S-record file (S3 records), only stored extents"""
+        with open(filename, 'w') as srec_file:
+            srec_file.write(self._srec_record(0, 2, 0, b'pyswd'))
+            for address, data in self.iter_extents():
+                for offset in range(0, len(data), line_size):
+                    srec_file.write(self._srec_record(
+                        3, 4, address + offset, data[offset:offset + line_size]))
+            srec_file.write(self._srec_record(7, 4, 0, b''))
+
+    @staticmethod
+    def _srec_record(record_type, address_size, address, data):
+        record = bytes([address_size + len(data) + 1])
+        record += address.to_bytes(address_size, byteorder='big') + data
+        return 'S%d%s%02X\n' % (record_type, record.hex().upper(), ~sum(record) & 0xff)
@@ -0,0 +1,119 @@
+"""File-like access to target memory"""
+
+import io as _io
+
+
+class SwdMemoryIO(_io.RawIOBase):
+    """Raw binary stream over target memory
+
+    Position 0 is start address of memory region. Small reads are served
+    from buffer of one block, reads bigger than block are done directly.
+    Buffer is not refreshed when running core changes memory, use invalidate().
+    """
+
+    BLOCK_SIZE = 1024
+
+    def __init__(self, swd, start=0, size=None, block_size=BLOCK_SIZE):
+        """Memory stream
+
+        Arguments:
+            swd: instance of Swd
+            start: start address of memory region
+            size: size of memory region (default is up to end of address space)
+            block_size: size of read buffer
+        """
+        super().__init__()
+        self._swd = swd
+        self._start = start
+        self._size = size if size is not None else 0x100000000 - start
+        self._block_size = block_size
+        self._position = 0
+        self._block_address = None
+        self._block = None
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def tell(self):
+        self._check_closed()
+        return self._position
+
+    def seek(self, offset, whence=_io.SEEK_SET):
+        self._check_closed()
+        if whence == _io.SEEK_SET:
+            position = offset
+        elif whence == _io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == _io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("invalid whence (%r)" % whence)
+        if position < 0:
+            raise ValueError("negative seek position %d" % position)
+        self._position = position
+        return position
+
+    def invalidate(self):
+        """Drop read buffer, next read will read memory again"""
+        self._block_address = None
+        self._block = None
+
+    def _load_block(self, address):
+        aligned = address - address % self._block_size
+        block_address = max(aligned, self._start)
+        block_end = min(aligned + self._block_size, self._start + self._size)
+        self._block = bytearray(self._swd.read_mem(block_address, block_end - block_address))
+        self._block_address = block_address
+
+    def readinto(self, buffer):
+        self._check_closed()
+        view = memoryview(buffer).cast('B')
+        size = max(min(len(view), self._size - self._position), 0)
+        done = 0
+        while done < size:
+            address = self._start + self._position
+            remain = size - done
+            block = self._block
+            if block is not None and 0 <= address - self._block_address < len(block):
+                offset = address - self._block_address
+                chunk_size = min(remain, len(block) - offset)
+                view[done:done + chunk_size] = block[offset:offset + chunk_size]
+            elif remain >= self._block_size:
+                chunk_size = remain
+                view[done:done + chunk_size] = bytes(self._swd.read_mem(address, chunk_size))
+            else:
+                self._load_block(address)
+                continue
+            self._position += chunk_size
+            done += chunk_size
+        return done
+
+    def write(self, buffer):
+        self._check_closed()
+        data = bytes(buffer)
+        size = max(min(len(data), self._size - self._position), 0)
+        if not size:
+            return 0
+        data = data[:size]
+        address = self._start + self._position
+        self._swd.write_mem(address, data)
+        block = self._block
+        if block is not None:
+            # update overlapping part of read buffer
+            start = max(address, self._block_address)
+            end = min(address + size, self._block_address + len(block))
+            if start < end:
+                block[start - self._block_address:end - self._block_address] = data[
+                    start - address:end - address]
+        self._position += size
+        return size
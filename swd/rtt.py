@@ -0,0 +1,234 @@
+"""SEGGER RTT (Real Time Transfer) over memory access"""
+
+import time as _time
+import struct as _struct
+import swd._elf as _elf
+
+
+class RttException(Exception):
+    """Exception"""
+
+
+class RttBuffer():
+    """RTT ring buffer descriptor"""
+
+    DESCRIPTOR_SIZE = 24
+    _WR_OFF = 12
+    _RD_OFF = 16
+
+    def __init__(self, address, descriptor):
+        self._address = address
+        _, self._buffer, self._size, _, _, self._flags = _struct.unpack(
+            '<IIIIII', descriptor)
+
+    @property
+    def address(self):
+        """Address of buffer descriptor"""
+        return self._address
+
+    @property
+    def buffer(self):
+        """Address of data buffer"""
+        return self._buffer
+
+    @property
+    def size(self):
+        """Size of data buffer"""
+        return self._size
+
+    @property
+    def flags(self):
+        """Buffer flags"""
+        return self._flags
+
+    @property
+    def wr_off_address(self):
+        """Address of write offset"""
+        return self._address + RttBuffer._WR_OFF
+
+    @property
+    def rd_off_address(self):
+        """Address of read offset"""
+        return self._address + RttBuffer._RD_OFF
+
+
+class Rtt():
+    """SEGGER RTT client
+
+    Control block can be given by address, by ELF file (symbol _SEGGER_RTT)
+    or it is searched in RAM range.
+    Target is not halted, all communication is done by memory access.
+    """
+
+    CONTROL_BLOCK_ID = b'SEGGER RTT\0\0\0\0\0\0'
+    CONTROL_BLOCK_SYMBOL = '_SEGGER_RTT'
+    SEARCH_CHUNK_SIZE = 0x4000
+    MAXIMUM_BUFFERS = 32
+
+    def __init__(self, swd, address=None, elf=None, ram_start=0x20000000, ram_size=0x10000):
+        """Connect to RTT control block
+
+        Arguments:
+            swd: instance of Swd
+            address: address of control block (optional)
+            elf: ELF file with _SEGGER_RTT symbol (optional)
+            ram_start: begin of RAM where control block is searched
+            ram_size: size of RAM where control block is searched
+        """
+        self._swd = swd
+        if address is None and elf is not None:
+            address = _elf.get_symbol_address(elf, Rtt.CONTROL_BLOCK_SYMBOL)
+        if address is None:
+            address = self.find_control_block(swd, ram_start, ram_size)
+            if address is None:
+                raise RttException("RTT control block not found")
+        self._address = address
+        self._up_buffers = []
+        self._down_buffers = []
+        self._load_descriptors()
+
+    @classmethod
+    def find_control_block(cls, swd, start, size):
+        """Search memory for RTT control block
+
+        Arguments:
+            swd: instance of Swd
+            start: begin of searched memory
+            size: size of searched memory
+
+        Return:
+            address of control block or None
+        """
+        overlap = len(cls.CONTROL_BLOCK_ID) - 1
+        address = start
+        end = start + size
+        tail = b''
+        while address < end:
+            chunk_size = min(cls.SEARCH_CHUNK_SIZE, end - address)
+            data = tail + bytes(swd.read_mem(address, chunk_size))
+            base = address - len(tail)
+            index = data.find(cls.CONTROL_BLOCK_ID)
+            while index >= 0:
+                if (base + index) % 4 == 0:
+                    return base + index
+                index = data.find(cls.CONTROL_BLOCK_ID, index + 1)
+            tail = data[-overlap:]
+            address += chunk_size
+        return None
+
+    def _load_descriptors(self):
+        header = bytes(self._swd.read_mem(self._address, 24))
+        if header[:16] != Rtt.CONTROL_BLOCK_ID:
+            raise RttException("Wrong RTT control block ID at 0x%08x" % self._address)
+        num_up, num_down = _struct.unpack_from('<II', header, 16)
+        if num_up > Rtt.MAXIMUM_BUFFERS or num_down > Rtt.MAXIMUM_BUFFERS:
+            raise RttException("Wrong number of RTT buffers")
+        address = self._address + 24
+        data = bytes(self._swd.read_mem(address, (num_up + num_down) * RttBuffer.DESCRIPTOR_SIZE))
+        buffers = []
+        for offset in range(0, len(data), RttBuffer.DESCRIPTOR_SIZE):
+            buffers.append(RttBuffer(
+                address + offset,
+                data[offset:offset + RttBuffer.DESCRIPTOR_SIZE]))
+        self._up_buffers = buffers[:num_up]
+        self._down_buffers = buffers[num_up:]
+
+    @property
+    def address(self):
+        """Address of RTT control block"""
+        return self._address
+
+    @property
+    def up_buffers(self):
+        """List of up (target to host) buffers"""
+        return self._up_buffers
+
+    @property
+    def down_buffers(self):
+        """List of down (host to target) buffers"""
+        return self._down_buffers
+
+    def _get_offsets(self, buf):
+        return _struct.unpack('<II', bytes(self._swd.read_mem(buf.wr_off_address, 8)))
+
+    def read(self, channel=0):
+        """Read all available data from up buffer
+
+        Only write and read offsets are read first, then only new data.
+
+        Arguments:
+            channel: up buffer index
+
+        Return:
+            bytes with received data (can be empty)
+        """
+        buf = self._up_buffers[channel]
+        wr_off, rd_off = self._get_offsets(buf)
+        if wr_off == rd_off:
+            return b''
+        if wr_off >= buf.size or rd_off >= buf.size:
+            raise RttException("Corrupted RTT up buffer %d" % channel)
+        if wr_off > rd_off:
+            data = bytes(self._swd.read_mem(buf.buffer + rd_off, wr_off - rd_off))
+        else:
+            data = bytes(self._swd.read_mem(buf.buffer + rd_off, buf.size - rd_off))
+            if wr_off:
+                data += bytes(self._swd.read_mem(buf.buffer, wr_off))
+        self._swd.set_mem32(buf.rd_off_address, wr_off)
+        return data
+
+    def write(self, data, channel=0):
+        """Write data into down buffer
+
+        Arguments:
+            data: bytes to send
+            channel: down buffer index
+
+        Return:
+            number of written bytes (limited by free space in buffer)
+        """
+        buf = self._down_buffers[channel]
+        wr_off, rd_off = self._get_offsets(buf)
+        if wr_off >= buf.size or rd_off >= buf.size:
+            raise RttException("Corrupted RTT down buffer %d" % channel)
+        free = (rd_off - wr_off - 1) % buf.size
+        data = data[:free]
+        if not data:
+            return 0
+        first = min(len(data), buf.size - wr_off)
+        self._swd.write_mem(buf.buffer + wr_off, data[:first])
+        if first < len(data):
+            self._swd.write_mem(buf.buffer, data[first:])
+        self._swd.set_mem32(buf.wr_off_address, (wr_off + len(data)) % buf.size)
+        return len(data)
+
+    def stream(self, output, channel=0, interval_min=0.0005, interval_max=0.05, duration=None):
+        """Stream up buffer into output
+
+        Poll interval adapts to data rate: it is shortened when data are
+        coming and prolonged when buffer is empty.
+
+        Arguments:
+            output: binary file-like object with write() method
+            channel: up buffer index
+            interval_min: minimum poll interval in seconds
+            interval_max: maximum poll interval in seconds
+            duration: stop after this time in seconds (None to run forever)
+        """
+        half_size = self._up_buffers[channel].size // 2
+        interval = interval_min
+        deadline = None if duration is None else _time.monotonic() + duration
+        while deadline is None or _time.monotonic() < deadline:
+            data = self.read(channel)
+            if data:
+                output.write(data)
+                output.flush()
+                if len(data) >= half_size:
+                    # buffer is filling fast, poll again immediately
+                    interval = 0
+                else:
+                    interval = max(interval_min, interval / 2)
+            else:
+                interval = min(interval_max, max(interval_min, interval * 2))
+            if interval:
+                _time.sleep(interval)
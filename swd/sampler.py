@@ -0,0 +1,263 @@
+"""High rate sampling of variables in target memory"""
+
+import sys as _sys
+import array as _array
+import itertools as _itertools
+import math as _math
+import struct as _struct
+import time as _time
+
+
+class SamplerException(Exception):
+    """Exception"""
+
+
+# struct format: array typecode with same item size
+_TYPECODES = {
+    'b': 'b', 'B': 'B',
+    'h': 'h', 'H': 'H',
+    'i': 'i', 'I': 'I',
+    'q': 'q', 'Q': 'Q',
+    'f': 'f', 'd': 'd',
+}
+
+
+class Signal():
+    """Sampled variable"""
+
+    def __init__(self, address, fmt, name=None):
+        """Signal definition
+
+        Arguments:
+            address: address of variable in memory
+            fmt: struct format character (b, B, h, H, i, I, q, Q, f, d)
+            name: name of signal (optional)
+        """
+        if fmt not in _TYPECODES:
+            raise SamplerException("Unsupported signal type '%s'" % fmt)
+        self._address = address
+        self._fmt = fmt
+        self._struct = _struct.Struct('<' + fmt)
+        self._name = name if name is not None else '0x%08x' % address
+
+    @property
+    def address(self):
+        """Address of variable"""
+        return self._address
+
+    @property
+    def fmt(self):
+        """struct format character"""
+        return self._fmt
+
+    @property
+    def size(self):
+        """Size of variable in bytes"""
+        return self._struct.size
+
+    @property
+    def name(self):
+        """Name of signal"""
+        return self._name
+
+    @property
+    def unpack_from(self):
+        """Unpack function for this signal"""
+        return self._struct.unpack_from
+
+
+class SampleResult():
+    """Sampled data"""
+
+    def __init__(self, signals, timestamps, data):
+        self._signals = signals
+        self._timestamps = timestamps
+        self._data = data
+
+    @property
+    def signals(self):
+        """List of Signal"""
+        return self._signals
+
+    @property
+    def timestamps(self):
+        """array with timestamps in nanoseconds (perf_counter_ns)"""
+        return self._timestamps
+
+    @property
+    def data(self):
+        """List of arrays with sampled values, one for each signal"""
+        return self._data
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    @property
+    def duration(self):
+        """Time between first and last sample in seconds"""
+        if len(self._timestamps) < 2:
+            return 0.0
+        return (self._timestamps[-1] - self._timestamps[0]) / 1e9
+
+    @property
+    def rate(self):
+        """Achieved sample rate in Hz"""
+        duration = self.duration
+        return (len(self._timestamps) - 1) / duration if duration else 0.0
+
+    @property
+    def jitter(self):
+        """Standard deviation of sample intervals in seconds"""
+        count = len(self._timestamps) - 1
+        if count < 1:
+            return 0.0
+        mean = (self._timestamps[-1] - self._timestamps[0]) / count
+        squares = 0
+        prev = self._timestamps[0]
+        for timestamp in _itertools.islice(self._timestamps, 1, None):
+            squares += (timestamp - prev - mean) ** 2
+            prev = timestamp
+        return _math.sqrt(squares / count) / 1e9
+
+    def to_numpy(self):
+        """Convert result into NumPy arrays (NumPy is optional dependency)
+
+        Return:
+            tuple (timestamps, list of arrays)
+        """
+        import numpy
+        return (
+            numpy.frombuffer(self._timestamps, dtype=numpy.int64),
+            [numpy.frombuffer(data, dtype=numpy.dtype(data.typecode)) for data in self._data])
+
+    def save_csv(self, filename):
+        """Save result into CSV file, time is in seconds from first sample"""
+        start = self._timestamps[0] if self._timestamps else 0
+        with open(filename, 'w') as csv_file:
+            csv_file.write(','.join(['time'] + [sig.name for sig in self._signals]) + '\n')
+            for index, timestamp in enumerate(self._timestamps):
+                values = [repr(data[index]) for data in self._data]
+                csv_file.write('%.9f,%s\n' % ((timestamp - start) / 1e9, ','.join(values)))
+
+    BIN_MAGIC = b'PYSWDSMP'
+
+    def save_bin(self, filename):
+        """Save result into binary file
+
+        Format (little endian): magic, number of samples, number of signals,
+        for each signal: address and format character, then timestamps
+        array (int64) and arrays of all signals.
+        """
+        with open(filename, 'wb') as bin_file:
+            bin_file.write(_struct.pack(
+                '<8sII', SampleResult.BIN_MAGIC, len(self), len(self._signals)))
+            for sig in self._signals:
+                bin_file.write(_struct.pack('<Ic', sig.address, sig.fmt.encode()))
+            for data in [self._timestamps] + self._data:
+                if data.itemsize > 1 and _sys.byteorder != 'little':
+                    data = _array.array(data.typecode, data)
+                    data.byteswap()
+                data.tofile(bin_file)
+
+
+class Sampler():
+    """Sample set of variables with coalesced memory reads"""
+
+    MAXIMUM_GAP = 32
+    MAXIMUM_READ_SIZE = 1024
+
+    def __init__(self, swd, signals, maximum_gap=MAXIMUM_GAP):
+        """Sampler
+
+        Arguments:
+            swd: instance of Swd
+            signals: list of Signal or tuples (address, fmt[, name])
+            maximum_gap: maximum number of unused bytes between signals
+                joined into one read
+        """
+        self._swd = swd
+        self._signals = [
+            sig if isinstance(sig, Signal) else Signal(*sig)
+            for sig in signals]
+        if not self._signals:
+            raise SamplerException("No signals")
+        self._plan = self._plan_reads(maximum_gap)
+
+    @property
+    def signals(self):
+        """List of Signal"""
+        return self._signals
+
+    @property
+    def plan(self):
+        """List of reads (address, size) done for each sample"""
+        return [(address, size) for address, size, _ in self._plan]
+
+    def _plan_reads(self, maximum_gap):
+        order = sorted(range(len(self._signals)), key=lambda i: self._signals[i].address)
+        plan = []
+        start = end = None
+        fields = []
+        for index in order:
+            sig = self._signals[index]
+            sig_start = sig.address & ~3
+            sig_end = (sig.address + sig.size + 3) & ~3
+            if (start is None or sig_start > end + maximum_gap
+                    or sig_end - start > Sampler.MAXIMUM_READ_SIZE):
+                if start is not None:
+                    plan.append((start, end - start, fields))
+                start, end, fields = sig_start, sig_end, []
+            end = max(end, sig_end)
+            fields.append((index, sig.address - start, sig.unpack_from))
+        plan.append((start, end - start, fields))
+        return plan
+
+    def sample_once(self):
+        """Read all signals once
+
+        Return:
+            list of values in order of signals
+        """
+        values = [None] * len(self._signals)
+        for address, size, fields in self._plan:
+            data = bytes(self._swd.read_mem(address, size))
+            for index, offset, unpack_from in fields:
+                values[index] = unpack_from(data, offset)[0]
+        return values
+
+    def sample(self, count, rate=None):
+        """Sample all signals
+
+        Arguments:
+            count: number of samples
+            rate: sample rate in Hz, or None for maximum rate
+
+        Return:
+            instance of SampleResult
+        """
+        timestamps = _array.array('q', [0]) * count
+        data = [
+            _array.array(_TYPECODES[sig.fmt], [0]) * count
+            for sig in self._signals]
+        plan = [
+            (address, size, [(data[index], offset, unpack_from) for index, offset, unpack_from in fields])
+            for address, size, fields in self._plan]
+        read_mem = self._swd.read_mem
+        perf_counter_ns = _time.perf_counter_ns
+        period = int(1e9 / rate) if rate else 0
+        next_time = perf_counter_ns()
+        for sample in range(count):
+            if period:
+                wait = next_time - perf_counter_ns()
+                if wait > 2000000:
+                    # sleep only coarse part, rest is busy wait
+                    _time.sleep((wait - 1000000) / 1e9)
+                while perf_counter_ns() < next_time:
+                    pass
+                next_time += period
+            timestamps[sample] = perf_counter_ns()
+            for address, size, fields in plan:
+                chunk = bytes(read_mem(address, size))
+                for buffer, offset, unpack_from in fields:
+                    buffer[sample] = unpack_from(chunk, offset)[0]
+        return SampleResult(self._signals, timestamps, data)
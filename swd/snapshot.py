@@ -0,0 +1,332 @@
+"""Memory snapshots and diffing"""
+
+import struct as _struct
+import time as _time
+import zlib as _zlib
+
+# NumPy is optional, it is imported on first diff, False if it is not installed
+_numpy = None
+
+
+def _import_numpy():
+    global _numpy  # pylint: disable=global-statement
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+class SnapshotException(Exception):
+    """Exception"""
+
+
+class Snapshot():
+    """Content of memory regions at one moment"""
+
+    BIN_MAGIC = b'PYSWDSNP'
+    BLOCK_SIZE = 256
+
+    def __init__(self, regions, timestamp=None):
+        """Snapshot
+
+        Arguments:
+            regions: list of tuples (address, data)
+            timestamp: time of snapshot (default is now)
+        """
+        self._regions = [(address, bytes(data)) for address, data in regions]
+        self._timestamp = _time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def take(cls, swd, regions):
+        """Read memory regions
+
+        Arguments:
+            swd: instance of Swd
+            regions: list of tuples (address, size)
+
+        Return:
+            instance of Snapshot
+        """
+        result = []
+        for address, size in regions:
+            data = b''.join(chunk for _, chunk in swd.read_chunks(address, size))
+            result.append((address, data))
+        return cls(result)
+
+    @property
+    def regions(self):
+        """List of tuples (address, data)"""
+        return self._regions
+
+    @property
+    def timestamp(self):
+        """Time of snapshot (seconds since epoch)"""
+        return self._timestamp
+
+    def _write_regions(self, bin_file, block_size):
+        for address, data in self._regions:
+            zero_block = bytes(block_size)
+            bitmap = bytearray((len(data) + block_size * 8 - 1) // (block_size * 8))
+            compressor = _zlib.compressobj()
+            compressed = []
+            for index, offset in enumerate(range(0, len(data), block_size)):
+                block = data[offset:offset + block_size]
+                if block == zero_block[:len(block)]:
+                    continue
+                bitmap[index // 8] |= 1 << (index % 8)
+                compressed.append(compressor.compress(block))
+            compressed.append(compressor.flush())
+            compressed = b''.join(compressed)
+            bin_file.write(_struct.pack(
+                '<IIII', address, len(data), block_size, len(compressed)))
+            bin_file.write(bitmap)
+            bin_file.write(compressed)
+
+    @staticmethod
+    def _read_regions(bin_file, count):
+        regions = []
+        for _ in range(count):
+            address, size, block_size, compressed_size = _struct.unpack(
+                '<IIII', bin_file.read(16))
+            bitmap = bin_file.read((size + block_size * 8 - 1) // (block_size * 8))
+            blocks = _zlib.decompress(bin_file.read(compressed_size))
+            data = bytearray(size)
+            position = 0
+            for index, offset in enumerate(range(0, size, block_size)):
+                if bitmap[index // 8] & (1 << (index % 8)):
+                    length = min(block_size, size - offset)
+                    data[offset:offset + length] = blocks[position:position + length]
+                    position += length
+            regions.append((address, bytes(data)))
+        return regions
+
+    def save(self, filename, block_size=BLOCK_SIZE):
+        """Save snapshot into compact binary file
+
+        Format (little endian): magic, timestamp (double), number of regions,
+        then for each region: address, size, block size, bitmap of non-zero
+        blocks and zlib compressed non-zero blocks. Zero blocks are not stored.
+        """
+        with open(filename, 'wb') as bin_file:
+            bin_file.write(_struct.pack(
+                '<8sdI', self.BIN_MAGIC, self._timestamp, len(self._regions)))
+            self._write_regions(bin_file, block_size)
+
+    @classmethod
+    def load(cls, filename):
+        """Load snapshot from binary file"""
+        with open(filename, 'rb') as bin_file:
+            magic, timestamp, count = _struct.unpack('<8sdI', bin_file.read(20))
+            if magic != cls.BIN_MAGIC:
+                raise SnapshotException("Not a snapshot file")
+            regions = cls._read_regions(bin_file, count)
+        return cls(regions, timestamp)
+
+    def write_changed(self, swd, block_size=BLOCK_SIZE):
+        """Write snapshot back into memory
+
+        Memory is read and only blocks which differ are written,
+        neighbouring changed blocks are written at once. Snapshot is expected
+        to contain RAM, so writes are repeated after USB error.
+
+        Arguments:
+            swd: instance of Swd
+            block_size: size of compared blocks
+
+        Return:
+            number of written bytes
+        """
+        written = 0
+        for address, data in self._regions:
+            # memory is written after whole region is read, reading is prefetched
+            changed = []
+            for chunk_address, chunk in swd.read_chunks(address, len(data)):
+                offset = chunk_address - address
+                for block in range(0, len(chunk), block_size):
+                    start = offset + block
+                    end = min(start + block_size, offset + len(chunk))
+                    if chunk[block:block + block_size] == data[start:end]:
+                        continue
+                    if changed and changed[-1][1] == start:
+                        changed[-1] = (changed[-1][0], end)
+                    else:
+                        changed.append((start, end))
+            for start, end in changed:
+                swd.write_mem(address + start, data[start:end], retry=True)
+                written += end - start
+        return written
+
+
+class Checkpoint(Snapshot):
+    """Snapshot of memory regions together with core registers"""
+
+    BIN_MAGIC = b'PYSWDCKP'
+
+    def __init__(self, regions, registers, timestamp=None):
+        """Checkpoint
+
+        Arguments:
+            regions: list of tuples (address, data)
+            registers: dictionary with register name and value
+            timestamp: time of checkpoint (default is now)
+        """
+        super().__init__(regions, timestamp)
+        self._registers = dict(registers)
+
+    @property
+    def registers(self):
+        """Dictionary with register name and value"""
+        return self._registers
+
+    def save(self, filename, block_size=Snapshot.BLOCK_SIZE):
+        """Save checkpoint into compact binary file
+
+        Format is same as snapshot (with different magic) followed by
+        number of registers and for each register its name (16 bytes)
+        and value.
+        """
+        with open(filename, 'wb') as bin_file:
+            bin_file.write(_struct.pack(
+                '<8sdI', self.BIN_MAGIC, self._timestamp, len(self._regions)))
+            self._write_regions(bin_file, block_size)
+            bin_file.write(_struct.pack('<I', len(self._registers)))
+            for reg, value in self._registers.items():
+                bin_file.write(_struct.pack('<16sI', reg.encode(), value))
+
+    @classmethod
+    def load(cls, filename):
+        """Load checkpoint from binary file"""
+        with open(filename, 'rb') as bin_file:
+            magic, timestamp, count = _struct.unpack('<8sdI', bin_file.read(20))
+            if magic != cls.BIN_MAGIC:
+                raise SnapshotException("Not a checkpoint file")
+            regions = cls._read_regions(bin_file, count)
+            registers = {}
+            count, = _struct.unpack('<I', bin_file.read(4))
+            for _ in range(count):
+                reg, value = _struct.unpack('<16sI', bin_file.read(20))
+                registers[reg.rstrip(b'\0').decode()] = value
+        return cls(regions, registers, timestamp)
+
+
+class SnapshotDiff():
+    """Differences between two snapshots"""
+
+    def __init__(self, ranges, words):
+        self._ranges = ranges
+        self._words = words
+
+    @property
+    def ranges(self):
+        """List of changed ranges (address, size)"""
+        return self._ranges
+
+    @property
+    def words(self):
+        """List of changed 32 bit words (address, old value, new value)"""
+        return self._words
+
+
+def _get_changed_ranges_numpy(old, new):
+    """Return list of changed ranges (offset, size) computed by NumPy"""
+    changed = _numpy.flatnonzero(
+        _numpy.frombuffer(old, dtype=_numpy.uint8) != _numpy.frombuffer(new, dtype=_numpy.uint8))
+    if not changed.size:
+        return []
+    breaks = _numpy.flatnonzero(_numpy.diff(changed) != 1)
+    starts = _numpy.concatenate((changed[:1], changed[breaks + 1]))
+    ends = _numpy.concatenate((changed[breaks], changed[-1:])) + 1
+    return [(int(start), int(end - start)) for start, end in zip(starts, ends)]
+
+
+def _get_changed_ranges_bytes(old, new, block_size):
+    """Return list of changed ranges (offset, size) by comparing blocks"""
+    ranges = []
+    old = memoryview(old)
+    new = memoryview(new)
+    for block in range(0, len(old), block_size):
+        if old[block:block + block_size] == new[block:block + block_size]:
+            continue
+        for offset in range(block, min(block + block_size, len(old))):
+            if old[offset] == new[offset]:
+                continue
+            if ranges and sum(ranges[-1]) == offset:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+            else:
+                ranges.append((offset, 1))
+    return ranges
+
+
+def diff(old, new, block_size=Snapshot.BLOCK_SIZE):
+    """Compare two snapshots
+
+    Comparison is vectorized when NumPy is available,
+    otherwise only changed blocks are compared byte by byte.
+
+    Arguments:
+        old: instance of Snapshot
+        new: instance of Snapshot with same regions
+        block_size: size of compared blocks
+
+    Return:
+        instance of SnapshotDiff
+    """
+    if [(a, len(d)) for a, d in old.regions] != [(a, len(d)) for a, d in new.regions]:
+        raise SnapshotException("Snapshots have different regions")
+    ranges = []
+    words = []
+    for (address, old_data), (_, new_data) in zip(old.regions, new.regions):
+        if old_data == new_data:
+            continue
+        if _import_numpy():
+            changed = _get_changed_ranges_numpy(old_data, new_data)
+        else:
+            changed = _get_changed_ranges_bytes(old_data, new_data, block_size)
+        last_word = None
+        for offset, size in changed:
+            ranges.append((address + offset, size))
+            word_start = (address + offset) & ~3
+            if word_start == last_word:
+                word_start += 4
+            for word in range(word_start, address + offset + size, 4):
+                start = max(word - address, 0)
+                end = word + 4 - address
+                words.append((
+                    word,
+                    int.from_bytes(old_data[start:end], byteorder='little'),
+                    int.from_bytes(new_data[start:end], byteorder='little')))
+                last_word = word
+    return SnapshotDiff(ranges, words)
+
+
+def count_changes(snapshots):
+    """Count changes of each word over sequence of snapshots
+
+    Arguments:
+        snapshots: list of Snapshot with same regions
+
+    Return:
+        dictionary with word address and number of changes
+    """
+    counts = {}
+    for old, new in zip(snapshots, snapshots[1:]):
+        for address, _, _ in diff(old, new).words:
+            counts[address] = counts.get(address, 0) + 1
+    return counts
+
+
+def find_changed(snapshots, times):
+    """Find words which changed exactly selected number of times
+
+    Arguments:
+        snapshots: list of Snapshot with same regions
+        times: number of changes
+
+    Return:
+        sorted list of word addresses
+    """
+    return sorted(
+        address for address, count in count_changes(snapshots).items() if count == times)
@@ -0,0 +1,183 @@
+"""Stack usage measurement by painting stacks with pattern"""
+
+
+class StackException(Exception):
+    """Exception"""
+
+
+class StackRegion():
+    """Stack memory region, stack grows down from end to start"""
+
+    def __init__(self, start, size, name=None):
+        """Stack region
+
+        Arguments:
+            start: lowest address of stack (aligned to 4)
+            size: size of stack in bytes (aligned to 4)
+            name: name of stack (optional)
+        """
+        if start % 4 or size % 4 or size <= 0:
+            raise StackException("Stack region must be aligned to 4 bytes")
+        self._start = start
+        self._size = size
+        self._name = name if name is not None else '0x%08x' % start
+
+    @property
+    def start(self):
+        """Lowest address of stack"""
+        return self._start
+
+    @property
+    def size(self):
+        """Size of stack"""
+        return self._size
+
+    @property
+    def end(self):
+        """Address after top of stack"""
+        return self._start + self._size
+
+    @property
+    def name(self):
+        """Name of stack"""
+        return self._name
+
+
+class StackUsage():
+    """Result of stack scan"""
+
+    def __init__(self, region, watermark):
+        self._region = region
+        self._watermark = watermark
+
+    @property
+    def region(self):
+        """StackRegion"""
+        return self._region
+
+    @property
+    def watermark(self):
+        """Lowest address which was used by stack"""
+        return self._watermark
+
+    @property
+    def used(self):
+        """Maximum used bytes"""
+        return self._region.end - self._watermark
+
+    @property
+    def free(self):
+        """Never used bytes"""
+        return self._watermark - self._region.start
+
+    @property
+    def overflow(self):
+        """True if whole stack was used (pattern at start of stack is lost)"""
+        return self._watermark == self._region.start
+
+    def __repr__(self):
+        return 'StackUsage(%s, used=%d, free=%d)' % (self._region.name, self.used, self.free)
+
+
+class StackMonitor():
+    """Paint stacks with pattern and measure maximum stack usage
+
+    Stacks must be painted before they are used, e.g. when core is
+    halted after reset, or by firmware itself with same pattern.
+    """
+
+    PATTERN = 0xa5a5a5a5
+    PROBE_SIZE = 64
+    WINDOW_SIZE = 1024
+
+    def __init__(self, swd, regions, pattern=PATTERN):
+        """Stack monitor
+
+        Arguments:
+            swd: instance of Swd
+            regions: list of StackRegion or tuples (start, size[, name])
+            pattern: 32 bit pattern
+        """
+        self._swd = swd
+        self._regions = [
+            region if isinstance(region, StackRegion) else StackRegion(*region)
+            for region in regions]
+        self._pattern = pattern.to_bytes(4, byteorder='little')
+
+    @property
+    def regions(self):
+        """List of StackRegion"""
+        return self._regions
+
+    def paint(self):
+        """Fill all stack regions with pattern"""
+        for region in self._regions:
+            self._swd.fill_mem(region.start, list(self._pattern), region.size, retry=True)
+
+    def _is_painted(self, address, size):
+        data = bytes(self._swd.read_mem(address, size))
+        return data == self._pattern * (size // 4)
+
+    def _find_watermark(self, address, size):
+        """Return address of first word which is not pattern or end of range"""
+        data = bytes(self._swd.read_mem(address, size))
+        pattern = self._pattern
+        for offset in range(0, size, 4):
+            if data[offset:offset + 4] != pattern:
+                return address + offset
+        return address + size
+
+    def _scan_linear(self, region):
+        """Scan stack from start by big reads until first used word"""
+        address = region.start
+        while address < region.end:
+            size = min(StackMonitor.WINDOW_SIZE, region.end - address)
+            watermark = self._find_watermark(address, size)
+            if watermark < address + size:
+                return watermark
+            address += size
+        return region.end
+
+    def scan_region(self, region, full=False):
+        """Find lowest used address of stack
+
+        Painted blocks at start of stack are found by binary search with
+        small probes, until remaining range fits into one read, which is
+        then scanned word by word. Search expects that used part of stack
+        contains no probe which looks painted (e.g. unused gap in stack frame
+        or buffer with pattern), otherwise usage is too low, full scan reads
+        whole unused part of stack from its start.
+
+        Arguments:
+            region: StackRegion
+            full: scan stack from start by big reads instead of binary search
+
+        Return:
+            instance of StackUsage
+        """
+        if full:
+            return StackUsage(region, self._scan_linear(region))
+        probe_size = StackMonitor.PROBE_SIZE
+        # blocks before low are painted, block high is used
+        low = 0
+        high = region.size // probe_size
+        while (high - low + 1) * probe_size > StackMonitor.WINDOW_SIZE:
+            middle = (low + high) // 2
+            if self._is_painted(region.start + middle * probe_size, probe_size):
+                low = middle + 1
+            else:
+                high = middle
+        start = region.start + low * probe_size
+        end = min(region.start + (high + 1) * probe_size, region.end)
+        return StackUsage(region, self._find_watermark(start, end - start))
+
+    def scan(self, full=False):
+        """Scan all stack regions
+
+        Arguments:
+            full: scan stacks from start instead of binary search (see scan_region)
+
+        Return:
+            list of StackUsage
+        """
+        return [self.scan_region(region, full) for region in self._regions]
@@ -1,6 +1,10 @@
 """ST-Link/V2 driver"""
 
+import logging as _logging
 from swd.stlinkcom import StlinkCom as _StlinkCom
+from swd.stlinkcom import StlinkComException as _StlinkComException
+import swd._cache as _cache
+import swd._lock as _lock
 import swd._log as _log
 
 
@@ -49,6 +53,8 @@ class Stlink():
             STEPCORE = 0x0a
             READMEM_8BIT = 0x0c
             WRITEMEM_8BIT = 0x0d
+            READMEM_16BIT = 0x47
+            WRITEMEM_16BIT = 0x48
             EXIT = 0x21
             READCOREID = 0x22
             SYNC = 0x3e
@@ -78,6 +84,7 @@ class Stlink():
                 READALLREGS = 0x3a
                 GETLASTRWSTAT = 0x3b
                 DRIVE_NRST = 0x3c
+                GETLASTRWSTAT2 = 0x3e
                 START_TRACE_RX = 0x40
                 STOP_TRACE_RX = 0x41
                 GET_TRACE_NB = 0x42
@@ -97,17 +104,41 @@ class Stlink():
         (100000, 40, ),
         (50000, 79, ),
         (25000, 158, ),
-        # 16-bit number is not currently supported
-        # (15000, 265, ),
-        # (5000, 798, ),
+        (15000, 265, ),
+        (5000, 798, ),
     )
+    DEFAULT_FREQUENCY = 1800000
+    # swd_frequency for automatic selection of fastest reliable frequency
+    AUTO_FREQUENCY = 'auto'
+    # SRAM area for pattern test of automatic frequency selection (content is restored)
+    AUTO_FREQUENCY_ADDRESS = 0x20000000
+    AUTO_FREQUENCY_SIZE = 64
+    # number of reads of constant registers for read only test in attach mode
+    _AUTO_FREQUENCY_READS = 8
+    # core is halted during pattern test, so firmware does not use tested memory
+    _DHCSR_REG = 0xe000edf0
+    _DHCSR_KEY = 0xa05f0000
+    _DHCSR_HALT = _DHCSR_KEY | 0x00000003
+    _DHCSR_CONTROL_MASK = 0x0000000f
+    _DHCSR_STATUS_HALT_BIT = 0x00020000
+    _HALT_POLLS = 10
+    _CPUID_REG = 0xe000ed00
 
     _STLINK_MAXIMUM_TRANSFER_SIZE = 1024
     _STLINK_MAXIMUM_8BIT_DATA = 64
 
+    # chunk sizes used by Swd, only 16 bit access depends on firmware
     MAXIMUM_8BIT_DATA = 4
+    MAXIMUM_16BIT_DATA = 0
     MAXIMUM_32BIT_DATA = _STLINK_MAXIMUM_TRANSFER_SIZE
 
+    # minimal USB timeout in ms
+    TIMEOUT = 200
+    # SWD clocks per byte of memory transfer (32 bit access with overhead)
+    _SWD_CLOCKS_PER_BYTE = 12
+    # number of attempts of memory transfer, USB is reconnected before next attempt
+    RETRIES = 3
+
 
     class StlinkVersion():
         """ST-Link version holder class"""
@@ -157,51 +188,306 @@ class Stlink():
             """String representation"""
             return self._str
 
+        @property
+        def has_mem16(self):
+            """Firmware support 16 bit memory access (JTAG version 26 and newer)"""
+            return self._jtag >= 26
+
+        @property
+        def has_last_rw_status2(self):
+            """Firmware support GETLASTRWSTAT2 with fault address (JTAG version 15 and newer)"""
+            return self._jtag >= 15
+
     @_log.log(_log.DEBUG2)
-    def __init__(self, swd_frequency=1800000, com=None, serial_no=''):
+    def __init__(
+            self, swd_frequency=DEFAULT_FREQUENCY, com=None, serial_no='', attach=False,
+            auto_frequency_address=AUTO_FREQUENCY_ADDRESS):
+        """ST-Link driver
+
+        Arguments:
+            swd_frequency: SWD frequency or 'auto' for fastest frequency
+                which pass pattern test in SRAM (cached per serial number and IDCODE),
+                core is halted during test, in attach mode memory is not written
+                and only IDCODE and CPUID are read
+            com: communication driver (default is StlinkCom)
+            serial_no: serial number of ST-Link (or its begin or end)
+            attach: reuse existing SWD session if ST-Link is already in debug mode,
+                version and frequency are cached per serial number (only in attach
+                mode, normal connection does not read serial number nor write cache)
+            auto_frequency_address: address of 64 Bytes of RAM for pattern test
+                of automatic frequency selection (content is restored)
+        """
         if com is None:
             # default com driver is StlinkCom
             com = _StlinkCom(serial_no)
         self._com = com
-        self._version = self._get_version()
-        self._leave_state()
-        if self._version.jtag >= 22:
-            self._set_swd_freq(swd_frequency)
-        self._enter_debug_swd()
+        # lock of probe, com drivers without lock get own lock
+        self.lock = getattr(com, 'lock', None) or _lock.ProbeLock()
+        # default frequency of ST-Link, is changed by _set_swd_freq
+        self._swd_frequency = Stlink.DEFAULT_FREQUENCY
+        self._requested_frequency = swd_frequency
+        self._auto_frequency_address = auto_frequency_address
+        if attach:
+            self._attach(swd_frequency)
+        else:
+            self._version = self._get_version()
+            self._leave_state()
+            if self._version.jtag >= 22:
+                self._set_swd_freq(swd_frequency)
+            self._enter_debug_swd()
+        self._set_capabilities()
+        if swd_frequency == Stlink.AUTO_FREQUENCY and self._version.jtag >= 22:
+            self._auto_swd_freq(read_only=attach)
+
+    def _set_capabilities(self):
+        """Enable 16 bit access by firmware version
+
+        Swd use 8 bit access only to align address and size (MAXIMUM_8BIT_DATA
+        stays 4), so registers are not accessed by bytes and number of bus
+        accesses is not increased. 32 bit transfers are limited to 1024 Bytes
+        by all firmware of ST-Link/V2 and V2-1, so chunk sizes of read_mem()
+        and write_mem() do not depend on firmware.
+        """
+        if self._version.has_mem16:
+            self.MAXIMUM_16BIT_DATA = Stlink._STLINK_MAXIMUM_TRANSFER_SIZE
+        else:
+            self.MAXIMUM_16BIT_DATA = 0
+
+    def get_capabilities(self):
+        """Get capabilities of connected ST-Link
+
+        Return:
+            dictionary with maximum sizes of 8 (read_mem8, write_mem8), 16 and
+            32 bit transfers (0 if access is not supported) and support of fault
+            address in last read/write status
+        """
+        return {
+            'maximum_8bit_data': Stlink._STLINK_MAXIMUM_8BIT_DATA,
+            'maximum_16bit_data': self.MAXIMUM_16BIT_DATA,
+            'maximum_32bit_data': self.MAXIMUM_32BIT_DATA,
+            'last_rw_status2': self._version.has_last_rw_status2,
+        }
+
+    def _get_cache_key(self):
+        # com drivers without serial number are not cached
+        return getattr(self._com, 'serial_no', None)
+
+    def _update_cache(self, swd_frequency, cached=None):
+        key = self._get_cache_key()
+        if not key:
+            return
+        entry = {
+            'dev': self._com.version,
+            'version': self._version_raw,
+            'frequency': swd_frequency,
+        }
+        if entry != cached:
+            _cache.put('stlink', key, entry)
+
+    @_log.log(_log.DEBUG3)
+    def _attach(self, swd_frequency):
+        key = self._get_cache_key()
+        cached = _cache.get('stlink', key) if key else None
+        if cached and cached.get('dev') == self._com.version:
+            self._version_raw = cached['version']
+            self._version = Stlink.StlinkVersion(self._com.version, self._version_raw)
+        else:
+            self._version = self._get_version()
+        mode = self._get_current_mode()
+        if mode == Stlink._Cmd.Mode.DEBUG and self._is_swd_connected():
+            # frequency is unknown when previous session was not cached
+            if self._version.jtag >= 22 and (
+                    not cached or cached.get('frequency') != swd_frequency):
+                self._set_swd_freq(swd_frequency)
+            elif self._version.jtag >= 22:
+                self._swd_frequency = self._get_swd_freq(swd_frequency)[0]
+        else:
+            self._leave_state(mode)
+            if self._version.jtag >= 22:
+                self._set_swd_freq(swd_frequency)
+            self._enter_debug_swd()
+        self._update_cache(swd_frequency, cached)
 
     @_log.log(_log.DEBUG3)
     def _get_version(self):
         res = self._com.xfer([Stlink._Cmd.GET_VERSION, 0x80], rx_length=6)
-        ver = int.from_bytes(res[:2], byteorder='big')
-        return Stlink.StlinkVersion(self._com.version, ver)
+        self._version_raw = int.from_bytes(res[:2], byteorder='big')
+        return Stlink.StlinkVersion(self._com.version, self._version_raw)
 
     @_log.log(_log.DEBUG3)
-    def _leave_state(self):
+    def _get_current_mode(self):
         res = self._com.xfer([Stlink._Cmd.GET_CURRENT_MODE], rx_length=2)
-        if res[0] == Stlink._Cmd.Mode.DFU:
+        return res[0]
+
+    @_log.log(_log.DEBUG3)
+    def _is_swd_connected(self):
+        cmd = [
+            Stlink._Cmd.Debug.COMMAND,
+            Stlink._Cmd.Debug.Apiv2.READ_IDCODES]
+        res = self._com.xfer(cmd, rx_length=12)
+        return res[0] == 0x80 and int.from_bytes(res[4:8], byteorder='little') != 0
+
+    @_log.log(_log.DEBUG3)
+    def _leave_state(self, mode=None):
+        if mode is None:
+            mode = self._get_current_mode()
+        if mode == Stlink._Cmd.Mode.DFU:
             cmd = [Stlink._Cmd.Dfu.COMMAND, Stlink._Cmd.Dfu.EXIT]
-        elif res[0] == Stlink._Cmd.Mode.DEBUG:
+        elif mode == Stlink._Cmd.Mode.DEBUG:
             cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.EXIT]
-        elif res[0] == Stlink._Cmd.Mode.SWIM:
+        elif mode == Stlink._Cmd.Mode.SWIM:
             cmd = [Stlink._Cmd.Swim.COMMAND, Stlink._Cmd.Swim.EXIT]
         else:
             return
         self._com.xfer(cmd)
 
-    @_log.log(_log.DEBUG3)
-    def _set_swd_freq(self, frequency=1800000):
+    @staticmethod
+    def _get_swd_freq(frequency):
+        """Return highest supported frequency (and its divisor) not above frequency"""
+        if frequency == Stlink.AUTO_FREQUENCY:
+            # automatic selection starts with default frequency
+            frequency = Stlink.DEFAULT_FREQUENCY
         for freq, data in Stlink._SWD_FREQ:
             if frequency >= freq:
-                cmd = [
-                    Stlink._Cmd.Debug.COMMAND,
-                    Stlink._Cmd.Debug.Apiv2.SWD_SET_FREQ,
-                    data]
-                res = self._com.xfer(cmd, rx_length=2)
-                if res[0] != 0x80:
-                    raise StlinkException("Error switching SWD frequency")
-                return
+                return freq, data
         raise StlinkException("Selected SWD frequency is too low")
 
+    @_log.log(_log.DEBUG3)
+    def _set_swd_freq(self, frequency=1800000):
+        freq, data = self._get_swd_freq(frequency)
+        cmd = [
+            Stlink._Cmd.Debug.COMMAND,
+            Stlink._Cmd.Debug.Apiv2.SWD_SET_FREQ]
+        cmd.extend(list(data.to_bytes(2, byteorder='little')))
+        res = self._com.xfer(cmd, rx_length=2)
+        if res[0] != 0x80:
+            raise StlinkException("Error switching SWD frequency")
+        self._swd_frequency = freq
+
+    def _test_swd_freq(self, address, size):
+        """Write patterns into memory and read them back, return True if all match"""
+        patterns = (
+            [0x55] * size,
+            [0xaa] * size,
+            [(index * 0x1d + 0x0f) & 0xff for index in range(size)],
+        )
+        try:
+            self.get_idcode()
+            for pattern in patterns:
+                self.write_mem32(address, pattern)
+                if list(self.read_mem32(address, size)) != pattern:
+                    return False
+        except (StlinkException, _StlinkComException):
+            return False
+        return True
+
+    def _test_swd_freq_read_only(self, idcode, cpuid):
+        """Read IDCODE and CPUID repeatedly, return True if all reads match"""
+        try:
+            for _ in range(Stlink._AUTO_FREQUENCY_READS):
+                if self.get_idcode() != idcode:
+                    return False
+                if self.get_mem32(Stlink._CPUID_REG) != cpuid:
+                    return False
+        except (StlinkException, _StlinkComException):
+            return False
+        return True
+
+    def _halt_for_test(self):
+        """Halt core, return DHCSR control bits to restore or None if core was halted"""
+        dhcsr = self.get_mem32(Stlink._DHCSR_REG)
+        if dhcsr & Stlink._DHCSR_STATUS_HALT_BIT:
+            return None
+        self.set_mem32(Stlink._DHCSR_REG, Stlink._DHCSR_HALT)
+        for _ in range(Stlink._HALT_POLLS):
+            if self.get_mem32(Stlink._DHCSR_REG) & Stlink._DHCSR_STATUS_HALT_BIT:
+                return dhcsr & Stlink._DHCSR_CONTROL_MASK
+        self.set_mem32(Stlink._DHCSR_REG, Stlink._DHCSR_KEY | (
+            dhcsr & Stlink._DHCSR_CONTROL_MASK))
+        raise StlinkException("Core can not be halted for SWD frequency test")
+
+    def _check_test_memory(self, address):
+        """Raise error if last read of pattern test memory failed"""
+        status, _ = self.get_last_rw_status()
+        if status != 0x80:
+            raise StlinkException(
+                "Can not access RAM at 0x%08x for SWD frequency test "
+                "(select other address)" % address)
+
+    def _select_swd_freq(self, test):
+        """Return fastest frequency which pass test"""
+        for freq, _ in Stlink._SWD_FREQ:
+            self._set_swd_freq(freq)
+            if test():
+                return freq
+            _logging.info("SWD frequency %d Hz failed", freq)
+        raise StlinkException("No reliable SWD frequency")
+
+    def _auto_swd_freq_pattern(self):
+        """Pattern test in RAM with halted core, return selected frequency"""
+        address = self._auto_frequency_address
+        size = Stlink.AUTO_FREQUENCY_SIZE
+        control = self._halt_for_test()
+        try:
+            saved = list(self.read_mem32(address, size))
+            self._check_test_memory(address)
+            if not self._test_swd_freq(address, size):
+                self.write_mem32(address, saved)
+                raise StlinkException(
+                    "Pattern test of RAM at 0x%08x failed at lowest SWD frequency "
+                    "(select other address)" % address)
+            freq = self._select_swd_freq(lambda: self._test_swd_freq(address, size))
+            self.write_mem32(address, saved, retry=True)
+        finally:
+            if control is not None:
+                # clear C_HALT, core continue running
+                self.set_mem32(Stlink._DHCSR_REG, Stlink._DHCSR_KEY | control)
+        return freq
+
+    @_log.log(_log.DEBUG2)
+    def _auto_swd_freq(self, read_only=False):
+        """Select fastest frequency which pass test
+
+        Core is halted and memory is saved at slowest frequency, then
+        frequencies are tried from fastest and memory is restored at selected
+        frequency. With read_only (attach mode) target is not touched, only
+        IDCODE and CPUID are read. Result is cached per ST-Link serial number
+        and IDCODE.
+        """
+        slowest = Stlink._SWD_FREQ[-1][0]
+        try:
+            idcode = self.get_idcode()
+        except StlinkException:
+            self._set_swd_freq(slowest)
+            idcode = self.get_idcode()
+        key = self._get_cache_key()
+        if key:
+            key = '%s:%08x' % (key, idcode)
+            cached = _cache.get('frequency', key)
+            if cached is not None:
+                self._set_swd_freq(cached)
+                self._requested_frequency = cached
+                return
+        self._set_swd_freq(slowest)
+        if read_only:
+            cpuid = self.get_mem32(Stlink._CPUID_REG)
+            freq = self._select_swd_freq(
+                lambda: self._test_swd_freq_read_only(idcode, cpuid))
+        else:
+            freq = self._auto_swd_freq_pattern()
+        self._requested_frequency = freq
+        _logging.info("Selected SWD frequency %d Hz", freq)
+        if key:
+            _cache.put('frequency', key, freq)
+
+    def get_swd_frequency(self):
+        """Get selected SWD frequency
+
+        Return:
+            frequency in Hz
+        """
+        return self._swd_frequency
+
     @_log.log(_log.DEBUG3)
     def _enter_debug_swd(self):
         cmd = [
@@ -210,6 +496,54 @@ class Stlink():
             Stlink._Cmd.Debug.ENTER_SWD]
         self._com.xfer(cmd, rx_length=2)
 
+    @_log.log(_log.DEBUG2)
+    def reconnect(self):
+        """Reopen same ST-Link after USB error and enter SWD debug mode again
+
+        If ST-Link is still in debug mode, SWD session is kept.
+        """
+        with self.lock:
+            self._com.reconnect()
+            mode = self._get_current_mode()
+            if mode != Stlink._Cmd.Mode.DEBUG:
+                self._leave_state(mode)
+                if self._version.jtag >= 22:
+                    self._set_swd_freq(self._requested_frequency)
+                self._enter_debug_swd()
+
+    def _get_timeout(self, size):
+        """Return USB timeout in ms for memory transfer of size bytes (4x expected time)"""
+        return max(
+            Stlink.TIMEOUT,
+            size * Stlink._SWD_CLOCKS_PER_BYTE * 4 * 1000 // self._swd_frequency)
+
+    def _xfer_retry(self, command, data=None, rx_length=0, tout=TIMEOUT, retry=True):
+        """Transfer command, after USB error reconnect and repeat it
+
+        Only idempotent commands (reads, writes into RAM) can be repeated, because
+        USB error can come after command was already done by ST-Link. Other commands
+        are not repeated (retry=False), only ST-Link is reconnected and error is raised.
+        """
+        for attempt in range(1, Stlink.RETRIES + 1):
+            try:
+                if attempt > 1:
+                    self.reconnect()
+                return self._com.xfer(command, data=data, rx_length=rx_length, tout=tout)
+            except _StlinkComException as err:
+                if not hasattr(self._com, 'reconnect'):
+                    raise
+                if not retry:
+                    _logging.warning("%s, reconnecting (command is not repeated)", err)
+                    try:
+                        self.reconnect()
+                    except _StlinkComException as reconnect_err:
+                        _logging.warning("%s", reconnect_err)
+                    raise
+                if attempt == Stlink.RETRIES:
+                    raise
+                _logging.warning("%s, reconnecting (attempt %d)", err, attempt)
+        return None
+
     def get_version(self):
         """Get ST-Link debugger version
 
@@ -218,6 +552,14 @@ class Stlink():
         """
         return self._version
 
+    def get_transfers(self):
+        """Get number of USB transfers from connecting
+
+        Return:
+            number of transfers or None if com driver does not count transfers
+        """
+        return getattr(self._com, 'transfers', None)
+
     @_log.log(_log.DEBUG2)
     def get_target_voltage(self):
         """Get target voltage from debugger
@@ -246,6 +588,43 @@ class Stlink():
             raise StlinkException("No IDCODE, probably MCU is not connected")
         return idcode
 
+    @_log.log(_log.DEBUG2)
+    def _drive_nrst(self, state):
+        cmd = [
+            Stlink._Cmd.Debug.COMMAND,
+            Stlink._Cmd.Debug.Apiv2.DRIVE_NRST,
+            state]
+        res = self._com.xfer(cmd, rx_length=2)
+        if res[0] != 0x80:
+            raise StlinkException("Error driving NRST")
+
+    def set_nrst(self, asserted):
+        """Drive NRST pin of MCU
+
+        Arguments:
+            asserted: True hold MCU in reset (NRST low), False release it
+        """
+        self._drive_nrst(
+            Stlink._Cmd.Debug.Apiv2.NRST_LOW if asserted else Stlink._Cmd.Debug.Apiv2.NRST_HIGH)
+
+    def pulse_nrst(self):
+        """Generate short reset pulse on NRST pin of MCU"""
+        self._drive_nrst(Stlink._Cmd.Debug.Apiv2.NRST_PULSE)
+
+    @_log.log(_log.DEBUG2)
+    def connect_under_reset(self):
+        """Hold MCU in reset (NRST low) and enter SWD debug mode again
+
+        Connect to MCU which firmware disables SWD pins or enters low power mode,
+        MCU stays in reset until set_nrst(False) is called.
+        """
+        with self.lock:
+            self._leave_state()
+            if self._version.jtag >= 22:
+                self._set_swd_freq(self._requested_frequency)
+            self.set_nrst(True)
+            self._enter_debug_swd()
+
     @_log.log(_log.DEBUG2)
     def get_reg(self, register):
         """Get core register
@@ -267,6 +646,30 @@ class Stlink():
         res = self._com.xfer(cmd, rx_length=8)
         return int.from_bytes(res[4:8], byteorder='little')
 
+    @_log.log(_log.DEBUG2)
+    def get_reg_list(self, registers):
+        """Get list of core registers
+
+        Read 32 bit CPU core registers by register ID, so can be read
+        also registers not returned by get_reg_all. ST-Link can not queue
+        register accesses, each register is one READREG command.
+        (MCU must be halted to access core register)
+
+        Arguments:
+            registers: list of register IDs
+
+        Return:
+            list of 32 bit numbers
+        """
+        cmd = [
+            Stlink._Cmd.Debug.COMMAND,
+            Stlink._Cmd.Debug.Apiv2.READREG]
+        data = []
+        for register in registers:
+            res = self._com.xfer(cmd + [register], rx_length=8)
+            data.append(int.from_bytes(res[4:8], byteorder='little'))
+        return data
+
     @_log.log(_log.DEBUG2)
     def get_reg_all(self):
         """Get all core registers
@@ -324,7 +727,7 @@ class Stlink():
             Stlink._Cmd.Debug.COMMAND,
             Stlink._Cmd.Debug.Apiv2.READDEBUGREG]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
-        res = self._com.xfer(cmd, rx_length=8)
+        res = self._xfer_retry(cmd, rx_length=8)
         return int.from_bytes(res[4:8], byteorder='little')
 
     @_log.log(_log.DEBUG2)
@@ -344,7 +747,8 @@ class Stlink():
             Stlink._Cmd.Debug.Apiv2.WRITEDEBUGREG]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
         cmd.extend(list(data.to_bytes(4, byteorder='little')))
-        self._com.xfer(cmd, rx_length=2)
+        # register writes can have side effects (step, reset, unlock), never repeat
+        self._xfer_retry(cmd, rx_length=2, retry=False)
 
     @_log.log(_log.DEBUG2)
     def read_mem8(self, address, size):
@@ -366,10 +770,10 @@ class Stlink():
         cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.READMEM_8BIT]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
         cmd.extend(list(size.to_bytes(4, byteorder='little')))
-        return self._com.xfer(cmd, rx_length=size)
+        return self._xfer_retry(cmd, rx_length=size, tout=self._get_timeout(size))
 
     @_log.log(_log.DEBUG2)
-    def write_mem8(self, address, data):
+    def write_mem8(self, address, data, retry=False):
         """Write data into memory with 8 bit memory access.
 
         Maximum number of bytes for one write can be 64.
@@ -377,6 +781,7 @@ class Stlink():
         Arguments:
             address: address in memory
             data: list of bytes to write into memory
+            retry: repeat write after USB error (only for memory without side effects like RAM)
         """
         if len(data) > Stlink._STLINK_MAXIMUM_8BIT_DATA:
             raise StlinkException(
@@ -385,7 +790,82 @@ class Stlink():
         cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.WRITEMEM_8BIT]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
         cmd.extend(list(len(data).to_bytes(4, byteorder='little')))
-        self._com.xfer(cmd, data=data)
+        self._xfer_retry(cmd, data=data, tout=self._get_timeout(len(data)), retry=retry)
+
+    @_log.log(_log.DEBUG2)
+    def read_mem16(self, address, size):
+        """Read data from memory with 16 bit memory access.
+
+        Maximum number of bytes for one read can be 1024.
+        Address and size must be aligned to 2 Bytes.
+        Needs ST-Link firmware with JTAG version 26 or newer.
+
+        Arguments:
+            address: address in memory
+            size: number of bytes to read from memory
+
+        Return:
+            list of read data
+        """
+        if not self._version.has_mem16:
+            raise StlinkException('16 bit memory access is not supported by ST-Link firmware')
+        if address % 2:
+            raise StlinkException('Address is not aligned to 2 Bytes')
+        if size % 2:
+            raise StlinkException('Size is not aligned to 2 Bytes')
+        if size > Stlink._STLINK_MAXIMUM_TRANSFER_SIZE:
+            raise StlinkException(
+                'Too many Bytes to read (maximum is %d Bytes)'
+                % Stlink._STLINK_MAXIMUM_TRANSFER_SIZE)
+        cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.READMEM_16BIT]
+        cmd.extend(list(address.to_bytes(4, byteorder='little')))
+        cmd.extend(list(size.to_bytes(4, byteorder='little')))
+        return self._xfer_retry(cmd, rx_length=size, tout=self._get_timeout(size))
+
+    @_log.log(_log.DEBUG2)
+    def write_mem16(self, address, data, retry=False):
+        """Write data into memory with 16 bit memory access.
+
+        Maximum number of bytes for one write can be 1024.
+        Address and number of bytes must be aligned to 2 Bytes.
+        Needs ST-Link firmware with JTAG version 26 or newer.
+
+        Arguments:
+            address: address in memory
+            data: list of bytes to write into memory
+            retry: repeat write after USB error (only for memory without side effects like RAM)
+        """
+        if not self._version.has_mem16:
+            raise StlinkException('16 bit memory access is not supported by ST-Link firmware')
+        if address % 2:
+            raise StlinkException('Address is not aligned to 2 Bytes')
+        if len(data) % 2:
+            raise StlinkException('Size is not aligned to 2 Bytes')
+        if len(data) > Stlink._STLINK_MAXIMUM_TRANSFER_SIZE:
+            raise StlinkException(
+                'Too many Bytes to write (maximum is %d Bytes)'
+                % Stlink._STLINK_MAXIMUM_TRANSFER_SIZE)
+        cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.WRITEMEM_16BIT]
+        cmd.extend(list(address.to_bytes(4, byteorder='little')))
+        cmd.extend(list(len(data).to_bytes(4, byteorder='little')))
+        self._xfer_retry(cmd, data=data, tout=self._get_timeout(len(data)), retry=retry)
+
+    @_log.log(_log.DEBUG2)
+    def get_last_rw_status(self):
+        """Get status of last memory read or write
+
+        Firmware with GETLASTRWSTAT2 also returns address of fault.
+
+        Return:
+            tuple with status (0x80 is OK) and fault address (None if not available)
+        """
+        if self._version.has_last_rw_status2:
+            cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.Apiv2.GETLASTRWSTAT2]
+            res = self._com.xfer(cmd, rx_length=12)
+            return res[0], int.from_bytes(res[4:8], byteorder='little')
+        cmd = [Stlink._Cmd.Debug.COMMAND, Stlink._Cmd.Debug.Apiv2.GETLASTRWSTAT]
+        res = self._com.xfer(cmd, rx_length=2)
+        return res[0], None
 
     @_log.log(_log.DEBUG2)
     def read_mem32(self, address, size):
@@ -414,10 +894,10 @@ class Stlink():
             Stlink._Cmd.Debug.READMEM_32BIT]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
         cmd.extend(list(size.to_bytes(4, byteorder='little')))
-        return self._com.xfer(cmd, rx_length=size)
+        return self._xfer_retry(cmd, rx_length=size, tout=self._get_timeout(size))
 
     @_log.log(_log.DEBUG2)
-    def write_mem32(self, address, data):
+    def write_mem32(self, address, data, retry=False):
         """Write data into memory with 32 bit memory access.
 
         Maximum number of bytes for one write can be 1024.
@@ -426,6 +906,7 @@ class Stlink():
         Arguments:
             address: address in memory
             data: list of bytes to write into memory
+            retry: repeat write after USB error (only for memory without side effects like RAM)
         """
         if address % 4:
             raise StlinkException('Address is not aligned to 4 Bytes')
@@ -440,4 +921,4 @@ class Stlink():
             Stlink._Cmd.Debug.WRITEMEM_32BIT]
         cmd.extend(list(address.to_bytes(4, byteorder='little')))
         cmd.extend(list(len(data).to_bytes(4, byteorder='little')))
-        self._com.xfer(cmd, data=data)
+        self._xfer_retry(cmd, data=data, tout=self._get_timeout(len(data)), retry=retry)
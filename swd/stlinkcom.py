@@ -1,9 +1,22 @@
 """ST-Link/V2 USB communication"""
 
 import logging as _logging
-import usb.core as _usb
+import time as _time
+import swd._lock as _lock
 import swd._log as _log
 
+# usb.core is slow to import, it is imported when first device is searched
+_usb = None
+
+
+def _import_usb():
+    """Import usb.core on first use"""
+    global _usb  # pylint: disable=global-statement
+    if _usb is None:
+        import usb.core
+        _usb = usb.core
+    return _usb
+
 
 class StlinkComException(Exception):
     """Exception"""
@@ -36,23 +49,19 @@ class StlinkComBase():
     """ST-Link/V2 USB communication class"""
     def __init__(self, dev):
         self._dev = dev
+        self._serial_no = None
 
     @classmethod
     def find_all(cls):
         """return all devices with this idVendor and idProduct"""
-        devices = []
-        try:
-            for device in _usb.find(idVendor=cls.ID_VENDOR, idProduct=cls.ID_PRODUCT, find_all=True):
-                devices.append(cls(device))
-        except _usb.NoBackendError as err:
-            raise StlinkComException("USB Error: %s" % err)
-        return devices
-
+        return find_devices([cls])
 
     @property
     def serial_no(self):
-        """Return device serial number"""
-        return ''.join(['%02X' % ord(c) for c in self._dev.serial_number])
+        """Return device serial number, it is read from device on first use"""
+        if self._serial_no is None:
+            self._serial_no = ''.join(['%02X' % ord(c) for c in self._dev.serial_number])
+        return self._serial_no
 
     def compare_serial_no(self, serial_no):
         """Compare device serial no with selected serial number"""
@@ -64,7 +73,7 @@ class StlinkComBase():
         _logging.log(_log.DEBUG4, "%s", ', '.join(['0x%02x' % i for i in data]))
         try:
             count = self._dev.write(self.PIPE_OUT, data, tout)
-        except _usb.USBError as err:
+        except _import_usb().USBError as err:
             self._dev = None
             raise StlinkComException("USB Error: %s" % err)
         _logging.log(_log.DEBUG4, "count=%d", count)
@@ -78,7 +87,7 @@ class StlinkComBase():
         _logging.log(_log.DEBUG4, "size=%d, read_size=%d", size, read_size)
         try:
             data = self._dev.read(self.PIPE_IN, read_size, tout).tolist()[:size]
-        except _usb.USBError as err:
+        except _import_usb().USBError as err:
             self._dev = None
             raise StlinkComException("USB Error: %s" % err)
         _logging.log(_log.DEBUG4, "%s", ', '.join(['0x%02x' % i for i in data]))
@@ -107,17 +116,36 @@ class StlinkComV21Usb(StlinkComBase):
     DEV_NAME = "V2-1"
 
 
+def find_devices(com_classes):
+    """Find all devices of selected classes in one pass over USB devices
+
+    Arguments:
+        com_classes: list of StlinkComBase subclasses
+
+    Return:
+        list of instances of com_classes
+    """
+    usb = _import_usb()
+    classes = {(cls.ID_VENDOR, cls.ID_PRODUCT): cls for cls in com_classes}
+    try:
+        found = usb.find(
+            find_all=True,
+            custom_match=lambda dev: (dev.idVendor, dev.idProduct) in classes)
+        return [classes[(dev.idVendor, dev.idProduct)](dev) for dev in found]
+    except usb.NoBackendError as err:
+        raise StlinkComException("USB Error: %s" % err)
+
+
 class StlinkCom():
     """ST-Link communication class"""
     _STLINK_CMD_SIZE = 16
     _COM_CLASSES = [StlinkComV2Usb, StlinkComV21Usb]
+    # maximum time in seconds to wait for device on reconnect
+    RECONNECT_TIMEOUT = 2.0
 
     @classmethod
     def _find_all_devices(cls):
-        devices = []
-        for com_cls in cls._COM_CLASSES:
-            devices.extend(com_cls.find_all())
-        return devices
+        return find_devices(cls._COM_CLASSES)
 
     @staticmethod
     def _filter_devices(devices, serial_no):
@@ -130,6 +158,16 @@ class StlinkCom():
 
     def __init__(self, serial_no=''):
         self._dev = None
+        # number of transfers, for statistics
+        self.transfers = 0
+        # one lock per device, held for whole command/data/response exchange
+        self.lock = _lock.ProbeLock()
+        self._dev = StlinkCom._open(serial_no)
+        # full serial number (one USB request) selects same device on reconnect
+        self._serial_no = self._dev.serial_no
+
+    @staticmethod
+    def _open(serial_no):
         devices = StlinkCom._find_all_devices()
         if serial_no:
             devices = StlinkCom._filter_devices(devices, serial_no)
@@ -137,13 +175,37 @@ class StlinkCom():
             raise StlinkComNotFound()
         if len(devices) > 1:
             raise StlinkComMoreDevices(devices)
-        self._dev = devices[0]
+        return devices[0]
+
+    @_log.log(_log.DEBUG3)
+    def reconnect(self):
+        """Open again same device (after USB error)
+
+        Device is selected by full serial number read when it was opened,
+        so other connected ST-Link is never opened.
+        """
+        serial_no = self._serial_no
+        # device can need some time to appear again on USB
+        deadline = _time.monotonic() + StlinkCom.RECONNECT_TIMEOUT
+        while True:
+            try:
+                self._dev = StlinkCom._open(serial_no)
+                return
+            except StlinkComNotFound:
+                if _time.monotonic() > deadline:
+                    raise
+            _time.sleep(0.1)
 
     @property
     def version(self):
         """property with device version"""
         return self._dev.DEV_NAME
 
+    @property
+    def serial_no(self):
+        """property with device serial number"""
+        return self._dev.serial_no
+
     @_log.log(_log.DEBUG3)
     def xfer(self, command, data=None, rx_length=0, tout=200):
         """Transfer command between ST-Link
@@ -166,9 +228,11 @@ class StlinkCom():
                 % self._STLINK_CMD_SIZE)
         # pad to _STLINK_CMD_SIZE
         command += [0] * (self._STLINK_CMD_SIZE - len(command))
-        self._dev.write(command, tout)
-        if data:
-            self._dev.write(data, tout)
-        if rx_length:
-            return self._dev.read(rx_length)
+        with self.lock:
+            self.transfers += 1
+            self._dev.write(command, tout)
+            if data:
+                self._dev.write(data, tout)
+            if rx_length:
+                return self._dev.read(rx_length, tout)
         return None
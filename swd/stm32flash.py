@@ -0,0 +1,610 @@
+"""STM32 flash programming with SRAM resident loader"""
+
+import time as _time
+import swd.cortexm as _cortexm
+import swd.stubs as _stubs
+
+
+class FlashException(Exception):
+    """Exception"""
+
+
+def _loader_code(load_store, unit, bsy_bit):
+    """Build flash loader
+
+    Registers:
+        R0: source address (SRAM buffer)
+        R1: destination address (flash)
+        R2: number of bytes (multiple of unit)
+        R3: address of flash status register
+
+    Loop over data: load and store one programming unit,
+    wait while BSY bit is set, at end BKPT.
+    """
+    loop_size = len(load_store) * 2
+    code = list(load_store)
+    code += [
+        0x681c,                             # wait: ldr r4, [r3]
+        0x0824 | ((bsy_bit + 1) << 6),      #       lsrs r4, r4, #(bsy_bit + 1)
+        0xd2fc,                             #       bcs wait
+        0x3000 | unit,                      #       adds r0, #unit
+        0x3100 | unit,                      #       adds r1, #unit
+        0x3a00 | unit,                      #       subs r2, #unit
+        0xd100 | ((-(loop_size + 16) // 2) & 0xff),  # bne loop
+        0xbe00,                             #       bkpt #0
+    ]
+    return _stubs.thumb(*code)
+
+
+class FlashSector():
+    """Flash sector (or page)"""
+
+    def __init__(self, number, address, size):
+        self._number = number
+        self._address = address
+        self._size = size
+
+    @property
+    def number(self):
+        """Sector number used by flash controller"""
+        return self._number
+
+    @property
+    def address(self):
+        """Sector start address"""
+        return self._address
+
+    @property
+    def size(self):
+        """Sector size"""
+        return self._size
+
+    def __repr__(self):
+        return 'FlashSector(%d, 0x%08x, 0x%x)' % (self._number, self._address, self._size)
+
+
+class ErasePlan():
+    """Result of erase planning"""
+
+    def __init__(self, erase, blank, same, segments, time_saved):
+        self._erase = erase
+        self._blank = blank
+        self._same = same
+        self._segments = segments
+        self._time_saved = time_saved
+
+    @property
+    def erase(self):
+        """List of FlashSector which must be erased"""
+        return self._erase
+
+    @property
+    def blank(self):
+        """List of FlashSector skipped because programmed area is blank"""
+        return self._blank
+
+    @property
+    def same(self):
+        """List of FlashSector skipped because content already matches"""
+        return self._same
+
+    @property
+    def segments(self):
+        """List of (address, data) which must be programmed"""
+        return self._segments
+
+    @property
+    def time_saved(self):
+        """Estimated time saved by skipped erase and program (seconds)"""
+        return self._time_saved
+
+
+class _FamilyF1():
+    """STM32F0/F1/F3 flash controller, half-word programming"""
+    NAME = 'F0/F1/F3'
+    FLASH_REG = 0x40022000
+    KEYR = FLASH_REG + 0x04
+    SR = FLASH_REG + 0x0c
+    CR = FLASH_REG + 0x10
+    AR = FLASH_REG + 0x14
+    SR_BSY_BIT = 0
+    SR_ERRORS = 0x00000014
+    SR_CLEAR = 0x00000034
+    CR_PG = 0x00000001
+    CR_PER = 0x00000002
+    CR_MER = 0x00000004
+    CR_STRT = 0x00000040
+    CR_LOCK = 0x00000080
+    UNIT = 2
+    # typical times from datasheets (seconds)
+    PROGRAM_TIME = 0.0000525
+    LOADER = _loader_code([
+        0x8804,     # loop: ldrh r4, [r0]
+        0x800c,     #       strh r4, [r1]
+    ], UNIT, SR_BSY_BIT)
+
+    @classmethod
+    def erase_sector(cls, swd, sector):
+        """Start erase of one sector"""
+        swd.set_mem32(cls.CR, cls.CR_PER)
+        swd.set_mem32(cls.AR, sector.address)
+        swd.set_mem32(cls.CR, cls.CR_PER | cls.CR_STRT)
+
+    @classmethod
+    def program_cr(cls):
+        """Value of CR register for programming"""
+        return cls.CR_PG
+
+    @classmethod
+    def erase_time(cls, unused_sector):
+        """Typical erase time of sector"""
+        return 0.02
+
+
+class _FamilyF4():
+    """STM32F2/F4/F7 flash controller, word programming"""
+    NAME = 'F2/F4/F7'
+    FLASH_REG = 0x40023c00
+    KEYR = FLASH_REG + 0x04
+    SR = FLASH_REG + 0x0c
+    CR = FLASH_REG + 0x10
+    SR_BSY_BIT = 16
+    SR_ERRORS = 0x000001f2
+    SR_CLEAR = 0x000001f3
+    CR_PG = 0x00000001
+    CR_SER = 0x00000002
+    CR_MER = 0x00000004
+    CR_SNB_SHIFT = 3
+    CR_PSIZE_X32 = 0x00000200
+    CR_STRT = 0x00010000
+    CR_LOCK = 0x80000000
+    UNIT = 4
+    # typical times from datasheets (seconds)
+    PROGRAM_TIME = 0.000016
+    LOADER = _loader_code([
+        0x6804,     # loop: ldr r4, [r0]
+        0x600c,     #       str r4, [r1]
+    ], UNIT, SR_BSY_BIT)
+
+    @classmethod
+    def erase_sector(cls, swd, sector):
+        """Start erase of one sector"""
+        cr_erase = cls.CR_SER | cls.CR_PSIZE_X32 | (sector.number << cls.CR_SNB_SHIFT)
+        swd.set_mem32(cls.CR, cr_erase)
+        swd.set_mem32(cls.CR, cr_erase | cls.CR_STRT)
+
+    @classmethod
+    def program_cr(cls):
+        """Value of CR register for programming"""
+        return cls.CR_PG | cls.CR_PSIZE_X32
+
+    @classmethod
+    def erase_time(cls, sector):
+        """Typical erase time of sector (about 1s for 128KB sector)"""
+        return max(0.25, sector.size / (128 * 1024))
+
+
+class _FamilyL4():
+    """STM32L4/G0/G4 flash controller, double-word programming"""
+    NAME = 'L4/G0/G4'
+    FLASH_REG = 0x40022000
+    KEYR = FLASH_REG + 0x08
+    SR = FLASH_REG + 0x10
+    CR = FLASH_REG + 0x14
+    SR_BSY_BIT = 16
+    SR_ERRORS = 0x0000c3fa
+    SR_CLEAR = 0x0000c3fb
+    CR_PG = 0x00000001
+    CR_PER = 0x00000002
+    CR_MER = 0x00000004
+    CR_PNB_SHIFT = 3
+    CR_STRT = 0x00010000
+    CR_LOCK = 0x80000000
+    UNIT = 8
+    # typical times from datasheets (seconds)
+    PROGRAM_TIME = 0.0000817
+    LOADER = _loader_code([
+        0x6804,     # loop: ldr r4, [r0]
+        0x6845,     #       ldr r5, [r0, #4]
+        0x600c,     #       str r4, [r1]
+        0x604d,     #       str r5, [r1, #4]
+    ], UNIT, SR_BSY_BIT)
+
+    @classmethod
+    def erase_sector(cls, swd, sector):
+        """Start erase of one sector"""
+        cr_erase = cls.CR_PER | (sector.number << cls.CR_PNB_SHIFT)
+        swd.set_mem32(cls.CR, cr_erase)
+        swd.set_mem32(cls.CR, cr_erase | cls.CR_STRT)
+
+    @classmethod
+    def program_cr(cls):
+        """Value of CR register for programming"""
+        return cls.CR_PG
+
+    @classmethod
+    def erase_time(cls, unused_sector):
+        """Typical erase time of sector"""
+        return 0.022
+
+
+_K = 1024
+
+# DEV_ID: (name, family, flash size register, sector layout (first sizes, next size))
+_DEVICES = {
+    0x412: ('STM32F10x low-density', _FamilyF1, 0x1ffff7e0, ((), 1 * _K)),
+    0x410: ('STM32F10x medium-density', _FamilyF1, 0x1ffff7e0, ((), 1 * _K)),
+    0x414: ('STM32F10x high-density', _FamilyF1, 0x1ffff7e0, ((), 2 * _K)),
+    0x418: ('STM32F105/F107', _FamilyF1, 0x1ffff7e0, ((), 2 * _K)),
+    0x420: ('STM32F100 low/medium-density', _FamilyF1, 0x1ffff7e0, ((), 1 * _K)),
+    0x428: ('STM32F100 high-density', _FamilyF1, 0x1ffff7e0, ((), 2 * _K)),
+    0x444: ('STM32F03x', _FamilyF1, 0x1ffff7cc, ((), 1 * _K)),
+    0x445: ('STM32F04x', _FamilyF1, 0x1ffff7cc, ((), 1 * _K)),
+    0x440: ('STM32F05x/F030x8', _FamilyF1, 0x1ffff7cc, ((), 1 * _K)),
+    0x448: ('STM32F07x', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x442: ('STM32F09x/F030xC', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x422: ('STM32F30x/F31x', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x432: ('STM32F37x', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x438: ('STM32F303x6/8/F334', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x439: ('STM32F301/F302x6/8', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x446: ('STM32F302/F303xD/E', _FamilyF1, 0x1ffff7cc, ((), 2 * _K)),
+    0x411: ('STM32F2xx', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x413: ('STM32F405/F407', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x419: ('STM32F42x/F43x', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x423: ('STM32F401xB/C', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x433: ('STM32F401xD/E', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x431: ('STM32F411', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x458: ('STM32F410', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x441: ('STM32F412', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x421: ('STM32F446', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x434: ('STM32F469/F479', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x463: ('STM32F413/F423', _FamilyF4, 0x1fff7a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x452: ('STM32F72x/F73x', _FamilyF4, 0x1ff07a22, ((16 * _K, ) * 4 + (64 * _K, ), 128 * _K)),
+    0x449: ('STM32F74x/F75x', _FamilyF4, 0x1ff0f442, ((32 * _K, ) * 4 + (128 * _K, ), 256 * _K)),
+    0x451: ('STM32F76x/F77x', _FamilyF4, 0x1ff0f442, ((32 * _K, ) * 4 + (128 * _K, ), 256 * _K)),
+    0x464: ('STM32L41x/L42x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+    0x435: ('STM32L43x/L44x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+    0x462: ('STM32L45x/L46x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+    0x466: ('STM32G03x/G04x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+    0x460: ('STM32G07x/G08x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+    0x468: ('STM32G43x/G44x', _FamilyL4, 0x1fff75e0, ((), 2 * _K)),
+}
+
+# devices with two banks if flash is bigger than 1MB, second bank sectors are numbered from 16
+_DUAL_BANK_DEVICES = (0x419, 0x434)
+_DUAL_BANK_SECTOR_OFFSET = 4
+
+# DBGMCU_IDCODE register is on different addresses for Cortex-M0/M0+ and other cores
+_DBGMCU_IDCODE_REGS = (0xe0042000, 0x40015800)
+_DEV_ID_MASK = 0x00000fff
+
+_FLASH_START = 0x08000000
+_FLASH_KEY1 = 0x45670123
+_FLASH_KEY2 = 0xcdef89ab
+
+
+def _get_sectors(layout, flash_size, start=_FLASH_START, first_number=0):
+    first_sizes, next_size = layout
+    sectors = []
+    address = start
+    number = first_number
+    while address < start + flash_size:
+        size = first_sizes[number - first_number] if number - first_number < len(
+            first_sizes) else next_size
+        sectors.append(FlashSector(number, address, size))
+        address += size
+        number += 1
+    return sectors
+
+
+class Stm32Flash():
+    """STM32 flash programming
+
+    Small loader is copied into SRAM. Data are streamed into two SRAM
+    buffers, while core is programming data from one buffer, next data
+    are written into other buffer.
+    """
+
+    LOADER_SIZE = 0x40
+    BUFFER_SIZE = 0x400
+    TIMEOUT = 5.0
+
+    def __init__(self, swd, cortexm=None, sram=0x20000000, buffer_size=BUFFER_SIZE):
+        """Detect device by DBGMCU IDCODE
+
+        Arguments:
+            swd: instance of Swd
+            cortexm: instance of CortexM (optional)
+            sram: SRAM address used for loader and buffers
+            buffer_size: size of each of two data buffers
+        """
+        self._swd = swd
+        self._cortexm = cortexm if cortexm is not None else _cortexm.CortexM(swd)
+        self._sram = sram
+        self._buffer_size = buffer_size
+        self._dev_id = self._read_dev_id()
+        self._name, self._family, f_size_reg, layout = _DEVICES[self._dev_id]
+        self._loader = _stubs.Stub('flash_%s' % self._family.NAME, self._family.LOADER)
+        self._flash_size = int.from_bytes(
+            bytes(swd.read_mem(f_size_reg, 2)), byteorder='little') * _K
+        if self._dev_id in _DUAL_BANK_DEVICES and self._flash_size > 1024 * _K:
+            bank_size = self._flash_size // 2
+            self._sectors = _get_sectors(layout, bank_size)
+            self._sectors += _get_sectors(
+                layout, bank_size, _FLASH_START + bank_size,
+                len(self._sectors) + _DUAL_BANK_SECTOR_OFFSET)
+        else:
+            self._sectors = _get_sectors(layout, self._flash_size)
+        self._prepared = False
+
+    def _read_dev_id(self):
+        for reg in _DBGMCU_IDCODE_REGS:
+            dev_id = self._swd.get_mem32(reg) & _DEV_ID_MASK
+            if dev_id in _DEVICES:
+                return dev_id
+        raise FlashException("Unsupported device")
+
+    @property
+    def dev_id(self):
+        """Device ID from DBGMCU_IDCODE"""
+        return self._dev_id
+
+    @property
+    def name(self):
+        """Device name"""
+        return self._name
+
+    @property
+    def family(self):
+        """Name of flash controller family"""
+        return self._family.NAME
+
+    @property
+    def flash_start(self):
+        """Flash start address"""
+        return _FLASH_START
+
+    @property
+    def flash_size(self):
+        """Flash size in bytes"""
+        return self._flash_size
+
+    @property
+    def sectors(self):
+        """List of FlashSector"""
+        return self._sectors
+
+    def get_sectors(self, address, size):
+        """Return list of sectors overlapping memory range"""
+        return [
+            sector for sector in self._sectors
+            if sector.address < address + size and address < sector.address + sector.size]
+
+    def _wait_ready(self, timeout):
+        deadline = _time.monotonic() + timeout
+        while True:
+            status = self._swd.get_mem32(self._family.SR)
+            if not status & (1 << self._family.SR_BSY_BIT):
+                break
+            if _time.monotonic() > deadline:
+                raise FlashException("Timeout waiting for flash")
+        if status & self._family.SR_ERRORS:
+            raise FlashException("Flash error, SR=0x%08x" % status)
+
+    def _prepare(self):
+        """Halt core after reset and unlock flash"""
+        if self._prepared:
+            return
+        try:
+            self._cortexm.reset_halt(timeout=Stm32Flash.TIMEOUT)
+        except _cortexm.CortexMException as err:
+            raise FlashException(str(err))
+        family = self._family
+        if self._swd.get_mem32(family.CR) & family.CR_LOCK:
+            self._swd.set_mem32(family.KEYR, _FLASH_KEY1)
+            self._swd.set_mem32(family.KEYR, _FLASH_KEY2)
+            if self._swd.get_mem32(family.CR) & family.CR_LOCK:
+                raise FlashException("Flash unlock failed")
+        self._swd.set_mem32(family.SR, family.SR_CLEAR)
+        self._prepared = True
+
+    def close(self):
+        """Lock flash"""
+        if self._prepared:
+            self._swd.set_mem32(self._family.CR, self._family.CR_LOCK)
+            self._prepared = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def erase_sectors(self, sectors, timeout=TIMEOUT):
+        """Erase list of sectors
+
+        Arguments:
+            sectors: iterable of FlashSector
+            timeout: maximum time for erasing one sector
+        """
+        self._prepare()
+        for sector in sectors:
+            self._family.erase_sector(self._swd, sector)
+            self._wait_ready(timeout)
+        self._swd.set_mem32(self._family.CR, 0)
+
+    def erase(self, address, size):
+        """Erase all sectors overlapping memory range"""
+        self.erase_sectors(self.get_sectors(address, size))
+
+    def erase_all(self, timeout=30.0):
+        """Mass erase whole flash"""
+        self._prepare()
+        family = self._family
+        self._swd.set_mem32(family.CR, family.CR_MER)
+        self._swd.set_mem32(family.CR, family.CR_MER | family.CR_STRT)
+        self._wait_ready(timeout)
+        self._swd.set_mem32(family.CR, 0)
+
+    def _finish_loader(self):
+        try:
+            self._cortexm.wait_stub(Stm32Flash.TIMEOUT)
+        except _cortexm.CortexMException as err:
+            raise FlashException("Flash loader failed: %s" % err)
+        status = self._swd.get_mem32(self._family.SR)
+        if status & self._family.SR_ERRORS:
+            raise FlashException("Flash programming error, SR=0x%08x" % status)
+
+    def program(self, address, data):
+        """Program data into erased flash
+
+        Data are padded with 0xff to programming unit of flash.
+
+        Arguments:
+            address: address in flash
+            data: bytes to program
+        """
+        unit = self._family.UNIT
+        data = bytes(data)
+        padding = address % unit
+        address -= padding
+        data = b'\xff' * padding + data
+        data += b'\xff' * (-len(data) % unit)
+        if address < _FLASH_START or address + len(data) > _FLASH_START + self._flash_size:
+            raise FlashException("Data are out of flash")
+        self._prepare()
+        self._cortexm.load_stub(self._loader, self._sram)
+        self._swd.set_mem32(self._family.CR, self._family.program_cr())
+        buffers = [
+            self._sram + Stm32Flash.LOADER_SIZE,
+            self._sram + Stm32Flash.LOADER_SIZE + self._buffer_size]
+        running = False
+        for index, offset in enumerate(range(0, len(data), self._buffer_size)):
+            chunk = data[offset:offset + self._buffer_size]
+            buffer = buffers[index % 2]
+            # core is still programming previous buffer
+            self._swd.write_mem(buffer, chunk, retry=True)
+            if running:
+                self._finish_loader()
+            self._cortexm.start_stub(
+                self._loader, (buffer, address + offset, len(chunk), self._family.SR),
+                self._sram)
+            running = True
+        if running:
+            self._finish_loader()
+        self._swd.set_mem32(self._family.CR, 0)
+
+    BLANK_CHECK_CHUNK_SIZE = 0x1000
+
+    def is_blank(self, address, size):
+        """Check if memory is erased (all bytes are 0xff)
+
+        Memory is read in big chunks and reading stops on first
+        chunk which is not blank.
+        """
+        blank = b'\xff' * Stm32Flash.BLANK_CHECK_CHUNK_SIZE
+        while size:
+            chunk_size = min(size, Stm32Flash.BLANK_CHECK_CHUNK_SIZE)
+            if bytes(self._swd.read_mem(address, chunk_size)) != blank[:chunk_size]:
+                return False
+            address += chunk_size
+            size -= chunk_size
+        return True
+
+    def _split_segments(self, segments):
+        """Split segments by sectors, return list of (sector, [(address, data), ..])"""
+        pieces = {}
+        for address, data in segments:
+            data = bytes(data)
+            for sector in self.get_sectors(address, len(data)):
+                start = max(address, sector.address)
+                end = min(address + len(data), sector.address + sector.size)
+                pieces.setdefault(sector.number, (sector, []))[1].append(
+                    (start, data[start - address:end - address]))
+        return sorted(pieces.values(), key=lambda item: item[0].address)
+
+    def _check_piece(self, address, data):
+        """Return tuple (blank, same) for data in flash
+
+        blank: whole programming units under data are erased
+        same: flash already contains data
+        """
+        unit = self._family.UNIT
+        start = address - address % unit
+        end = address + len(data) + (-(address + len(data)) % unit)
+        blank = same = True
+        offset = start
+        while offset < end and (blank or same):
+            chunk_size = min(end - offset, Stm32Flash.BLANK_CHECK_CHUNK_SIZE)
+            chunk = bytes(self._swd.read_mem(offset, chunk_size))
+            if blank and chunk != b'\xff' * chunk_size:
+                blank = False
+            if same:
+                data_start = max(offset, address)
+                data_end = min(offset + chunk_size, address + len(data))
+                same = chunk[data_start - offset:data_end - offset] == data[
+                    data_start - address:data_end - address]
+            offset += chunk_size
+        return blank, same
+
+    def plan(self, segments):
+        """Compute minimal set of sectors to erase
+
+        Sector is not erased if all programmed areas in it are blank,
+        sector is not erased nor programmed if content already matches.
+
+        Arguments:
+            segments: list of (address, data)
+
+        Return:
+            instance of ErasePlan
+        """
+        erase, blank, same, program = [], [], [], []
+        family = self._family
+        time_saved = 0.0
+        for sector, pieces in self._split_segments(segments):
+            results = [self._check_piece(address, data) for address, data in pieces]
+            if all(is_same for _, is_same in results):
+                same.append(sector)
+                size = sum(len(data) for _, data in pieces)
+                time_saved += family.erase_time(sector) + size / family.UNIT * family.PROGRAM_TIME
+                continue
+            if all(is_blank for is_blank, _ in results):
+                blank.append(sector)
+                time_saved += family.erase_time(sector)
+            else:
+                erase.append(sector)
+            for address, data in pieces:
+                if program and program[-1][0] + len(program[-1][1]) == address:
+                    program[-1] = (program[-1][0], program[-1][1] + data)
+                else:
+                    program.append((address, data))
+        return ErasePlan(erase, blank, same, program, time_saved)
+
+    def write_segments(self, segments):
+        """Erase only needed sectors and program segments
+
+        Arguments:
+            segments: list of (address, data)
+
+        Return:
+            instance of ErasePlan
+        """
+        plan = self.plan(segments)
+        if plan.erase:
+            self.erase_sectors(plan.erase)
+        for address, data in plan.segments:
+            self.program(address, data)
+        return plan
+
+    def write(self, address, data):
+        """Erase needed sectors and program data
+
+        Arguments:
+            address: address in flash
+            data: bytes to program
+
+        Return:
+            instance of ErasePlan
+        """
+        return self.write_segments([(address, data)])
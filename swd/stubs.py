@@ -0,0 +1,84 @@
+"""Position independent Thumb stubs executed on target by CortexM"""
+
+
+def thumb(*halfwords):
+    """Convert list of Thumb instructions into bytes"""
+    return b''.join([halfword.to_bytes(2, byteorder='little') for halfword in halfwords])
+
+
+class Stub():
+    """Position independent Thumb code
+
+    Arguments are passed in R0-R3, result is returned in R0,
+    code must end with BKPT instruction.
+    """
+
+    def __init__(self, name, code):
+        self._name = name
+        self._code = bytes(code)
+        if len(self._code) % 4:
+            self._code += thumb(0xbf00)   # nop
+
+    @property
+    def name(self):
+        """Stub name"""
+        return self._name
+
+    @property
+    def code(self):
+        """Stub code"""
+        return self._code
+
+    def __repr__(self):
+        return 'Stub(%s)' % self._name
+
+
+# R0: address, R1: size, R2: inverted initial CRC, return R0: inverted CRC
+CRC32 = Stub('crc32', thumb(
+    0x4b07,     # 00:       ldr r3, [pc, #28]   ; polynomial
+    0x2900,     # 02:       cmp r1, #0
+    0xd00a,     # 04:       beq done
+    0x7804,     # 06: loop: ldrb r4, [r0]
+    0x4062,     # 08:       eors r2, r4
+    0x2508,     # 0a:       movs r5, #8
+    0x0852,     # 0c: bit:  lsrs r2, r2, #1
+    0xd300,     # 0e:       bcc next
+    0x405a,     # 10:       eors r2, r3
+    0x3d01,     # 12: next: subs r5, #1
+    0xd1fa,     # 14:       bne bit
+    0x3001,     # 16:       adds r0, #1
+    0x3901,     # 18:       subs r1, #1
+    0xd1f4,     # 1a:       bne loop
+    0x0010,     # 1c: done: movs r0, r2
+    0xbe00,     # 1e:       bkpt #0
+    0x8320,     # 20:       .word 0xedb88320
+    0xedb8,
+))
+
+# R0: address, R1: byte value, R2: size
+MEMSET = Stub('memset', thumb(
+    0x2a00,     # 00:       cmp r2, #0
+    0xd003,     # 02:       beq done
+    0x7001,     # 04: loop: strb r1, [r0]
+    0x3001,     # 06:       adds r0, #1
+    0x3a01,     # 08:       subs r2, #1
+    0xd1fb,     # 0a:       bne loop
+    0xbe00,     # 0c: done: bkpt #0
+))
+
+# R0: address A, R1: address B, R2: size, return R0: offset of first difference or size
+MEMCMP = Stub('memcmp', thumb(
+    0x2300,     # 00:       movs r3, #0
+    0x4293,     # 02: loop: cmp r3, r2
+    0xd005,     # 04:       beq done
+    0x5cc4,     # 06:       ldrb r4, [r0, r3]
+    0x5ccd,     # 08:       ldrb r5, [r1, r3]
+    0x42ac,     # 0a:       cmp r4, r5
+    0xd101,     # 0c:       bne done
+    0x3301,     # 0e:       adds r3, #1
+    0xe7f7,     # 10:       b loop
+    0x0018,     # 12: done: movs r0, r3
+    0xbe00,     # 14:       bkpt #0
+))
+
+STUBS = {stub.name: stub for stub in (CRC32, MEMSET, MEMCMP)}
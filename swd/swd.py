@@ -1,19 +1,55 @@
 """SWD protocol"""
 
 import itertools as _itertools
-from swd.stlink import Stlink as _Stlink
+import hashlib as _hashlib
+import queue as _queue
+import re as _re
+import threading as _threading
+import zlib as _zlib
+import swd._lock as _lock
 import swd._log as _log
 
 
+class SwdException(Exception):
+    """Exception"""
+
+
 class Swd():
     """Swd class"""
 
+    VERIFY_BLOCK_SIZE = 64
+
     @_log.log(_log.DEBUG1)
-    def __init__(self, swd_frequency=1800000, driver=None, serial_no=''):
+    def __init__(
+            self, swd_frequency=1800000, driver=None, serial_no='', attach=False,
+            yield_chunks=False, auto_frequency_address=None):
         if driver is None:
-            # default SWD driver is Stlink
-            driver = _Stlink(swd_frequency=swd_frequency, serial_no=serial_no)
+            # default SWD driver is Stlink, imported only when it is used
+            from swd.stlink import Stlink
+            kwargs = {}
+            if auto_frequency_address is not None:
+                kwargs['auto_frequency_address'] = auto_frequency_address
+            driver = Stlink(
+                swd_frequency=swd_frequency, serial_no=serial_no, attach=attach, **kwargs)
         self._drv = driver
+        self._lock = getattr(driver, 'lock', None) or _lock.ProbeLock()
+        self._yield_chunks = yield_chunks
+
+    @property
+    def lock(self):
+        """Lock of probe, with statement hold it for sequence of commands
+
+        Every command hold lock for its whole transfer, writes and fills
+        hold lock for all chunks (or release it between chunks if Swd was
+        created with yield_chunks=True). Property contentions and wait_time
+        of lock measure how often threads waited for probe.
+        """
+        return self._lock
+
+    def _yield_chunk(self):
+        """Let other threads use probe between chunks of long operation"""
+        if self._yield_chunks:
+            self._lock.yield_lock()
 
     def get_version(self):
         """Get SWD driver version
@@ -23,6 +59,16 @@ class Swd():
         """
         return str(self._drv.get_version())
 
+    def get_transfers(self):
+        """Get number of driver transfers
+
+        Return:
+            number of transfers or None if driver does not count transfers
+        """
+        if not hasattr(self._drv, 'get_transfers'):
+            return None
+        return self._drv.get_transfers()
+
     @_log.log(_log.DEBUG1)
     def get_target_voltage(self):
         """Get target voltage from debugger
@@ -41,6 +87,28 @@ class Swd():
         """
         return self._drv.get_idcode()
 
+    @_log.log(_log.DEBUG1)
+    def set_nrst(self, asserted):
+        """Drive NRST pin of MCU
+
+        Arguments:
+            asserted: True hold MCU in reset (NRST low), False release it
+        """
+        self._drv.set_nrst(asserted)
+
+    @_log.log(_log.DEBUG1)
+    def pulse_nrst(self):
+        """Generate short reset pulse on NRST pin of MCU"""
+        self._drv.pulse_nrst()
+
+    @_log.log(_log.DEBUG1)
+    def connect_under_reset(self):
+        """Hold MCU in reset (NRST low) and connect SWD again
+
+        MCU stays in reset until set_nrst(False) is called.
+        """
+        self._drv.connect_under_reset()
+
     @_log.log(_log.DEBUG1)
     def get_reg(self, register):
         """Get core register
@@ -70,6 +138,22 @@ class Swd():
         """
         return self._drv.get_reg_all()
 
+    @_log.log(_log.DEBUG1)
+    def get_reg_list(self, registers):
+        """Get list of core registers
+
+        Read 32 bit CPU core registers by register IDs (one command
+        for each register). Register IDs depends on architecture.
+        (MCU must be halted to access core registers)
+
+        Arguments:
+            registers: list of register IDs
+
+        Return:
+            list of 32 bit numbers
+        """
+        return self._drv.get_reg_list(registers)
+
     @_log.log(_log.DEBUG1)
     def set_reg(self, register, data):
         """Set core register
@@ -110,6 +194,70 @@ class Swd():
         """
         self._drv.set_mem32(address, data)
 
+    def get_capabilities(self):
+        """Get capabilities of driver
+
+        Return:
+            dictionary with maximum sizes of 8, 16 and 32 bit transfers
+            (0 if access is not supported)
+        """
+        if hasattr(self._drv, 'get_capabilities'):
+            return self._drv.get_capabilities()
+        return {
+            'maximum_8bit_data': self._drv.MAXIMUM_8BIT_DATA,
+            'maximum_16bit_data': getattr(self._drv, 'MAXIMUM_16BIT_DATA', 0),
+            'maximum_32bit_data': self._drv.MAXIMUM_32BIT_DATA,
+        }
+
+    @_log.log(_log.DEBUG1)
+    def read_mem16(self, address, size):
+        """Read memory with 16 bit access
+
+        Use 16 bit memory access if driver supports it (for 16 bit registers),
+        otherwise memory is read by read_mem()
+
+        Arguments:
+            address: address in memory, must be aligned to 2 Bytes
+            size: number of bytes to read, must be aligned to 2 Bytes
+
+        Return:
+            iterable of read data
+        """
+        if address % 2 or size % 2:
+            raise SwdException("Address and size must be aligned to 2 Bytes")
+        chunk_size_max = getattr(self._drv, 'MAXIMUM_16BIT_DATA', 0)
+        if not chunk_size_max:
+            yield from self.read_mem(address, size)
+            return
+        while size:
+            chunk_size = min(size, chunk_size_max)
+            yield from self._drv.read_mem16(address, chunk_size)
+            address += chunk_size
+            size -= chunk_size
+
+    @_log.log(_log.DEBUG1)
+    def write_mem16(self, address, data):
+        """Write memory with 16 bit access
+
+        Use 16 bit memory access if driver supports it (for 16 bit registers),
+        otherwise memory is written by write_mem()
+
+        Arguments:
+            address: address in memory, must be aligned to 2 Bytes
+            data: list or iterable of bytes, size must be aligned to 2 Bytes
+        """
+        data = list(data)
+        if address % 2 or len(data) % 2:
+            raise SwdException("Address and size must be aligned to 2 Bytes")
+        chunk_size_max = getattr(self._drv, 'MAXIMUM_16BIT_DATA', 0)
+        if not chunk_size_max:
+            self.write_mem(address, data)
+            return
+        with self._lock:
+            for index in range(0, len(data), chunk_size_max):
+                self._drv.write_mem16(address + index, data[index:index + chunk_size_max])
+                self._yield_chunk()
+
     def _get_chunk_size_to_align_size(self, address, size):
         if size > self._drv.MAXIMUM_8BIT_DATA:
             return min(size, self._drv.MAXIMUM_8BIT_DATA - (address % 4))
@@ -151,8 +299,13 @@ class Swd():
             address += chunk_size
             size -= chunk_size
 
+    @staticmethod
+    def _get_write_args(retry):
+        """Keyword arguments of driver writes, drivers without retry get none"""
+        return {'retry': True} if retry else {}
+
     @_log.log(_log.DEBUG1)
-    def write_mem(self, address, data):
+    def write_mem(self, address, data, retry=False):
         """Write memory
 
         Automatically use 8 and 32 bit access write which depends on alignment
@@ -160,35 +313,40 @@ class Swd():
         Arguments:
             address: address in memory
             data: list or iterable of bytes to write into memory
+            retry: driver repeat failed chunk after USB error, use only
+                for memory without side effects of writes (RAM)
         """
-        data = iter(data)
-        # first chunk to align address
-        if address % 4:
-            chunk_size_max = self._drv.MAXIMUM_8BIT_DATA - (address % 4)
-            chunk = list(_itertools.islice(data, 0, chunk_size_max))
-            if not chunk:
-                return
-            self._drv.write_mem8(address, chunk)
-            address += len(chunk)
-        # write remained data, here is address always aligned
-        while True:
-            chunk = list(_itertools.islice(data, 0, self._drv.MAXIMUM_32BIT_DATA))
-            if not chunk:
-                return
-            if len(chunk) % 4 == 0:
-                self._drv.write_mem32(address, chunk)
+        kwargs = self._get_write_args(retry)
+        with self._lock:
+            data = iter(data)
+            # first chunk to align address
+            if address % 4:
+                chunk_size_max = self._drv.MAXIMUM_8BIT_DATA - (address % 4)
+                chunk = list(_itertools.islice(data, 0, chunk_size_max))
+                if not chunk:
+                    return
+                self._drv.write_mem8(address, chunk, **kwargs)
                 address += len(chunk)
-                continue
-            if len(chunk) > self._drv.MAXIMUM_8BIT_DATA:
-                chunk_size32 = len(chunk) & 0xfffffffc
-                self._drv.write_mem32(address, chunk[:chunk_size32])
-                del chunk[:chunk_size32]
-                address += chunk_size32
-            self._drv.write_mem8(address, chunk)
-            return
+            # write remained data, here is address always aligned
+            while True:
+                chunk = list(_itertools.islice(data, 0, self._drv.MAXIMUM_32BIT_DATA))
+                if not chunk:
+                    return
+                if len(chunk) % 4 == 0:
+                    self._drv.write_mem32(address, chunk, **kwargs)
+                    address += len(chunk)
+                    self._yield_chunk()
+                    continue
+                if len(chunk) > self._drv.MAXIMUM_8BIT_DATA:
+                    chunk_size32 = len(chunk) & 0xfffffffc
+                    self._drv.write_mem32(address, chunk[:chunk_size32], **kwargs)
+                    del chunk[:chunk_size32]
+                    address += chunk_size32
+                self._drv.write_mem8(address, chunk, **kwargs)
+                return
 
     @_log.log(_log.DEBUG1)
-    def fill_mem(self, address, pattern, size):
+    def fill_mem(self, address, pattern, size, retry=False):
         """Fill memory with pattern
 
         Automatically use 8 and 32 bit access write which depends on alignment
@@ -197,19 +355,249 @@ class Swd():
             address: address in memory
             pattern: list of bytes to fill
             size: number of bytes to fill
+            retry: driver repeat failed chunk after USB error (only for RAM)
         """
-        index = 0
-        data = pattern * ((min(size, self._drv.MAXIMUM_32BIT_DATA)) // len(pattern) + 1)
+        kwargs = self._get_write_args(retry)
+        with self._lock:
+            index = 0
+            data = pattern * ((min(size, self._drv.MAXIMUM_32BIT_DATA)) // len(pattern) + 1)
+            while size:
+                chunk_size = size
+                if address % 4 or (chunk_size < self._drv.MAXIMUM_8BIT_DATA and chunk_size % 4):
+                    if chunk_size > self._drv.MAXIMUM_8BIT_DATA:
+                        chunk_size = min(chunk_size, self._drv.MAXIMUM_8BIT_DATA - (address % 4))
+                    self._drv.write_mem8(address, data[index:index + chunk_size], **kwargs)
+                else:
+                    chunk_size = min(chunk_size, self._drv.MAXIMUM_32BIT_DATA)
+                    chunk_size -= chunk_size % 4
+                    self._drv.write_mem32(address, data[index:index + chunk_size], **kwargs)
+                index = (index + chunk_size) % len(pattern)
+                address += chunk_size
+                size -= chunk_size
+                self._yield_chunk()
+
+    def _get_read_chunks(self, address, size, chunk_size):
+        """Split memory range into chunks, first chunk align address"""
+        if address % 4 and size > chunk_size:
+            first_size = chunk_size - address % 4
+            yield address, first_size
+            address += first_size
+            size -= first_size
         while size:
-            chunk_size = size
-            if address % 4 or (chunk_size < self._drv.MAXIMUM_8BIT_DATA and chunk_size % 4):
-                if chunk_size > self._drv.MAXIMUM_8BIT_DATA:
-                    chunk_size = min(chunk_size, self._drv.MAXIMUM_8BIT_DATA - (address % 4))
-                self._drv.write_mem8(address, data[index:index + chunk_size])
+            first_size = min(size, chunk_size)
+            yield address, first_size
+            address += first_size
+            size -= first_size
+
+    def _prefetch(self, chunks, chunk_queue, stop):
+        """Read chunks into queue, run in separate thread"""
+        try:
+            for address, size in chunks:
+                if stop.is_set():
+                    return
+                chunk_queue.put((address, bytes(self.read_mem(address, size))))
+            chunk_queue.put(None)
+        except Exception as err:   # pylint: disable=broad-except
+            chunk_queue.put(err)
+
+    def read_chunks(self, address, size, chunk_size=None, prefetch=True):
+        """Read memory in big chunks
+
+        With prefetch next chunk is read in background thread while
+        caller is processing current chunk. Driver must not be used
+        by caller until iteration is finished. When calling thread holds
+        lock of probe, background thread could not use probe, so chunks
+        are read in calling thread.
+
+        Arguments:
+            address: address in memory
+            size: number of bytes to read
+            chunk_size: size of chunks (default is maximum transfer size)
+            prefetch: read next chunk in background
+
+        Return:
+            iterable of tuples (address, bytes)
+        """
+        if chunk_size is None:
+            chunk_size = self._drv.MAXIMUM_32BIT_DATA
+        chunks = self._get_read_chunks(address, size, chunk_size)
+        if not prefetch or self._lock.is_owned():
+            for chunk_address, chunk_size in chunks:
+                yield chunk_address, bytes(self.read_mem(chunk_address, chunk_size))
+            return
+        chunk_queue = _queue.Queue(maxsize=1)
+        stop = _threading.Event()
+        thread = _threading.Thread(
+            target=self._prefetch, args=(chunks, chunk_queue, stop), daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = chunk_queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while thread.is_alive():
+                try:
+                    chunk_queue.get(timeout=0.01)
+                except _queue.Empty:
+                    pass
+
+    @staticmethod
+    def _get_mismatches(address, data, expected, block_size):
+        """Return list of mismatching ranges (address, size) in chunk"""
+        mismatches = []
+        data = memoryview(data)
+        expected = memoryview(expected)
+        for block in range(0, len(data), block_size):
+            if data[block:block + block_size] == expected[block:block + block_size]:
+                continue
+            for offset in range(block, min(block + block_size, len(data))):
+                if data[offset] == expected[offset]:
+                    continue
+                if mismatches and sum(mismatches[-1]) == address + offset:
+                    mismatches[-1] = (mismatches[-1][0], mismatches[-1][1] + 1)
+                else:
+                    mismatches.append((address + offset, 1))
+        return mismatches
+
+    def verify(self, address, source, max_mismatches=16, prefetch=True):
+        """Compare memory with data
+
+        Memory is read in maximum size chunks, next chunk is read while
+        current is compared. Reading stops when max_mismatches ranges
+        are found, so last range can be incomplete.
+
+        Arguments:
+            address: address in memory
+            source: bytes or binary file object
+            max_mismatches: maximum number of reported ranges
+            prefetch: read next chunk in background
+
+        Return:
+            list of mismatching ranges (address, size), empty if same
+        """
+        if hasattr(source, 'read'):
+            source = source.read()
+        source = memoryview(source).cast('B')
+        mismatches = []
+        chunks = self.read_chunks(address, len(source), prefetch=prefetch)
+        try:
+            for chunk_address, data in chunks:
+                offset = chunk_address - address
+                expected = source[offset:offset + len(data)]
+                if data == expected:
+                    continue
+                for mismatch in self._get_mismatches(
+                        chunk_address, data, expected, Swd.VERIFY_BLOCK_SIZE):
+                    if mismatches and sum(mismatches[-1]) == mismatch[0]:
+                        mismatches[-1] = (mismatches[-1][0], mismatches[-1][1] + mismatch[1])
+                    else:
+                        mismatches.append(mismatch)
+                if len(mismatches) >= max_mismatches:
+                    return mismatches[:max_mismatches]
+        finally:
+            chunks.close()
+        return mismatches
+
+    def checksum(self, address, size, algorithm='crc32', prefetch=True):
+        """Compute hash of memory
+
+        Memory is streamed in maximum size chunks and is not kept.
+
+        Arguments:
+            address: address in memory
+            size: number of bytes
+            algorithm: 'crc32' or name of hashlib algorithm (e.g. 'sha256')
+            prefetch: read next chunk in background
+
+        Return:
+            hex string of hash
+        """
+        if algorithm == 'crc32':
+            crc = 0
+            for _, data in self.read_chunks(address, size, prefetch=prefetch):
+                crc = _zlib.crc32(data, crc)
+            return '%08x' % crc
+        try:
+            digest = _hashlib.new(algorithm)
+        except ValueError:
+            raise SwdException("Unsupported hash algorithm: %s" % algorithm)
+        for _, data in self.read_chunks(address, size, prefetch=prefetch):
+            digest.update(data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _get_search_pattern(pattern, mask):
+        """Return compiled regular expression for pattern with mask or wildcards"""
+        pattern = list(pattern)
+        if mask is None:
+            mask = [0x00 if byte is None else 0xff for byte in pattern]
+        mask = list(mask)
+        if len(mask) != len(pattern):
+            raise SwdException("Mask must have same size as pattern")
+        regex = b''
+        for byte, byte_mask in zip(pattern, mask):
+            byte = (byte or 0) & byte_mask
+            if byte_mask == 0xff:
+                regex += _re.escape(bytes([byte]))
+            elif byte_mask == 0x00:
+                regex += b'.'
             else:
-                chunk_size = min(chunk_size, self._drv.MAXIMUM_32BIT_DATA)
-                chunk_size -= chunk_size % 4
-                self._drv.write_mem32(address, data[index:index + chunk_size])
-            index = (index + chunk_size) % len(pattern)
-            address += chunk_size
-            size -= chunk_size
+                values = bytes([val for val in range(256) if val & byte_mask == byte])
+                regex += b'[' + b''.join(_re.escape(bytes([val])) for val in values) + b']'
+        return _re.compile(regex, _re.DOTALL)
+
+    def find(self, pattern, start, end, mask=None, count=None, align=1, prefetch=True):
+        """Search memory for pattern
+
+        Memory is read in chunks, matches crossing chunk boundary are found,
+        reading stops when count matches are found.
+
+        Arguments:
+            pattern: bytes or list of byte values, None is wildcard
+            start: begin of searched memory
+            end: end of searched memory (exclusive)
+            mask: bytes with mask for each pattern byte (optional)
+            count: maximum number of matches (default is all)
+            align: report only addresses aligned to this value
+            prefetch: read next chunk in background
+
+        Return:
+            list of addresses of matches
+        """
+        if not pattern:
+            raise SwdException("Empty pattern")
+        if mask is None and all(byte is not None for byte in pattern):
+            pattern = bytes(pattern)
+
+            def search(data, pos):
+                return data.find(pattern, pos)
+        else:
+            search_regex = self._get_search_pattern(pattern, mask).search
+
+            def search(data, pos):
+                match = search_regex(data, pos)
+                return match.start() if match else -1
+        overlap = len(pattern) - 1
+        matches = []
+        tail = b''
+        chunks = self.read_chunks(start, max(end - start, 0), prefetch=prefetch)
+        try:
+            for address, data in chunks:
+                data = tail + data
+                base = address - len(tail)
+                index = search(data, 0)
+                while index >= 0:
+                    if (base + index) % align == 0:
+                        matches.append(base + index)
+                        if count is not None and len(matches) >= count:
+                            return matches
+                    index = search(data, index + 1)
+                tail = data[max(len(data) - overlap, 0):] if overlap else b''
+        finally:
+            chunks.close()
+        return matches
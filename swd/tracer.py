@@ -0,0 +1,131 @@
+"""Single step instruction tracer"""
+
+import sys as _sys
+import array as _array
+import struct as _struct
+
+
+class TracerException(Exception):
+    """Exception"""
+
+
+class Trace():
+    """Recorded trace, PC and selected registers after each step"""
+
+    BIN_MAGIC = b'PYSWDTRC'
+
+    def __init__(self, registers, data=None):
+        self._registers = ['PC'] + list(registers)
+        self._data = data if data is not None else _array.array('I')
+
+    @property
+    def registers(self):
+        """Names of recorded registers, first is always PC"""
+        return self._registers
+
+    @property
+    def data(self):
+        """array with recorded values (all registers for each step)"""
+        return self._data
+
+    def __len__(self):
+        return len(self._data) // len(self._registers)
+
+    def __getitem__(self, index):
+        """Return dictionary with registers for selected step"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trace index out of range")
+        stride = len(self._registers)
+        return dict(zip(self._registers, self._data[index * stride:(index + 1) * stride]))
+
+    @property
+    def pc(self):
+        """array with recorded PC values"""
+        return self._data[::len(self._registers)]
+
+    def save(self, filename):
+        """Save trace into binary file
+
+        Format (little endian): magic, number of steps, number of registers,
+        for each register its name (8 bytes), then uint32 values.
+        """
+        with open(filename, 'wb') as bin_file:
+            bin_file.write(_struct.pack(
+                '<8sII', Trace.BIN_MAGIC, len(self), len(self._registers)))
+            for reg in self._registers:
+                bin_file.write(_struct.pack('<8s', reg.encode()))
+            data = self._data
+            if _sys.byteorder != 'little':
+                data = _array.array('I', data)
+                data.byteswap()
+            data.tofile(bin_file)
+
+    @classmethod
+    def load(cls, filename):
+        """Load trace from binary file"""
+        with open(filename, 'rb') as bin_file:
+            magic, count, num_regs = _struct.unpack('<8sII', bin_file.read(16))
+            if magic != Trace.BIN_MAGIC:
+                raise TracerException("Not a trace file")
+            registers = [
+                _struct.unpack('<8s', bin_file.read(8))[0].rstrip(b'\0').decode()
+                for _ in range(num_regs)]
+            data = _array.array('I')
+            data.frombytes(bin_file.read(count * num_regs * 4))
+            if _sys.byteorder != 'little':
+                data.byteswap()
+        return cls(registers[1:], data)
+
+
+class StepTracer():
+    """Step core and record PC and selected registers after each step"""
+
+    def __init__(self, cortexm, registers=None):
+        """Step tracer
+
+        Arguments:
+            cortexm: instance of CortexM
+            registers: list of register names recorded together with PC
+        """
+        self._cortexm = cortexm
+        self._registers = [reg.upper() for reg in registers or []]
+        if 'PC' in self._registers:
+            self._registers.remove('PC')
+        for reg in self._registers:
+            if reg not in cortexm.REGISTERS:
+                raise TracerException("Not a register: %s" % reg)
+
+    def trace(self, count, stop=None, stop_addresses=None):
+        """Step core and record registers
+
+        Core is halted if it is running. After each step all registers are
+        read with one transfer, so one step cost two transfers.
+
+        Arguments:
+            count: maximum number of steps
+            stop: function called with dictionary of recorded registers
+                after each step, tracing stops when it returns True
+            stop_addresses: iterable of PC addresses where tracing stops
+
+        Return:
+            instance of Trace
+        """
+        cortexm = self._cortexm
+        if not cortexm.is_halted():
+            cortexm.halt()
+        stop_addresses = frozenset(stop_addresses or [])
+        registers = ['PC'] + self._registers
+        trace = Trace(self._registers)
+        data = trace.data
+        for _ in range(count):
+            cortexm.step()
+            values = cortexm.get_reg_all()
+            record = [values[reg] for reg in registers]
+            data.extend(record)
+            if values['PC'] in stop_addresses:
+                break
+            if stop is not None and stop(dict(zip(registers, record))):
+                break
+        return trace
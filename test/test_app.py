@@ -0,0 +1,213 @@
+"""Unit tests for _app.py"""
+import argparse
+import builtins
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import unittest
+import unittest.mock
+import swd._app
+import swd._output
+import swd.cortexm
+import swd.stlink
+
+
+class TestParseActions(unittest.TestCase):
+    """Tests for parsing of actions and loops"""
+
+    def test_nested_loops(self):
+        """test nested loops are parsed into blocks"""
+        block = swd._app.parse_actions([
+            'halt', 'loop:2:i', 'step', 'loop:3', 'reg:PC', 'end', 'reg:R0', 'end', 'run'])
+        self.assertEqual(block, [
+            'halt',
+            ('loop:2:i', ['step', ('loop:3', ['reg:PC']), 'reg:R0']),
+            'run'])
+
+    def test_end_without_loop(self):
+        """test unbalanced end"""
+        with self.assertRaises(swd._app.PyswdException):
+            swd._app.parse_actions(['loop:2', 'step', 'end', 'end'])
+
+    def test_loop_without_end(self):
+        """test unclosed loop"""
+        with self.assertRaises(swd._app.PyswdException):
+            swd._app.parse_actions(['loop:2', 'step'])
+
+    def test_loop_depth(self):
+        """test depth of unclosed loops"""
+        self.assertEqual(swd._app.get_loop_depth(['loop:2', 'loop:3', 'step', 'end']), 1)
+        self.assertEqual(swd._app.get_loop_depth(['loop:2', 'end']), 0)
+
+    def test_script_line(self):
+        """test script line with comment"""
+        self.assertEqual(
+            swd._app.parse_script_line('  reg:PC  step:2 # comment: end'),
+            ['reg:PC', 'step:2'])
+
+
+class TestSubstituteVariables(unittest.TestCase):
+    """Tests for $var and ${var} substitution"""
+
+    def test_substitute(self):
+        """test both forms of variables"""
+        self.assertEqual(
+            swd._app.substitute_variables(
+                'set:$addr:${value}0', {'addr': '0x20000000', 'value': 1}),
+            'set:0x20000000:10')
+
+    def test_unknown(self):
+        """test unknown variable"""
+        with self.assertRaises(swd._app.PyswdException):
+            swd._app.substitute_variables('dump:${addr}', {})
+
+
+class RecordingApplication(swd._app.Application):
+    """Application with action which only record its parameters"""
+
+    def __init__(self, script=None, actions=(), output_format='text'):
+        args = argparse.Namespace(
+            action=list(actions), freq=1800000, freq_address=None, serial='', attach=False,
+            script=script, time=False, format=output_format, verbose=None, quite=False,
+            debug=None, info=None)
+        super().__init__(args)
+        self.log = []
+
+    def action_record(self, params):
+        """Record parameters"""
+        self.log.append(params)
+
+    def action_fail(self, unused_params):
+        """Raise error of library"""
+        raise swd.stlink.StlinkException("Address is not aligned to 4 Bytes")
+
+
+class TestScript(unittest.TestCase):
+    """Tests for actions, loops and variables in scripts"""
+
+    def test_actions(self):
+        """test loop with variable in command line actions"""
+        app = RecordingApplication(actions=['let:addr:0x100', 'loop:2:i', 'record:$addr:$i', 'end'])
+        app.process_actions()
+        self.assertEqual(app.log, [['0x100', '0'], ['0x100', '1']])
+
+    def test_script_file(self):
+        """test loops spanning lines of script file"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = os.path.join(tmpdir, 'script.txt')
+            with open(script, 'w') as script_file:
+                script_file.write(
+                    "# test script\n"
+                    "loop:2:i  # outer loop\n"
+                    "  loop:2:j\n"
+                    "    record:${i}${j}\n"
+                    "  end\n"
+                    "end record:done\n")
+            app = RecordingApplication(script=script)
+            app.process_actions()
+        self.assertEqual(app.log, [['00'], ['01'], ['10'], ['11'], ['done']])
+
+    def test_interactive_errors(self):
+        """test library errors do not stop interactive session"""
+        app = RecordingApplication(script='-')
+        lines = iter(['fail', 'loop:2', 'record:x', 'end'])
+
+        def fake_input(unused_prompt):
+            try:
+                return next(lines)
+            except StopIteration:
+                raise EOFError()
+
+        with unittest.mock.patch.object(builtins, 'input', fake_input), \
+                unittest.mock.patch.object(sys.stdin, 'isatty', lambda: True), \
+                self.assertLogs(level='ERROR'):
+            app.process_actions()
+        self.assertEqual(app.log, [['x'], ['x']])
+
+
+class TestDumpFormat(unittest.TestCase):
+    """Tests for dump format with machine readable output"""
+
+    def test_dump_format_with_records(self):
+        """test dump format parameter is rejected with records"""
+        for output_format in ('json', 'ndjson', 'bin'):
+            app = RecordingApplication(output_format=output_format)
+            app._records = swd._output.RecordWriter(io.StringIO())
+            with self.assertRaises(swd._app.PyswdException):
+                app.dump_memory(0x20000000, 16, 1, ['ascii'])
+
+
+class NoResetSwdMock():
+    """Swd where core never report reset"""
+
+    def __init__(self):
+        self.transfers = 0
+
+    def get_transfers(self):
+        """Number of USB transfers"""
+        return self.transfers
+
+    def get_mem32(self, unused_address):
+        """DHCSR without S_RESET_ST"""
+        self.transfers += 1
+        return 0
+
+    def set_mem32(self, unused_address, unused_data):
+        """Ignore write"""
+        self.transfers += 1
+
+
+class TestCoreErrors(unittest.TestCase):
+    """Tests for errors of core reported as errors of action"""
+
+    def test_reset_timeout(self):
+        """test reset timeout write error status record"""
+        output = io.StringIO()
+        app = RecordingApplication(actions=['reset'], output_format='ndjson')
+        app._records = swd._output.RecordWriter(output)
+        app._swd = NoResetSwdMock()
+        app._cortexm = swd.cortexm.CortexM(app._swd)
+        with unittest.mock.patch.object(
+                swd.cortexm._time, 'monotonic', side_effect=itertools.count()):
+            with self.assertRaises(swd._app.PyswdException) as context:
+                app.process_actions()
+        self.assertEqual(str(context.exception), "reset: Timeout waiting for reset")
+        record = json.loads(output.getvalue())
+        self.assertEqual(record['status'], 'error')
+        self.assertEqual(record['error'], "Timeout waiting for reset")
+
+
+class HaltedSwdMock(NoResetSwdMock):
+    """Swd with halted core"""
+
+    def __init__(self):
+        super().__init__()
+        self.call_log = []
+
+    def get_mem32(self, address):
+        """DHCSR with S_HALT"""
+        self.call_log.append(('get_mem32', address))
+        return swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT
+
+    def get_reg_all(self):
+        """All registers"""
+        self.call_log.append(('get_reg_all', ))
+        return list(range(21))
+
+
+class TestRegisterAction(unittest.TestCase):
+    """Tests for register action"""
+
+    def test_halted_core(self):
+        """test halted core is not checked and halted again for each access"""
+        app = RecordingApplication(actions=['reg:R1', 'reg:PC'], output_format='ndjson')
+        app._records = swd._output.RecordWriter(io.StringIO())
+        app._swd = HaltedSwdMock()
+        app._cortexm = swd.cortexm.CortexM(app._swd)
+        app._cortexm.halt()
+        app._swd.call_log = []
+        app.process_actions()
+        self.assertEqual(app._swd.call_log, [('get_reg_all', )])
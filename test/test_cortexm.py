@@ -0,0 +1,544 @@
+"""Unit tests for cortexm.py"""
+import os
+import tempfile
+import unittest
+import zlib
+import swd.cortexm
+import swd.stubs
+
+
+class SwdMock():
+    """Swd Mock class for testing CortexM class"""
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        self.regs = list(range(0x100, 0x100 + 21))
+        self.ext_regs = {20: 0x04010203, 33: 0x03000000}
+        self.ext_regs.update({64 + i: 0x3f800000 + i for i in range(32)})
+        self.mvfr0 = 0x10110221
+        self.dhcsr = 0
+        self.reset = False
+        self.call_log = []
+
+    def get_reg(self, register):
+        """Mock get_reg"""
+        self.call_log.append(('get_reg', register))
+        return self.regs[register]
+
+    def get_reg_all(self):
+        """Mock get_reg_all"""
+        self.call_log.append(('get_reg_all', ))
+        return list(self.regs)
+
+    def get_reg_list(self, registers):
+        """Mock get_reg_list"""
+        self.call_log.append(('get_reg_list', registers))
+        return [self.ext_regs[register] for register in registers]
+
+    def set_reg(self, register, data):
+        """Mock set_reg"""
+        self.call_log.append(('set_reg', register, data))
+        if register in self.ext_regs:
+            self.ext_regs[register] = data
+        else:
+            self.regs[register] = data
+
+    def get_mem32(self, address):
+        """Mock get_mem32"""
+        self.call_log.append(('get_mem32', address))
+        if address == swd.cortexm.CortexM.DHCSR_REG:
+            if self.reset:
+                # S_RESET_ST is cleared by read
+                self.reset = False
+                return self.dhcsr | swd.cortexm.CortexM.DHCSR_STATUS_RESET_BIT
+            return self.dhcsr
+        if address == swd.cortexm.CortexM.MVFR0_REG:
+            return self.mvfr0
+        return 0
+
+    def set_mem32(self, address, data):
+        """Mock set_mem32"""
+        self.call_log.append(('set_mem32', address, data))
+        if address == swd.cortexm.CortexM.AIRCR_REG:
+            self.reset = True
+        if address == swd.cortexm.CortexM.DHCSR_REG:
+            if data & swd.cortexm.CortexM.DHCSR_HALT_BIT:
+                self.dhcsr = swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT
+            elif not data & swd.cortexm.CortexM.DHCSR_STEP_BIT:
+                self.dhcsr = 0
+
+    def set_nrst(self, asserted):
+        """Mock set_nrst"""
+        self.call_log.append(('set_nrst', asserted))
+        if not asserted:
+            self.reset = True
+
+    def pulse_nrst(self):
+        """Mock pulse_nrst"""
+        self.call_log.append(('pulse_nrst', ))
+        self.reset = True
+
+    def connect_under_reset(self):
+        """Mock connect_under_reset"""
+        self.call_log.append(('connect_under_reset', ))
+
+    def get_call_log(self):
+        """get call log"""
+        call_log = self.call_log
+        self.call_log = []
+        return call_log
+
+
+DHCSR = swd.cortexm.CortexM.DHCSR_REG
+
+
+class _TestCortexM(unittest.TestCase):
+    """Base class for testing CortexM class"""
+
+    def setUp(self):
+        self._swd = SwdMock()
+        self._cortexm = swd.cortexm.CortexM(self._swd)
+
+
+class TestCortexMRegisters(_TestCortexM):
+    """Tests for register access"""
+
+    def test_running(self):
+        """test register access to running core is not cached"""
+        self.assertEqual(self._cortexm.get_reg('R1'), 0x101)
+        self.assertEqual(self._cortexm.get_reg('r1'), 0x101)
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_reg', 1),
+            ('get_reg', 1),
+        ])
+
+    def test_wrong_register(self):
+        """test wrong register name"""
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.get_reg('R13')
+
+    def test_halted_snapshot(self):
+        """test registers of halted core are read at once"""
+        self._cortexm.halt()
+        self._swd.get_call_log()
+        self.assertEqual(self._cortexm.get_reg('PC'), 0x10f)
+        self.assertEqual(self._cortexm.get_reg('SP'), 0x10d)
+        self.assertEqual(self._cortexm.get_reg_all()['PSP'], 0x112)
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_reg_all', ),
+        ])
+
+    def test_write_halted(self):
+        """test register write to halted core updates snapshot"""
+        self._cortexm.halt()
+        self._cortexm.get_reg('R0')
+        self._cortexm.set_reg('R0', 0x12345678)
+        self.assertEqual(self._cortexm.get_reg('R0'), 0x12345678)
+        self.assertEqual(self._swd.get_call_log()[-2:], [
+            ('get_reg_all', ),
+            ('set_reg', 0, 0x12345678),
+        ])
+
+    def test_buffered_write(self):
+        """test register writes are buffered and flushed by run"""
+        self._cortexm = swd.cortexm.CortexM(self._swd, buffer_writes=True)
+        self._cortexm.halt()
+        self._cortexm.set_reg('R0', 0x12345678)
+        self._cortexm.set_reg('PC', 0x08000100)
+        self.assertEqual(self._cortexm.get_reg('R0'), 0x12345678)
+        self.assertEqual(self._cortexm.get_reg_all()['PC'], 0x08000100)
+        self._swd.get_call_log()
+        self._cortexm.run()
+        self.assertEqual(self._swd.get_call_log(), [
+            ('set_reg', 0, 0x12345678),
+            ('set_reg', 15, 0x08000100),
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_DEBUGEN),
+        ])
+        self.assertEqual(self._cortexm.get_reg('R0'), 0x12345678)
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_reg', 0),
+        ])
+
+    def test_step_invalidates(self):
+        """test step flushes writes and invalidates snapshot"""
+        self._cortexm = swd.cortexm.CortexM(self._swd, buffer_writes=True)
+        self._cortexm.halt()
+        self._cortexm.get_reg('R2')
+        self._cortexm.set_reg('R2', 7)
+        self._swd.get_call_log()
+        self._cortexm.step()
+        self._cortexm.get_reg('R2')
+        self.assertEqual(self._swd.get_call_log(), [
+            ('set_reg', 2, 7),
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_STEP),
+            ('get_reg_all', ),
+        ])
+
+    def test_reset_drops_writes(self):
+        """test reset discards buffered writes"""
+        self._cortexm = swd.cortexm.CortexM(self._swd, buffer_writes=True)
+        self._cortexm.halt()
+        self._cortexm.set_reg('R3', 7)
+        self._cortexm.reset()
+        self._cortexm.flush_regs()
+        self.assertNotIn(('set_reg', 3, 7), self._swd.get_call_log())
+
+    def test_halt_confirmed(self):
+        """test halt waits for S_HALT"""
+        self._cortexm.halt()
+        self.assertEqual(self._swd.get_call_log(), [
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_HALT),
+            ('get_mem32', DHCSR),
+        ])
+        self.assertTrue(self._cortexm.is_halted(cached=True))
+        self.assertEqual(self._swd.get_call_log(), [])
+
+    def test_halt_timeout(self):
+        """test registers are not cached when core is not halted"""
+        self._swd.set_mem32 = lambda address, data: None
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.halt(timeout=0.01)
+        self._swd.get_call_log()
+        self.assertFalse(self._cortexm.is_halted(cached=True))
+        self._cortexm.set_reg('R0', 1)
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_mem32', DHCSR),
+            ('set_reg', 0, 1),
+        ])
+
+    def test_is_halted(self):
+        """test is_halted enables snapshot"""
+        self._swd.dhcsr = swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT
+        self.assertTrue(self._cortexm.is_halted())
+        self._cortexm.get_reg('R0')
+        self._cortexm.get_reg('R1')
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_mem32', DHCSR),
+            ('get_reg_all', ),
+        ])
+
+
+class TestCortexMReset(_TestCortexM):
+    """Tests for reset strategies and waiting for reset"""
+
+    AIRCR = swd.cortexm.CortexM.AIRCR_REG
+    DEMCR = swd.cortexm.CortexM.DEMCR_REG
+
+    def test_reset(self):
+        """test SYSRESETREQ reset is confirmed by S_RESET_ST"""
+        self._cortexm.reset()
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_mem32', DHCSR),
+            ('set_mem32', self.DEMCR, swd.cortexm.CortexM.DEMCR_RUN_AFTER_RESET),
+            ('set_mem32', self.AIRCR, swd.cortexm.CortexM.AIRCR_SYSRESETREQ),
+            ('get_mem32', DHCSR),
+        ])
+
+    def test_reset_halt_snapshot(self):
+        """test core is known to be halted after reset_halt"""
+        self._cortexm.reset_halt(strategy='vectreset')
+        self._cortexm.get_reg('R0')
+        self._cortexm.get_reg('R1')
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_mem32', DHCSR),
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_HALT),
+            ('set_mem32', self.DEMCR, swd.cortexm.CortexM.DEMCR_HALT_AFTER_RESET),
+            ('set_mem32', self.AIRCR, swd.cortexm.CortexM.AIRCR_VECTRESET),
+            ('get_mem32', DHCSR),
+            ('get_reg_all', ),
+        ])
+
+    def test_nrst(self):
+        """test reset by NRST pulse"""
+        self._cortexm.reset(strategy='nrst')
+        self.assertIn(('pulse_nrst', ), self._swd.get_call_log())
+
+    def test_under_reset(self):
+        """test connect under reset releases NRST after halt is requested"""
+        self._cortexm.reset_halt(strategy='under_reset')
+        self.assertEqual(self._swd.get_call_log(), [
+            ('connect_under_reset', ),
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_HALT),
+            ('set_mem32', self.DEMCR, swd.cortexm.CortexM.DEMCR_HALT_AFTER_RESET),
+            ('set_nrst', False),
+            ('get_mem32', DHCSR),
+        ])
+
+    def test_no_wait(self):
+        """test reset without waiting"""
+        self._cortexm.reset_halt(timeout=None)
+        self.assertEqual(self._swd.get_call_log()[-1], (
+            'set_mem32', self.AIRCR, swd.cortexm.CortexM.AIRCR_SYSRESETREQ))
+
+    def test_timeout(self):
+        """test timeout when reset is not done"""
+        self._swd.pulse_nrst = lambda: None
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.reset(strategy='nrst', timeout=0.01)
+
+    def test_wait_halted_timeout(self):
+        """test timeout when core is not halted"""
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.wait_halted(timeout=0.01)
+
+    def test_unknown_strategy(self):
+        """test unknown reset strategy"""
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.reset(strategy='power')
+
+
+class TestCortexMExtendedRegisters(_TestCortexM):
+    """Tests for extended register access"""
+
+    def test_special(self):
+        """test reading packed special registers"""
+        self.assertEqual(self._cortexm.get_reg_ext('CONTROL'), 0x04)
+        self.assertEqual(self._cortexm.get_reg_ext('faultmask'), 0x01)
+        self.assertEqual(self._cortexm.get_reg_ext('BASEPRI'), 0x02)
+        self.assertEqual(self._cortexm.get_reg_ext('PRIMASK'), 0x03)
+
+    def test_all_at_once(self):
+        """test reading all extended registers with one driver call"""
+        self._cortexm.halt()
+        self._swd.get_call_log()
+        regs = self._cortexm.get_reg_ext_all()
+        self.assertEqual(regs['CONTROL'], 0x04)
+        self.assertEqual(regs['FPSCR'], 0x03000000)
+        self.assertEqual(regs['S31'], 0x3f800000 + 31)
+        self.assertEqual(len(regs), len(swd.cortexm.CortexM.EXTENDED_REGISTERS))
+        self.assertEqual(self._cortexm.get_reg_ext('S5'), 0x3f800005)
+        self.assertEqual(self._swd.get_call_log(), [
+            ('get_mem32', swd.cortexm.CortexM.MVFR0_REG),
+            ('get_reg_list', [20, 33] + list(range(64, 96))),
+        ])
+
+    def test_no_fpu(self):
+        """test core without FPU"""
+        self._swd.mvfr0 = 0
+        self.assertEqual(list(self._cortexm.get_reg_ext_all()), [
+            'CONTROL', 'FAULTMASK', 'BASEPRI', 'PRIMASK'])
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.get_reg_ext('S0')
+
+    def test_set_packed(self):
+        """test writing one of packed special registers"""
+        self._cortexm.set_reg_ext('BASEPRI', 0x80)
+        self.assertEqual(self._swd.ext_regs[20], 0x04018003)
+
+
+class StubCoreMock():
+    """Swd Mock class simulating core which executes stubs
+
+    Stubs are not executed, registered stubs are simulated by Python code.
+    """
+
+    RAM = 0x20000000
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        self.memory = bytearray(0x1000)
+        self.regs = [0] * 21
+        self.halted = False
+        self.call_log = []
+        self._stubs = {
+            swd.stubs.CRC32.code: self._crc32,
+            swd.stubs.MEMSET.code: self._memset,
+            swd.stubs.MEMCMP.code: self._memcmp,
+        }
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        offset = address - StubCoreMock.RAM
+        return iter(self.memory[offset:offset + size])
+
+    def write_mem(self, address, data, retry=False):
+        """Mock write_mem"""
+        self.call_log.append(('write_mem', address, len(data)))
+        offset = address - StubCoreMock.RAM
+        self.memory[offset:offset + len(data)] = data
+
+    def get_mem32(self, address):
+        """Mock get_mem32"""
+        if address == swd.cortexm.CortexM.DHCSR_REG:
+            # reset is simulated as immediately finished
+            return (
+                (swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT if self.halted else 0) |
+                swd.cortexm.CortexM.DHCSR_STATUS_RESET_BIT)
+        return 0
+
+    def set_mem32(self, address, data):
+        """Mock set_mem32"""
+        self.call_log.append(('set_mem32', address, data))
+        if address != swd.cortexm.CortexM.DHCSR_REG:
+            return
+        if data & swd.cortexm.CortexM.DHCSR_HALT_BIT:
+            self.halted = True
+        elif data & swd.cortexm.CortexM.DHCSR_DEBUGEN_BIT:
+            self.halted = False
+            self._run()
+
+    def set_reg(self, register, data):
+        """Mock set_reg"""
+        self.regs[register] = data
+
+    def get_reg_all(self):
+        """Mock get_reg_all"""
+        return list(self.regs)
+
+    def _run(self):
+        offset = self.regs[15] - StubCoreMock.RAM
+        for code, function in self._stubs.items():
+            if self.memory[offset:offset + len(code)] == code:
+                self.regs[0] = function(*self.regs[:4])
+                self.regs[15] += code.rindex(b'\x00\xbe')
+                self.halted = True
+                return
+
+    def _crc32(self, address, size, crc, unused_r3):
+        return zlib.crc32(bytes(self.read_mem(address, size)), crc ^ 0xffffffff) ^ 0xffffffff
+
+    def _memset(self, address, value, size, unused_r3):
+        self.write_mem(address, bytes([value]) * size)
+        return address + size
+
+    def _memcmp(self, address1, address2, size, unused_r3):
+        data1 = bytes(self.read_mem(address1, size))
+        data2 = bytes(self.read_mem(address2, size))
+        for offset in range(size):
+            if data1[offset] != data2[offset]:
+                return offset
+        return size
+
+
+class TestCortexMStubs(unittest.TestCase):
+    """Tests for stub execution"""
+
+    def setUp(self):
+        self._swd = StubCoreMock()
+        self._swd.memory[0x100:0x200] = bytes(range(256))
+        self._cortexm = swd.cortexm.CortexM(self._swd)
+
+    def test_crc32(self):
+        """test CRC32 computed on target"""
+        self.assertEqual(
+            self._cortexm.crc32(0x20000100, 0x100), zlib.crc32(bytes(range(256))))
+        self.assertEqual(
+            self._cortexm.crc32(0x20000180, 0x80, self._cortexm.crc32(0x20000100, 0x80)),
+            zlib.crc32(bytes(range(256))))
+
+    def test_memset(self):
+        """test memset on target"""
+        self._cortexm.memset(0x20000800, 0x1a5, 0x10)
+        self.assertEqual(self._swd.memory[0x800:0x811], b'\xa5' * 16 + b'\x00')
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.memset(0x20000000, 0, 0x10)
+
+    def test_memcmp(self):
+        """test memcmp on target"""
+        self._swd.memory[0x200:0x300] = bytes(range(256))
+        self.assertIsNone(self._cortexm.memcmp(0x20000100, 0x20000200, 0x100))
+        self._swd.memory[0x2f0] = 0
+        self.assertEqual(self._cortexm.memcmp(0x20000100, 0x20000200, 0x100), 0xf0)
+
+    def test_stub_loaded_once(self):
+        """test stub is copied only once and interrupts are masked"""
+        self._cortexm.crc32(0x20000100, 0x10)
+        self._cortexm.crc32(0x20000100, 0x10)
+        log = self._swd.call_log
+        self.assertEqual(log.count(('write_mem', 0x20000000, len(swd.stubs.CRC32.code))), 1)
+        self.assertIn(
+            ('set_mem32', DHCSR, swd.cortexm.CortexM.DHCSR_DEBUGEN_MASKINTS), log)
+        self._cortexm.reset_halt()
+        self._cortexm.crc32(0x20000100, 0x10)
+        self.assertEqual(log.count(('write_mem', 0x20000000, len(swd.stubs.CRC32.code))), 2)
+
+    def test_stub_reloaded_after_run(self):
+        """test stub is copied again after core was running"""
+        write = ('write_mem', 0x20000000, len(swd.stubs.CRC32.code))
+        self._cortexm.crc32(0x20000100, 0x10)
+        self._cortexm.run()
+        # firmware use RAM under stub
+        self._swd.memory[0:0x10] = bytes(0x10)
+        self._cortexm.halt()
+        self.assertEqual(
+            self._cortexm.crc32(0x20000100, 0x10), zlib.crc32(bytes(range(16))))
+        self.assertEqual(self._swd.call_log.count(write), 2)
+
+    def test_stub_overwritten(self):
+        """test stub is copied again if its code was overwritten"""
+        write = ('write_mem', 0x20000000, len(swd.stubs.CRC32.code))
+        self._cortexm.crc32(0x20000100, 0x10)
+        self._swd.write_mem(0x20000000, bytes(4))
+        self.assertEqual(
+            self._cortexm.crc32(0x20000100, 0x10), zlib.crc32(bytes(range(16))))
+        self.assertEqual(self._swd.call_log.count(write), 2)
+
+    def test_stopped_out_of_stub(self):
+        """test stub stopped out of its code"""
+        stub = swd.stubs.Stub('nop', swd.stubs.thumb(0xbf00, 0xbe00))
+        self._swd._stubs[stub.code] = lambda *args: 0
+        self._cortexm.start_stub(stub)
+        self._swd.regs[15] = 0x08000000
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.wait_stub()
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.wait_stub()
+
+
+class MemorySwdMock(SwdMock):
+    """Swd Mock class with registers and memory for testing checkpoints"""
+
+    RAM = 0x20000000
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        super().__init__()
+        self.memory = bytearray(range(256)) * 8
+
+    def read_chunks(self, address, size):
+        """Mock read_chunks"""
+        offset = address - MemorySwdMock.RAM
+        yield address, bytes(self.memory[offset:offset + size])
+
+    def write_mem(self, address, data, retry=False):
+        """Mock write_mem"""
+        self.call_log.append(('write_mem', address, len(data)))
+        offset = address - MemorySwdMock.RAM
+        self.memory[offset:offset + len(data)] = data
+
+
+class TestCortexMCheckpoint(unittest.TestCase):
+    """Tests for checkpoint and restore"""
+
+    def setUp(self):
+        self._swd = MemorySwdMock()
+        self._cortexm = swd.cortexm.CortexM(self._swd)
+        self._filename = tempfile.mktemp(suffix='.ckp')
+
+    def tearDown(self):
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+
+    def test_restore(self):
+        """test registers and changed memory blocks are restored"""
+        self._cortexm.checkpoint(self._filename, [(0x20000000, 0x800)])
+        self._cortexm.run()
+        memory = bytes(self._swd.memory)
+        regs = list(self._swd.regs)
+        self._swd.memory[0x420] = 0
+        self._swd.regs[0] = 0
+        self._swd.regs[15] = 0x08000000
+        self._swd.ext_regs[20] = 0
+        self._swd.get_call_log()
+        self.assertEqual(self._cortexm.restore(self._filename), 0x100)
+        self.assertEqual(bytes(self._swd.memory), memory)
+        self.assertEqual(self._swd.regs, regs)
+        self.assertEqual(self._swd.ext_regs[20], 0x04010203)
+        self.assertIn(('write_mem', 0x20000400, 0x100), self._swd.get_call_log())
+
+    def test_restore_drops_stub(self):
+        """test restored memory is not used as loaded stub"""
+        self._cortexm.checkpoint(self._filename, [(0x20000000, 0x800)])
+        self._cortexm._loaded_stub = (0x20000000, swd.stubs.CRC32)
+        self._cortexm.restore(self._filename)
+        self.assertIsNone(self._cortexm._loaded_stub)
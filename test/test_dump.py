@@ -0,0 +1,111 @@
+"""Unit tests for _dump.py"""
+import io
+import json
+import unittest
+import swd._dump
+
+
+def _dump(dump_class, data, *args, chunk_size=None, **kwargs):
+    output = io.BytesIO()
+    dump = dump_class(output, *args, **kwargs)
+    chunk_size = chunk_size or len(data) or 1
+    for offset in range(0, len(data), chunk_size):
+        dump.write(data[offset:offset + chunk_size])
+    dump.close()
+    return output.getvalue().decode()
+
+
+class TestHexDump(unittest.TestCase):
+    """Tests for HexDump"""
+
+    def test_8bit(self):
+        """test 8 bit dump with incomplete last line"""
+        data = bytes(range(0x40, 0x40 + 20))
+        self.assertEqual(_dump(swd._dump.HexDump, data, 0x20000000), (
+            '20000000  40 41 42 43 44 45 46 47 48 49 4a 4b 4c 4d 4e 4f  @ABCDEFGHIJKLMNO\n'
+            '20000010  50 51 52 53                                      PQRS\n'))
+
+    def test_16bit(self):
+        """test 16 bit dump"""
+        data = bytes(range(16))
+        self.assertEqual(_dump(swd._dump.HexDump, data, 0x100, width=2), (
+            '00000100  0100 0302 0504 0706 0908 0b0a 0d0c 0f0e  ................\n'))
+
+    def test_32bit(self):
+        """test 32 bit dump with incomplete last line"""
+        data = bytes(range(0x41, 0x41 + 24))
+        self.assertEqual(_dump(swd._dump.HexDump, data, 0x08000000, width=4), (
+            '08000000  44434241 48474645 4c4b4a49 504f4e4d  ABCDEFGHIJKLMNOP\n'
+            '08000010  54535251 58575655                    QRSTUVWX\n'))
+
+    def test_collapse(self):
+        """test collapsing of repeated lines over chunks"""
+        data = bytes(16) * 4 + b'\xff' * 16 + bytes(16)
+        expected = (
+            '00000000  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  ................\n'
+            '*\n'
+            '00000040  ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff  ................\n'
+            '00000050  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  ................\n')
+        self.assertEqual(_dump(swd._dump.HexDump, data, 0), expected)
+        self.assertEqual(_dump(swd._dump.HexDump, data, 0, chunk_size=4), expected)
+
+    def test_collapse_at_end(self):
+        """test address after collapsed lines at end"""
+        self.assertEqual(_dump(swd._dump.HexDump, bytes(48), 0), (
+            '00000000  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  ................\n'
+            '*\n'
+            '00000030\n'))
+
+    def test_verbose(self):
+        """test verbose dump without collapsing"""
+        self.assertEqual(_dump(swd._dump.HexDump, bytes(32), 0, verbose=2), (
+            '00000000  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  ................\n'
+            '00000010  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  ................\n'
+            '00000020\n'))
+
+    def test_large(self):
+        """test large dump formatted by blocks against line by line formatting"""
+        data = bytes([(index * 7) & 0xff for index in range(swd._dump.HexDump.BLOCK_SIZE * 3)])
+        data += bytes(64)
+        lines = []
+        for offset in range(0, len(data), 16):
+            line = data[offset:offset + 16]
+            lines.append('%08x  %s  %s\n' % (
+                0x1000 + offset, ' '.join(['%08x' % int.from_bytes(
+                    line[index:index + 4], byteorder='little') for index in range(0, 16, 4)]),
+                ''.join([chr(byte) if 32 <= byte < 127 else '.' for byte in line])))
+        expected = ''.join(lines[:-3]) + '*\n%08x\n' % (0x1000 + len(data))
+        self.assertEqual(
+            _dump(swd._dump.HexDump, data, 0x1000, width=4, chunk_size=1024), expected)
+
+
+class TestOtherDumps(unittest.TestCase):
+    """Tests for raw, C array and JSON dumps"""
+
+    def test_raw(self):
+        """test raw dump"""
+        output = io.BytesIO()
+        dump = swd._dump.create_dump('raw', output, 0, 4)
+        dump.write(b'\x00\x01\x02\x03')
+        dump.close()
+        self.assertEqual(output.getvalue(), b'\x00\x01\x02\x03')
+
+    def test_c_array(self):
+        """test C array of 32 bit values"""
+        data = bytes(range(24))
+        self.assertEqual(_dump(swd._dump.CArrayDump, data, 0x20000000, 24, width=4), (
+            'const uint32_t mem_20000000[6] = {\n'
+            '    0x03020100, 0x07060504, 0x0b0a0908, 0x0f0e0d0c,\n'
+            '    0x13121110, 0x17161514,\n'
+            '};\n'))
+
+    def test_json(self):
+        """test JSON dump"""
+        data = bytes(range(8))
+        result = json.loads(_dump(swd._dump.JsonDump, data, 0x100, 8, chunk_size=3))
+        self.assertEqual(result, {'address': 0x100, 'size': 8, 'data': '0001020304050607'})
+
+    def test_unknown_format(self):
+        """test unknown format"""
+        with self.assertRaises(swd._dump.DumpException):
+            swd._dump.create_dump('xml', io.BytesIO(), 0, 4)
@@ -0,0 +1,93 @@
+"""Unit tests for image.py"""
+import os
+import tempfile
+import unittest
+import swd.image
+
+
+class SwdMock():
+    """Swd Mock class with flash memory for testing sparse image"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(b'\xff' * size)
+
+    def read_chunks(self, address, size):
+        """Mock read_chunks"""
+        offset = address - self._address
+        for chunk in range(0, size, 1000):
+            chunk_size = min(1000, size - chunk)
+            yield address + chunk, bytes(self.memory[offset + chunk:offset + chunk + chunk_size])
+
+
+FLASH = 0x08000000
+
+
+class TestSparseImage(unittest.TestCase):
+    """Tests for SparseImageWriter and SparseImage"""
+
+    def setUp(self):
+        self._swd = SwdMock(FLASH, 0x20000)
+        self._swd.memory[0:0x1234] = bytes(range(256)) * 18 + bytes(range(0x34))
+        self._swd.memory[0xfff0:0x10010] = b'\x5a' * 0x20
+        self._filename = tempfile.mktemp(suffix='.img')
+        self._export = tempfile.mktemp()
+        with swd.image.SparseImageWriter(self._filename) as writer:
+            writer.dump(self._swd, FLASH, 0x20000)
+
+    def tearDown(self):
+        for filename in (self._filename, self._export):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_extents(self):
+        """test only non erased blocks are stored"""
+        with swd.image.SparseImage(self._filename) as image:
+            self.assertEqual(image.extents, [(FLASH, 0x1300), (FLASH + 0xff00, 0x200)])
+            self.assertEqual(image.end, FLASH + 0x10100)
+        self.assertLess(os.path.getsize(self._filename), 0x800)
+
+    def test_read(self):
+        """test random access read"""
+        with swd.image.SparseImage(self._filename) as image:
+            self.assertEqual(
+                image.read(FLASH + 0x1200, 0x100), bytes(self._swd.memory[0x1200:0x1300]))
+            self.assertEqual(
+                image.read(FLASH + 0xffe0, 0x40), bytes(self._swd.memory[0xffe0:0x10020]))
+            self.assertEqual(image.read(FLASH + 0x8000, 4), b'\xff' * 4)
+
+    def test_bin(self):
+        """test export into binary file"""
+        with swd.image.SparseImage(self._filename) as image:
+            image.to_bin(self._export)
+        with open(self._export, 'rb') as bin_file:
+            self.assertEqual(bin_file.read(), bytes(self._swd.memory[:0x10100]))
+
+    def test_hex(self):
+        """test export into Intel HEX"""
+        with swd.image.SparseImage(self._filename) as image:
+            image.to_hex(self._export)
+        with open(self._export) as hex_file:
+            lines = hex_file.read().splitlines()
+        self.assertEqual(lines[0], ':020000040800F2')
+        self.assertEqual(lines[1], ':10000000000102030405060708090A0B0C0D0E0F78')
+        self.assertIn(':020000040801F1', lines)
+        self.assertEqual(lines[-1], ':00000001FF')
+        self.assertEqual(len(lines), 0x130 + 0x20 + 3)
+
+    def test_srec(self):
+        """test export into S-record"""
+        with swd.image.SparseImage(self._filename) as image:
+            image.to_srec(self._export)
+        with open(self._export) as srec_file:
+            lines = srec_file.read().splitlines()
+        self.assertEqual(lines[1], 'S31508000000000102030405060708090A0B0C0D0E0F6A')
+        self.assertEqual(lines[-1], 'S70500000000FA')
+
+    def test_not_image(self):
+        """test opening file which is not image"""
+        with open(self._export, 'wb') as bin_file:
+            bin_file.write(bytes(64))
+        with self.assertRaises(swd.image.ImageException):
+            swd.image.SparseImage(self._export)
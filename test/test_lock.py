@@ -0,0 +1,76 @@
+"""Unit tests for _lock.py"""
+import threading
+import time
+import unittest
+import swd._lock
+
+
+class TestProbeLock(unittest.TestCase):
+    """Tests for ProbeLock"""
+
+    def test_reentrant(self):
+        """test nested acquisition in one thread"""
+        lock = swd._lock.ProbeLock()
+        with lock:
+            with lock:
+                pass
+            self.assertFalse(lock._lock.acquire(blocking=False))
+        self.assertTrue(lock._lock.acquire(blocking=False))
+        self.assertEqual(lock.acquisitions, 1)
+
+    def test_is_owned(self):
+        """test lock is owned only by thread which holds it"""
+        lock = swd._lock.ProbeLock()
+        owned = []
+        with lock:
+            thread = threading.Thread(target=lambda: owned.append(lock.is_owned()))
+            thread.start()
+            thread.join()
+            self.assertTrue(lock.is_owned())
+        self.assertFalse(lock.is_owned())
+        self.assertEqual(owned, [False])
+
+    def test_release_not_owner(self):
+        """test release by thread which does not hold lock"""
+        with self.assertRaises(RuntimeError):
+            swd._lock.ProbeLock().release()
+
+    def test_contention(self):
+        """test waiting thread is counted"""
+        lock = swd._lock.ProbeLock()
+        started = threading.Event()
+
+        def worker():
+            started.set()
+            with lock:
+                pass
+
+        with lock:
+            thread = threading.Thread(target=worker)
+            thread.start()
+            started.wait()
+            time.sleep(0.02)
+        thread.join()
+        self.assertEqual(lock.acquisitions, 2)
+        self.assertEqual(lock.contentions, 1)
+        self.assertGreater(lock.wait_time, 0.0)
+
+    def test_yield_lock(self):
+        """test waiting thread get lock when lock is yielded and nesting is restored"""
+        lock = swd._lock.ProbeLock()
+        done = threading.Event()
+
+        def worker():
+            with lock:
+                done.set()
+
+        with lock:
+            with lock:
+                thread = threading.Thread(target=worker)
+                thread.start()
+                while not done.is_set():
+                    time.sleep(0.001)
+                    lock.yield_lock()
+            self.assertEqual(lock._count, 1)
+        thread.join()
+        self.assertIsNone(lock._owner)
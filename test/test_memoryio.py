@@ -0,0 +1,78 @@
+"""Unit tests for memoryio.py"""
+import io
+import shutil
+import struct
+import unittest
+import swd.memoryio
+
+
+class SwdMock():
+    """Swd Mock class with memory for testing SwdMemoryIO class"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(range(256)) * (size // 256)
+        self.log = []
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        self.log.append(('read_mem', address, size))
+        offset = address - self._address
+        return iter(self.memory[offset:offset + size])
+
+    def write_mem(self, address, data):
+        """Mock write_mem"""
+        self.log.append(('write_mem', address, len(data)))
+        offset = address - self._address
+        self.memory[offset:offset + len(data)] = data
+
+
+RAM = 0x20000000
+
+
+class TestSwdMemoryIO(unittest.TestCase):
+    """Tests for SwdMemoryIO class"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x2000)
+        self._mem = swd.memoryio.SwdMemoryIO(self._swd, RAM + 0x10, 0x1000, block_size=0x100)
+
+    def test_small_reads_buffered(self):
+        """test sequential small reads are served from buffer"""
+        self.assertEqual(self._mem.read(4), bytes([0x10, 0x11, 0x12, 0x13]))
+        self.assertEqual(struct.unpack('<HH', self._mem.read(4)), (0x1514, 0x1716))
+        self.assertEqual(self._mem.tell(), 8)
+        self.assertEqual(self._swd.log, [('read_mem', RAM + 0x10, 0xf0)])
+        self._mem.seek(0xf0)
+        self.assertEqual(self._mem.read(0x20), bytes(range(0x00, 0x20)))
+        self.assertEqual(self._swd.log[1:], [('read_mem', RAM + 0x100, 0x100)])
+
+    def test_big_read_direct(self):
+        """test read bigger than buffer is done directly"""
+        self._mem.seek(0x200)
+        self.assertEqual(len(self._mem.read(0x300)), 0x300)
+        self.assertEqual(self._swd.log, [('read_mem', RAM + 0x210, 0x300)])
+
+    def test_end(self):
+        """test reading stops at end of region"""
+        self.assertEqual(self._mem.seek(-2, io.SEEK_END), 0xffe)
+        self.assertEqual(self._mem.read(16), bytes([0x0e, 0x0f]))
+        self.assertEqual(self._mem.read(16), b'')
+        with self.assertRaises(ValueError):
+            self._mem.seek(-1)
+
+    def test_write(self):
+        """test write updates buffer"""
+        self.assertEqual(self._mem.read(1), b'\x10')
+        self.assertEqual(self._mem.write(b'\xaa\xbb'), 2)
+        self._mem.seek(0)
+        self.assertEqual(self._mem.read(4), b'\x10\xaa\xbb\x13')
+        self.assertEqual(self._swd.memory[0x11:0x13], b'\xaa\xbb')
+        self.assertEqual(len(self._swd.log), 2)
+
+    def test_copyfileobj(self):
+        """test use with standard library"""
+        output = io.BytesIO()
+        shutil.copyfileobj(io.BufferedReader(self._mem), output)
+        self.assertEqual(output.getvalue(), bytes(self._swd.memory[0x10:0x1010]))
@@ -0,0 +1,59 @@
+"""Unit tests for _output.py"""
+import io
+import json
+import unittest
+import swd._output
+
+
+class TestRecordWriter(unittest.TestCase):
+    """Tests for RecordWriter"""
+
+    def test_ndjson(self):
+        """test one record per line"""
+        output = io.StringIO()
+        writer = swd._output.RecordWriter(output)
+        writer.write({'action': 'reg', 'register': 'PC', 'value': 0x08000100})
+        writer.write({'action': 'reg', 'status': 'ok'})
+        writer.close()
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()], [
+            {'action': 'reg', 'register': 'PC', 'value': 0x08000100},
+            {'action': 'reg', 'status': 'ok'}])
+
+    def test_json(self):
+        """test array of records"""
+        output = io.StringIO()
+        writer = swd._output.RecordWriter(output, array=True)
+        writer.write({'action': 'halt', 'status': 'ok'})
+        writer.write({'action': 'run', 'status': 'ok'})
+        writer.close()
+        self.assertEqual(json.loads(output.getvalue()), [
+            {'action': 'halt', 'status': 'ok'},
+            {'action': 'run', 'status': 'ok'}])
+
+    def test_json_empty(self):
+        """test array without records"""
+        output = io.StringIO()
+        swd._output.RecordWriter(output, array=True).close()
+        self.assertEqual(json.loads(output.getvalue()), [])
+
+
+class TestDataRecords(unittest.TestCase):
+    """Tests for DataRecords"""
+
+    def test_chunks(self):
+        """test each chunk is written as record with address"""
+        output = io.StringIO()
+        writer = swd._output.RecordWriter(output)
+        stream = swd._output.DataRecords(writer, {'action': 'dump8'}, 0x20000000)
+        stream.write(b'\x01\x02')
+        stream.write(b'\xff')
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()], [
+            {'action': 'dump8', 'address': 0x20000000, 'data': '0102'},
+            {'action': 'dump8', 'address': 0x20000002, 'data': 'ff'}])
+
+    def test_without_address(self):
+        """test stream without address"""
+        output = io.StringIO()
+        stream = swd._output.DataRecords(swd._output.RecordWriter(output), {'action': 'rtt'})
+        stream.write(b'hello')
+        self.assertEqual(json.loads(output.getvalue()), {'action': 'rtt', 'data': '68656c6c6f'})
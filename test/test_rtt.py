@@ -0,0 +1,145 @@
+"""Unit tests for rtt.py"""
+import io
+import struct
+import unittest
+import swd.rtt
+
+
+class SwdMock():
+    """Swd Mock class with memory for testing Rtt class"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(size)
+        self.read_log = []
+
+    def _offset(self, address, size):
+        offset = address - self._address
+        if offset < 0 or offset + size > len(self.memory):
+            raise IndexError("address out of memory")
+        return offset
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        self.read_log.append((address, size))
+        offset = self._offset(address, size)
+        return iter(self.memory[offset:offset + size])
+
+    def write_mem(self, address, data):
+        """Mock write_mem"""
+        data = bytes(data)
+        offset = self._offset(address, len(data))
+        self.memory[offset:offset + len(data)] = data
+
+    def get_mem32(self, address):
+        """Mock get_mem32"""
+        offset = self._offset(address, 4)
+        return int.from_bytes(self.memory[offset:offset + 4], byteorder='little')
+
+    def set_mem32(self, address, data):
+        """Mock set_mem32"""
+        self.write_mem(address, data.to_bytes(4, byteorder='little'))
+
+
+RAM = 0x20000000
+CB = RAM + 0x1000
+UP_BUFFER = RAM + 0x2000
+DOWN_BUFFER = RAM + 0x3000
+
+
+class _TestRtt(unittest.TestCase):
+    """Base class for testing Rtt class"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x4000)
+        self._swd.write_mem(CB, swd.rtt.Rtt.CONTROL_BLOCK_ID + struct.pack(
+            '<II IIIIII IIIIII', 1, 1,
+            0, UP_BUFFER, 16, 0, 0, 0,
+            0, DOWN_BUFFER, 16, 0, 0, 0))
+        self._rtt = swd.rtt.Rtt(self._swd, ram_start=RAM, ram_size=0x4000)
+
+    def _set_offsets(self, buf, wr_off, rd_off):
+        self._swd.set_mem32(buf.wr_off_address, wr_off)
+        self._swd.set_mem32(buf.rd_off_address, rd_off)
+
+
+class TestRttControlBlock(_TestRtt):
+    """Tests for locating control block"""
+
+    def test_search(self):
+        """test control block found by search"""
+        self.assertEqual(self._rtt.address, CB)
+        self.assertEqual(len(self._rtt.up_buffers), 1)
+        self.assertEqual(len(self._rtt.down_buffers), 1)
+        self.assertEqual(self._rtt.up_buffers[0].buffer, UP_BUFFER)
+        self.assertEqual(self._rtt.down_buffers[0].size, 16)
+
+    def test_search_over_chunk_boundary(self):
+        """test control block crossing search chunk boundary"""
+        start = RAM + 0x2000
+        address = start + swd.rtt.Rtt.SEARCH_CHUNK_SIZE - 8
+        self._swd.memory.extend(bytes(swd.rtt.Rtt.SEARCH_CHUNK_SIZE))
+        self._swd.write_mem(address, swd.rtt.Rtt.CONTROL_BLOCK_ID)
+        found = swd.rtt.Rtt.find_control_block(
+            self._swd, start, swd.rtt.Rtt.SEARCH_CHUNK_SIZE + 0x1000)
+        self.assertEqual(found, address)
+
+    def test_wrong_address(self):
+        """test control block with wrong ID"""
+        with self.assertRaises(swd.rtt.RttException):
+            swd.rtt.Rtt(self._swd, address=RAM)
+
+
+class TestRttRead(_TestRtt):
+    """Tests for Rtt.read()"""
+
+    def test_empty(self):
+        """test reading empty buffer reads only offsets"""
+        self._swd.read_log = []
+        self.assertEqual(self._rtt.read(), b'')
+        self.assertEqual(self._swd.read_log, [
+            (self._rtt.up_buffers[0].wr_off_address, 8),
+        ])
+
+    def test_linear(self):
+        """test reading data without wrap"""
+        self._swd.write_mem(UP_BUFFER + 2, b'hello')
+        self._set_offsets(self._rtt.up_buffers[0], 7, 2)
+        self.assertEqual(self._rtt.read(), b'hello')
+        self.assertEqual(self._swd.get_mem32(self._rtt.up_buffers[0].rd_off_address), 7)
+
+    def test_wrap(self):
+        """test reading data wrapped over end of buffer"""
+        self._swd.write_mem(UP_BUFFER + 12, b'abcd')
+        self._swd.write_mem(UP_BUFFER, b'ef')
+        self._set_offsets(self._rtt.up_buffers[0], 2, 12)
+        self.assertEqual(self._rtt.read(), b'abcdef')
+        self.assertEqual(self._swd.get_mem32(self._rtt.up_buffers[0].rd_off_address), 2)
+
+    def test_stream(self):
+        """test streaming data into output"""
+        self._swd.write_mem(UP_BUFFER, b'log')
+        self._set_offsets(self._rtt.up_buffers[0], 3, 0)
+        output = io.BytesIO()
+        self._rtt.stream(output, duration=0.01)
+        self.assertEqual(output.getvalue(), b'log')
+
+
+class TestRttWrite(_TestRtt):
+    """Tests for Rtt.write()"""
+
+    def test_wrap(self):
+        """test writing data wrapped over end of buffer"""
+        self._set_offsets(self._rtt.down_buffers[0], 14, 10)
+        self.assertEqual(self._rtt.write(b'abcdefgh'), 8)
+        memory = bytes(self._swd.read_mem(DOWN_BUFFER, 16))
+        self.assertEqual(memory[14:], b'ab')
+        self.assertEqual(memory[:6], b'cdefgh')
+        self.assertEqual(self._swd.get_mem32(self._rtt.down_buffers[0].wr_off_address), 6)
+
+    def test_full(self):
+        """test writing is limited by free space"""
+        self._set_offsets(self._rtt.down_buffers[0], 0, 4)
+        self.assertEqual(self._rtt.write(b'0123456789'), 3)
+        self.assertEqual(self._swd.get_mem32(self._rtt.down_buffers[0].wr_off_address), 3)
@@ -0,0 +1,108 @@
+"""Unit tests for sampler.py"""
+import os
+import struct
+import tempfile
+import unittest
+import swd.sampler
+
+
+class SwdMock():
+    """Swd Mock class with memory for testing Sampler class"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(size)
+        self.read_log = []
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        self.read_log.append((address, size))
+        offset = address - self._address
+        return iter(self.memory[offset:offset + size])
+
+
+RAM = 0x20000000
+
+
+class _TestSampler(unittest.TestCase):
+    """Base class for testing Sampler class"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x1000)
+        struct.pack_into('<i', self._swd.memory, 0x10, -5)
+        struct.pack_into('<H', self._swd.memory, 0x16, 1234)
+        struct.pack_into('<f', self._swd.memory, 0x800, 1.5)
+        self._sampler = swd.sampler.Sampler(self._swd, [
+            (RAM + 0x800, 'f', 'speed'),
+            (RAM + 0x10, 'i'),
+            (RAM + 0x16, 'H'),
+        ])
+
+
+class TestSamplerPlan(_TestSampler):
+    """Tests for coalescing of reads"""
+
+    def test_plan(self):
+        """test near signals are read together"""
+        self.assertEqual(self._sampler.plan, [
+            (RAM + 0x10, 8),
+            (RAM + 0x800, 4),
+        ])
+
+    def test_plan_gap(self):
+        """test signals with big gap are read separately"""
+        sampler = swd.sampler.Sampler(self._swd, [
+            (RAM + 0x10, 'I'),
+            (RAM + 0x40, 'I'),
+        ], maximum_gap=16)
+        self.assertEqual(sampler.plan, [
+            (RAM + 0x10, 4),
+            (RAM + 0x40, 4),
+        ])
+
+    def test_unsupported_type(self):
+        """test unsupported signal type"""
+        with self.assertRaises(swd.sampler.SamplerException):
+            swd.sampler.Sampler(self._swd, [(RAM, 'x')])
+
+
+class TestSamplerSample(_TestSampler):
+    """Tests for Sampler.sample()"""
+
+    def test_sample_once(self):
+        """test reading all signals once"""
+        self.assertEqual(self._sampler.sample_once(), [1.5, -5, 1234])
+        self.assertEqual(len(self._swd.read_log), 2)
+
+    def test_sample(self):
+        """test sampling into arrays"""
+        result = self._sampler.sample(10)
+        self.assertEqual(len(result), 10)
+        self.assertEqual(list(result.data[0]), [1.5] * 10)
+        self.assertEqual(list(result.data[1]), [-5] * 10)
+        self.assertEqual(list(result.data[2]), [1234] * 10)
+        self.assertEqual(len(self._swd.read_log), 20)
+        self.assertGreater(result.rate, 0)
+
+    def test_fixed_rate(self):
+        """test sampling with fixed rate"""
+        result = self._sampler.sample(5, rate=1000)
+        self.assertAlmostEqual(result.duration, 0.004, delta=0.002)
+
+    def test_save(self):
+        """test saving CSV and binary file"""
+        result = self._sampler.sample(3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_name = os.path.join(tmp_dir, 'out.csv')
+            result.save_csv(csv_name)
+            with open(csv_name) as csv_file:
+                lines = csv_file.read().splitlines()
+            self.assertEqual(lines[0], 'time,speed,0x20000010,0x20000016')
+            self.assertTrue(lines[1].endswith(',1.5,-5,1234'))
+            bin_name = os.path.join(tmp_dir, 'out.bin')
+            result.save_bin(bin_name)
+            with open(bin_name, 'rb') as bin_file:
+                data = bin_file.read()
+            self.assertEqual(data[:16], struct.pack('<8sII', b'PYSWDSMP', 3, 3))
+            self.assertEqual(len(data), 16 + 3 * 5 + 3 * (8 + 4 + 4 + 2))
@@ -0,0 +1,127 @@
+"""Unit tests for snapshot.py"""
+import os
+import tempfile
+import unittest
+import swd.snapshot
+
+
+class SwdMock():
+    """Swd Mock class with memory for testing Snapshot class"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(size)
+
+    def read_chunks(self, address, size):
+        """Mock read_chunks"""
+        offset = address - self._address
+        for chunk in range(0, size, 1024):
+            chunk_size = min(1024, size - chunk)
+            yield address + chunk, bytes(self.memory[offset + chunk:offset + chunk + chunk_size])
+
+
+RAM = 0x20000000
+
+
+class TestSnapshot(unittest.TestCase):
+    """Tests for Snapshot class"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x4000)
+        self._swd.memory[0x100:0x200] = bytes(range(256))
+        self._filename = tempfile.mktemp(suffix='.snp')
+
+    def tearDown(self):
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+
+    def test_save_load(self):
+        """test sparse storage of snapshot"""
+        snapshot = swd.snapshot.Snapshot.take(self._swd, [(RAM, 0x3000), (RAM + 0x3800, 0x10)])
+        snapshot.save(self._filename)
+        self.assertLess(os.path.getsize(self._filename), 0x300)
+        loaded = swd.snapshot.Snapshot.load(self._filename)
+        self.assertEqual(loaded.regions, snapshot.regions)
+        self.assertEqual(loaded.timestamp, snapshot.timestamp)
+
+
+class _DiffTests():
+    """Tests for diff, used with and without NumPy"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x1000)
+        self._snapshots = []
+
+    def _take(self):
+        self._snapshots.append(swd.snapshot.Snapshot.take(self._swd, [(RAM, 0x1000)]))
+
+    def test_diff(self):
+        """test changed ranges and words"""
+        self._take()
+        self._swd.memory[0x102:0x106] = b'\x01\x02\x03\x04'
+        self._swd.memory[0x800] = 0xff
+        self._take()
+        result = swd.snapshot.diff(*self._snapshots)
+        self.assertEqual(result.ranges, [(RAM + 0x102, 4), (RAM + 0x800, 1)])
+        self.assertEqual(result.words, [
+            (RAM + 0x100, 0, 0x02010000),
+            (RAM + 0x104, 0, 0x0403),
+            (RAM + 0x800, 0, 0xff),
+        ])
+
+    def test_changed_times(self):
+        """test words changed exactly N times"""
+        self._take()
+        for value in range(1, 4):
+            self._swd.memory[0x10] = value
+            if value < 3:
+                self._swd.memory[0x20] = value
+            self._take()
+        self.assertEqual(swd.snapshot.find_changed(self._snapshots, 3), [RAM + 0x10])
+        self.assertEqual(swd.snapshot.find_changed(self._snapshots, 2), [RAM + 0x20])
+
+    def test_different_regions(self):
+        """test diff of snapshots with different regions"""
+        self._take()
+        with self.assertRaises(swd.snapshot.SnapshotException):
+            swd.snapshot.diff(self._snapshots[0], swd.snapshot.Snapshot([(RAM, b'\0')]))
+
+
+class TestDiffBytes(_DiffTests, unittest.TestCase):
+    """Tests for diff without NumPy"""
+
+    def setUp(self):
+        _DiffTests.setUp(self)
+        self._numpy = swd.snapshot._numpy
+        swd.snapshot._numpy = False
+
+    def tearDown(self):
+        swd.snapshot._numpy = self._numpy
+
+
+@unittest.skipIf(not swd.snapshot._import_numpy(), "NumPy is not installed")
+class TestDiffNumpy(_DiffTests, unittest.TestCase):
+    """Tests for diff with NumPy"""
+
+
+
+class TestWriteChanged(unittest.TestCase):
+    """Tests for Snapshot.write_changed"""
+
+    def test_only_changed_blocks(self):
+        """test only changed blocks are written"""
+        mock = SwdMock(RAM, 0x1000)
+        mock.write_log = []
+
+        def write_mem(address, data, retry=False):
+            mock.write_log.append((address, len(data), retry))
+            mock.memory[address - RAM:address - RAM + len(data)] = data
+        mock.write_mem = write_mem
+        mock.memory[:] = bytes(range(256)) * 16
+        snapshot = swd.snapshot.Snapshot.take(mock, [(RAM, 0x1000)])
+        mock.memory[0x10] = 0
+        mock.memory[0x3ff:0x401] = b'\xaa\xaa'
+        self.assertEqual(snapshot.write_changed(mock), 0x300)
+        self.assertEqual(mock.write_log, [(RAM, 0x100, True), (RAM + 0x300, 0x200, True)])
+        self.assertEqual(snapshot.regions[0][1], bytes(mock.memory))
@@ -0,0 +1,101 @@
+"""Unit tests for stack.py"""
+import unittest
+import swd.stack
+
+
+class SwdMock():
+    """Swd Mock class with memory for testing StackMonitor class"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(size)
+        self.read_log = []
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        self.read_log.append((address, size))
+        offset = address - self._address
+        return iter(self.memory[offset:offset + size])
+
+    def fill_mem(self, address, pattern, size, retry=False):
+        """Mock fill_mem"""
+        offset = address - self._address
+        self.memory[offset:offset + size] = (bytes(pattern) * (size // len(pattern) + 1))[:size]
+
+
+RAM = 0x20000000
+
+
+class TestStackMonitor(unittest.TestCase):
+    """Tests for StackMonitor class"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x10000)
+        self._monitor = swd.stack.StackMonitor(self._swd, [
+            (RAM + 0x1000, 0x8000, 'main'),
+            (RAM + 0x9000, 0x100, 'idle'),
+        ])
+        self._monitor.paint()
+
+    def _use(self, address, size):
+        offset = address - RAM
+        self._swd.memory[offset:offset + size] = bytes(size)
+
+    def test_unused(self):
+        """test painted stack is unused"""
+        usage = self._monitor.scan()
+        self.assertEqual([u.used for u in usage], [0, 0])
+        self.assertEqual(usage[1].free, 0x100)
+
+    def test_used(self):
+        """test used part is found with few small reads"""
+        self._use(RAM + 0x1000 + 0x5678, 0x8000 - 0x5678)
+        self._use(RAM + 0x9000 + 0xf0, 0x10)
+        self._swd.read_log = []
+        usage = self._monitor.scan()
+        self.assertEqual(usage[0].watermark, RAM + 0x1000 + 0x5678)
+        self.assertEqual(usage[0].used, 0x8000 - 0x5678)
+        self.assertEqual(usage[1].used, 0x10)
+        self.assertLess(sum(size for _, size in self._swd.read_log), 0x800)
+
+    def test_overflow(self):
+        """test whole stack used"""
+        self._use(RAM + 0x9000, 0x100)
+        usage = self._monitor.scan_region(self._monitor.regions[1])
+        self.assertTrue(usage.overflow)
+        self.assertEqual(usage.used, 0x100)
+
+    def test_unaligned(self):
+        """test unaligned region"""
+        with self.assertRaises(swd.stack.StackException):
+            swd.stack.StackRegion(RAM + 2, 0x100)
+
+
+class TestStackGap(unittest.TestCase):
+    """Tests for painted gap inside used part of stack"""
+
+    def setUp(self):
+        self._swd = SwdMock(RAM, 0x2000)
+        self._monitor = swd.stack.StackMonitor(self._swd, [(RAM, 0x2000)])
+        self._monitor.paint()
+        # used from 0x400, buffer in frame was never written
+        self._swd.memory[0x400:0x2000] = bytes(0x1c00)
+        self._swd.fill_mem(RAM + 0x800, [0xa5] * 4, 0x400)
+
+    def test_binary_search(self):
+        """test binary search expects no painted probe in used part"""
+        self.assertGreater(self._monitor.scan()[0].watermark, RAM + 0x400)
+
+    def test_full(self):
+        """test full scan finds lowest used word"""
+        self._swd.read_log = []
+        usage = self._monitor.scan(full=True)[0]
+        self.assertEqual(usage.watermark, RAM + 0x400)
+        self.assertEqual(usage.used, 0x1c00)
+        self.assertEqual(self._swd.read_log, [(RAM, 0x400), (RAM + 0x400, 0x400)])
+
+    def test_full_unused(self):
+        """test full scan of unused stack"""
+        self._monitor.paint()
+        self.assertEqual(self._monitor.scan(full=True)[0].used, 0)
@@ -0,0 +1,52 @@
+"""Unit tests for startup time (lazy imports)"""
+import subprocess
+import sys
+import unittest
+
+
+def _run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode().split()
+
+
+_ACTION_MODULES = (
+    'swd.stlink', 'swd.stlinkcom', 'swd.cortexm', 'swd.rtt', 'swd.stm32flash', 'swd.tracer',
+    'swd.stack', 'swd.snapshot', 'swd.image', 'swd._elf', 'swd._dump', 'swd._output')
+
+
+class TestLazyImport(unittest.TestCase):
+    """Tests for modules which are imported only when they are used"""
+
+    def test_import_swd(self):
+        """test import of swd does not import USB and NumPy"""
+        self.assertEqual(_run_python(
+            "import sys, swd; "
+            "print('usb.core' in sys.modules, 'numpy' in sys.modules, "
+            "'swd.stlink' in sys.modules)"), ['False', 'False', 'False'])
+
+    def test_import_app(self):
+        """test import of application does not import USB"""
+        self.assertEqual(_run_python(
+            "import sys, swd._app; print('usb.core' in sys.modules)"), ['False'])
+
+    def test_import_app_modules(self):
+        """test import of application does not import modules of actions"""
+        self.assertEqual(_run_python(
+            "import sys, swd._app; print(*sorted(set(%r) & set(sys.modules)))" % (
+                _ACTION_MODULES, )), [])
+
+    def test_import_swd_classes(self):
+        """test public classes are imported on first access"""
+        self.assertEqual(_run_python(
+            "import sys, swd; print('swd.rtt' in sys.modules, swd.Rtt.__module__, "
+            "'swd.rtt' in sys.modules, 'Rtt' in dir(swd))"),
+            ['False', 'swd.rtt', 'True', 'True'])
+
+    def test_version(self):
+        """test printing version does not touch USB"""
+        self.assertEqual(_run_python(
+            "import sys, swd._app; sys.argv = ['pyswd', '--version']\n"
+            "try:\n"
+            "    swd._app.main()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('usb.core' in sys.modules)")[-1], 'False')
@@ -1,6 +1,11 @@
 """Unit tests for stlink.py"""
+import os
+import tempfile
 import unittest
+import swd._cache
 import swd.stlink
+import swd.stlinkcom
+import swd.swd
 
 
 class FncMock():
@@ -74,11 +79,454 @@ class TestStlinkCotor(_TestStlink):
             {'command': [0xf1, 0x80], 'data': None, 'rx_length': 6, 'tout': 200},
             {'command': [0xf5], 'data': None, 'rx_length': 2, 'tout': 200},
             {'command': [0xf2, 0x21], 'data': None, 'rx_length': 0, 'tout': 200},
-            {'command': [0xf2, 0x43, 0x01], 'data': None, 'rx_length': 2, 'tout': 200},
+            {'command': [0xf2, 0x43, 0x01, 0x00], 'data': None, 'rx_length': 2, 'tout': 200},
             {'command': [0xf2, 0x30, 0xa3], 'data': None, 'rx_length': 2, 'tout': 200},
         ])
 
 
+class TestStlinkNrst(_TestStlink):
+    """Tests for driving NRST"""
+
+    def test_set_nrst(self):
+        """test assert and release NRST"""
+        self._com.xfer_mock.set_return_data([[0x80, 0x00], [0x80, 0x00]])
+        self._stlink.set_nrst(True)
+        self._stlink.set_nrst(False)
+        self.assertEqual([call['command'] for call in self._com.xfer_mock.get_call_log()], [
+            [0xf2, 0x3c, 0x00], [0xf2, 0x3c, 0x01]])
+
+    def test_pulse_nrst_error(self):
+        """test error of NRST pulse"""
+        self._com.xfer_mock.set_return_data([[0x09, 0x00]])
+        with self.assertRaises(swd.stlink.StlinkException):
+            self._stlink.pulse_nrst()
+        self.assertEqual(self._com.xfer_mock.get_call_log()[0]['command'], [0xf2, 0x3c, 0x02])
+
+    def test_connect_under_reset(self):
+        """test NRST is asserted before SWD is entered again"""
+        self._com.xfer_mock.set_return_data([
+            [0x02, 0x00], None, [0x80, 0x00], [0x80, 0x00], [0x80, 0x00]])
+        self._stlink.connect_under_reset()
+        self.assertEqual([call['command'] for call in self._com.xfer_mock.get_call_log()], [
+            [0xf5], [0xf2, 0x21], [0xf2, 0x43, 0x01, 0x00],
+            [0xf2, 0x3c, 0x00], [0xf2, 0x30, 0xa3]])
+
+
+class TestStlinkCapabilities(_TestStlink):
+    """Tests for capabilities of ST-Link firmware"""
+
+    def _connect_old(self):
+        """connect ST-Link/V2 with firmware V2J14S6"""
+        com = ComMock()
+        com.xfer_mock.set_return_data([
+            [0x23, 0x86, 0x83, 0x04, 0x48, 0x37],
+            [0x02, 0x00],
+            None,
+            [0x80, 0x00],
+        ])
+        stlink = swd.stlink.Stlink(com=com)
+        com.xfer_mock.get_call_log()
+        return stlink, com
+
+    def test_capabilities(self):
+        """test capabilities of new firmware"""
+        self.assertEqual(self._stlink.get_capabilities(), {
+            'maximum_8bit_data': 64,
+            'maximum_16bit_data': 1024,
+            'maximum_32bit_data': 1024,
+            'last_rw_status2': True,
+        })
+        # Swd use 8 bit access only to align address and size
+        self.assertEqual(self._stlink.MAXIMUM_8BIT_DATA, 4)
+
+    def test_swd_access_width(self):
+        """test Swd reads aligned words by 32 bit access also with new firmware"""
+        com = FaultComMock()
+        stlink = swd.stlink.Stlink(com=com)
+        commands = []
+        xfer = com.xfer
+
+        def logging_xfer(command, data=None, rx_length=0, tout=200):
+            commands.append(command[:2] + [int.from_bytes(bytes(command[6:10]), 'little')])
+            return xfer(command, data, rx_length, tout)
+
+        com.xfer = logging_xfer
+        data = list(swd.swd.Swd(driver=stlink).read_mem(0x101, 106))
+        self.assertEqual(data, list(range(1, 107)))
+        self.assertEqual(commands, [[0xf2, 0x0c, 3], [0xf2, 0x07, 100], [0xf2, 0x0c, 3]])
+
+    def test_old_capabilities(self):
+        """test capabilities of old firmware"""
+        stlink, _ = self._connect_old()
+        self.assertEqual(stlink.get_capabilities(), {
+            'maximum_8bit_data': 64,
+            'maximum_16bit_data': 0,
+            'maximum_32bit_data': 1024,
+            'last_rw_status2': False,
+        })
+        self.assertEqual(swd.stlink.Stlink.MAXIMUM_8BIT_DATA, 4)
+        with self.assertRaises(swd.stlink.StlinkException):
+            stlink.read_mem16(0x20000000, 2)
+
+    def test_read_mem16(self):
+        """test 16 bit read command"""
+        self._com.xfer_mock.set_return_data([[0x34, 0x12]])
+        self.assertEqual(self._stlink.read_mem16(0x40000002, 2), [0x34, 0x12])
+        self.assertEqual(self._com.xfer_mock.get_call_log()[0]['command'], [
+            0xf2, 0x47, 0x02, 0x00, 0x00, 0x40, 0x02, 0x00, 0x00, 0x00])
+
+    def test_write_mem16_unaligned(self):
+        """test 16 bit write with unaligned address"""
+        with self.assertRaises(swd.stlink.StlinkException):
+            self._stlink.write_mem16(0x40000001, [0x34, 0x12])
+
+    def test_last_rw_status2(self):
+        """test last read/write status with fault address"""
+        self._com.xfer_mock.set_return_data([
+            [0x14, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x60, 0x00, 0x00, 0x00, 0x00]])
+        self.assertEqual(self._stlink.get_last_rw_status(), (0x14, 0x60000000))
+        self.assertEqual(self._com.xfer_mock.get_call_log()[0]['command'], [0xf2, 0x3e])
+
+    def test_last_rw_status(self):
+        """test last read/write status of old firmware"""
+        stlink, com = self._connect_old()
+        com.xfer_mock.set_return_data([[0x80, 0x00]])
+        self.assertEqual(stlink.get_last_rw_status(), (0x80, None))
+        self.assertEqual(com.xfer_mock.get_call_log()[0]['command'], [0xf2, 0x3b])
+
+
+class SerialComMock(ComMock):
+    """Com Mock with serial number"""
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        super().__init__()
+        self.serial_reads = 0
+
+    @property
+    def serial_no(self):
+        """Mock serial number"""
+        self.serial_reads += 1
+        return '0123456789AB'
+
+
+class TestStlinkAttach(unittest.TestCase):
+    """Tests for Stlink attach mode"""
+
+    _VERSION = [0x26, 0xc6, 0x83, 0x04, 0x48, 0x37]
+    _IDCODES = [0x80, 0x00, 0x55, 0x55, 0x77, 0x14, 0xb1, 0x0b, 0x00, 0x00, 0x00, 0x00]
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._cache_file = swd._cache.CACHE_FILE
+        swd._cache.CACHE_FILE = os.path.join(self._tmpdir.name, 'pyswd', 'cache.json')
+
+    def tearDown(self):
+        swd._cache.CACHE_FILE = self._cache_file
+        self._tmpdir.cleanup()
+
+    def _attach(self, return_data, swd_frequency=1800000):
+        com = SerialComMock()
+        com.xfer_mock.set_return_data(return_data)
+        stlink = swd.stlink.Stlink(swd_frequency=swd_frequency, com=com, attach=True)
+        return stlink, com.xfer_mock.get_call_log()
+
+    def test_not_in_debug_mode(self):
+        """test attach when ST-Link is not in debug mode, full connection"""
+        stlink, call_log = self._attach([
+            self._VERSION, [0x00, 0x00], None, [0x80, 0x00], [0x80, 0x00]])
+        self.assertEqual([call['command'] for call in call_log], [
+            [0xf1, 0x80], [0xf5], [0xf3, 0x07], [0xf2, 0x43, 0x01, 0x00], [0xf2, 0x30, 0xa3]])
+        self.assertEqual(stlink.get_version().str, 'ST-Link/V2 V2J27S6')
+        self.assertEqual(swd._cache.get('stlink', '0123456789AB'), {
+            'dev': 'V2', 'version': 0x26c6, 'frequency': 1800000})
+
+    def test_connect_without_cache(self):
+        """test normal connection does not read serial number nor write cache"""
+        com = SerialComMock()
+        com.xfer_mock.set_return_data([
+            self._VERSION, [0x02, 0x00], None, [0x80, 0x00], [0x80, 0x00]])
+        swd.stlink.Stlink(com=com)
+        self.assertEqual(com.serial_reads, 0)
+        self.assertFalse(os.path.exists(swd._cache.CACHE_FILE))
+
+    def test_cached(self):
+        """test attach to existing session with cached version and frequency"""
+        swd._cache.put('stlink', '0123456789AB', {
+            'dev': 'V2', 'version': 0x26c6, 'frequency': 1800000})
+        stlink, call_log = self._attach([[0x02, 0x00], self._IDCODES])
+        self.assertEqual([call['command'] for call in call_log], [[0xf5], [0xf2, 0x31]])
+        self.assertEqual(stlink.get_version().str, 'ST-Link/V2 V2J27S6')
+
+    def test_cached_other_frequency(self):
+        """test attach to existing session with different frequency"""
+        swd._cache.put('stlink', '0123456789AB', {
+            'dev': 'V2', 'version': 0x26c6, 'frequency': 1800000})
+        _, call_log = self._attach(
+            [[0x02, 0x00], self._IDCODES, [0x80, 0x00]], swd_frequency=4000000)
+        self.assertEqual([call['command'] for call in call_log], [
+            [0xf5], [0xf2, 0x31], [0xf2, 0x43, 0x00, 0x00]])
+        self.assertEqual(swd._cache.get('stlink', '0123456789AB')['frequency'], 4000000)
+
+    def test_debug_mode_without_target(self):
+        """test attach when ST-Link is in debug mode but target is not connected"""
+        swd._cache.put('stlink', '0123456789AB', {
+            'dev': 'V2', 'version': 0x26c6, 'frequency': 1800000})
+        _, call_log = self._attach([
+            [0x02, 0x00], [0x80] + [0x00] * 11, None, [0x80, 0x00], [0x80, 0x00]])
+        self.assertEqual([call['command'] for call in call_log], [
+            [0xf5], [0xf2, 0x31], [0xf2, 0x21], [0xf2, 0x43, 0x01, 0x00], [0xf2, 0x30, 0xa3]])
+
+
+class FaultComMock():
+    """Com Mock with simulated memory, which fails on selected transfers"""
+
+    def __init__(self, faults=()):
+        self.memory = bytearray(range(256)) * 32
+        self.faults = set(faults)
+        self.transfers = 0
+        self.reconnects = 0
+        self.mode = 0x02
+        self.timeouts = []
+
+    @property
+    def version(self):
+        """Mock version"""
+        return 'V2'
+
+    def reconnect(self):
+        """Mock reconnect"""
+        self.reconnects += 1
+
+    def xfer(self, command, data=None, rx_length=0, tout=200):
+        """Mock xfer with memory commands"""
+        self.transfers += 1
+        if self.transfers in self.faults:
+            raise swd.stlinkcom.StlinkComException("USB Error: simulated")
+        if command[0] == 0xf1:
+            return [0x26, 0xc6, 0x83, 0x04, 0x48, 0x37]
+        if command[0] == 0xf5:
+            return [self.mode, 0x00]
+        if command[:2] == [0xf2, 0x30]:
+            self.mode = 0x02
+        address = int.from_bytes(bytes(command[2:6]), byteorder='little')
+        size = int.from_bytes(bytes(command[6:10]), byteorder='little')
+        if command[:2] in ([0xf2, 0x07], [0xf2, 0x0c]):
+            self.timeouts.append(tout)
+            return list(self.memory[address:address + size])
+        if command[:2] in ([0xf2, 0x08], [0xf2, 0x0d]):
+            self.memory[address:address + size] = bytes(data)
+            return None
+        if rx_length:
+            return [0x80] + [0x00] * (rx_length - 1)
+        return None
+
+
+class TestStlinkReconnect(unittest.TestCase):
+    """Tests for reconnect and repeating of memory transfers after USB error"""
+
+    def _connect(self, swd_frequency=1800000):
+        com = FaultComMock()
+        stlink = swd.stlink.Stlink(swd_frequency=swd_frequency, com=com)
+        com.transfers = 0
+        return stlink, com
+
+    def test_read_retry(self):
+        """test read after USB error"""
+        stlink, com = self._connect()
+        com.faults = {1}
+        self.assertEqual(stlink.read_mem32(0x100, 8), list(range(8)))
+        self.assertEqual(com.reconnects, 1)
+
+    def test_reenter_debug_mode(self):
+        """test SWD is entered again when ST-Link is not in debug mode after reconnect"""
+        stlink, com = self._connect()
+        com.faults = {1}
+        com.mode = 0x01
+        stlink.write_mem32(0x0, [0xaa] * 4, retry=True)
+        self.assertEqual(com.mode, 0x02)
+        self.assertEqual(com.memory[:5], b'\xaa\xaa\xaa\xaa\x04')
+
+    def test_too_many_errors(self):
+        """test error is raised when all attempts fail"""
+        stlink, com = self._connect()
+        com.faults = set(range(1, 100))
+        with self.assertRaises(swd.stlinkcom.StlinkComException):
+            stlink.read_mem32(0x0, 4)
+        self.assertEqual(com.reconnects, swd.stlink.Stlink.RETRIES - 1)
+
+    def test_swd_read_resume(self):
+        """test long read continue from failed chunk"""
+        stlink, com = self._connect()
+        com.faults = {2, 5}
+        data = bytes(swd.swd.Swd(driver=stlink).read_mem(0x10, 4096))
+        self.assertEqual(data, bytes(com.memory[0x10:0x1010]))
+        self.assertEqual(com.reconnects, 2)
+
+    def test_swd_write_resume(self):
+        """test long write continue from failed chunk"""
+        stlink, com = self._connect()
+        com.faults = {3}
+        swd.swd.Swd(driver=stlink).write_mem(0x2, bytes(4096), retry=True)
+        self.assertEqual(com.memory[:0x1004], b'\x00\x01' + bytes(4096) + b'\x02\x03')
+        self.assertEqual(com.reconnects, 1)
+
+    def test_write_not_repeated(self):
+        """test write without retry reconnects and raises error"""
+        stlink, com = self._connect()
+        com.faults = {1}
+        with self.assertRaises(swd.stlinkcom.StlinkComException):
+            stlink.write_mem32(0x0, [0xaa] * 4)
+        self.assertEqual(com.reconnects, 1)
+        self.assertEqual(com.memory[:4], b'\x00\x01\x02\x03')
+
+    def test_set_mem32_not_repeated(self):
+        """test register write is never repeated (it can step core or reset MCU)"""
+        stlink, com = self._connect()
+        com.faults = {1}
+        with self.assertRaises(swd.stlinkcom.StlinkComException):
+            stlink.set_mem32(0xe000ed0c, 0x05fa0004)
+        self.assertEqual(com.reconnects, 1)
+        self.assertEqual(com.transfers, 2)
+
+    def test_swd_write_not_repeated(self):
+        """test Swd.write_mem without retry does not repeat failed chunk"""
+        stlink, com = self._connect()
+        com.faults = {2}
+        with self.assertRaises(swd.stlinkcom.StlinkComException):
+            swd.swd.Swd(driver=stlink).write_mem(0x0, bytes(4096))
+        self.assertEqual(com.reconnects, 1)
+
+    def test_timeout(self):
+        """test timeout depends on size and SWD frequency"""
+        stlink, com = self._connect(swd_frequency=25000)
+        stlink.read_mem32(0x0, 1024)
+        stlink.read_mem32(0x0, 4)
+        self.assertEqual(com.timeouts, [1966, 200])
+
+
+class FreqComMock(FaultComMock):
+    """Com Mock with simulated memory, which corrupt reads at high SWD frequency"""
+
+    def __init__(self, min_divisor):
+        super().__init__()
+        self.min_divisor = min_divisor
+        self.divisor = 1
+        self.divisors = []
+        self.dhcsr = 0x00000001
+        self.dhcsr_writes = []
+        self.halted_writes = []
+        self.write_addresses = set()
+        self.rw_status = 0x80
+
+    @property
+    def serial_no(self):
+        """Mock serial number"""
+        return '0123456789AB'
+
+    def xfer(self, command, data=None, rx_length=0, tout=200):
+        """Mock xfer with frequency setting and corrupted reads"""
+        if command[:2] == [0xf2, 0x43]:
+            self.divisor = command[2] | command[3] << 8
+            self.divisors.append(self.divisor)
+        if command[:2] == [0xf2, 0x31]:
+            return [0x80, 0x00, 0x00, 0x00, 0x77, 0x14, 0xb1, 0x0b, 0x00, 0x00, 0x00, 0x00]
+        if command[:2] == [0xf2, 0x36] and command[2:6] == [0xf0, 0xed, 0x00, 0xe0]:
+            return [0x80, 0x00, 0x00, 0x00] + list(self.dhcsr.to_bytes(4, byteorder='little'))
+        if command[:2] == [0xf2, 0x36] and command[2:6] == [0x00, 0xed, 0x00, 0xe0]:
+            return [0x80, 0x00, 0x00, 0x00, 0x41, 0xc2, 0x0f, 0x41]
+        if command[:2] == [0xf2, 0x35] and command[2:6] == [0xf0, 0xed, 0x00, 0xe0]:
+            value = int.from_bytes(bytes(command[6:10]), byteorder='little')
+            self.dhcsr_writes.append(value)
+            self.dhcsr = (value & 0x0f) | (0x00020000 if value & 0x02 else 0)
+            return [0x80, 0x00]
+        if command[:2] == [0xf2, 0x3e]:
+            return [self.rw_status] + [0x00] * 11
+        if command[:2] == [0xf2, 0x08]:
+            self.halted_writes.append(bool(self.dhcsr & 0x00020000))
+            self.write_addresses.add(int.from_bytes(bytes(command[2:6]), byteorder='little'))
+        if command[:2] in ([0xf2, 0x07], [0xf2, 0x08]) and command[5] == 0x20:
+            # SRAM is simulated at start of memory
+            command = command[:5] + [0x00] + command[6:]
+        res = super().xfer(command, data, rx_length, tout)
+        if command[:2] == [0xf2, 0x07] and self.divisor < self.min_divisor:
+            res[0] ^= 0x01
+        return res
+
+
+class TestStlinkAutoFrequency(unittest.TestCase):
+    """Tests for automatic selection of SWD frequency"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._cache_file = swd._cache.CACHE_FILE
+        swd._cache.CACHE_FILE = os.path.join(self._tmpdir.name, 'cache.json')
+
+    def tearDown(self):
+        swd._cache.CACHE_FILE = self._cache_file
+        self._tmpdir.cleanup()
+
+    def test_select(self):
+        """test fastest reliable frequency is selected and memory is restored"""
+        com = FreqComMock(min_divisor=3)
+        memory = bytes(com.memory)
+        stlink = swd.stlink.Stlink(swd_frequency='auto', com=com)
+        self.assertEqual(stlink.get_swd_frequency(), 950000)
+        self.assertEqual(com.divisors, [1, 798, 0, 1, 2, 3])
+        self.assertEqual(bytes(com.memory), memory)
+        self.assertEqual(swd._cache.get('frequency', '0123456789AB:0bb11477'), 950000)
+        # core is halted during all writes and runs again after test
+        self.assertTrue(all(com.halted_writes))
+        self.assertEqual(com.dhcsr_writes, [0xa05f0003, 0xa05f0001])
+
+    def test_halted_core_stays_halted(self):
+        """test core which was halted is not started by test"""
+        com = FreqComMock(min_divisor=0)
+        com.dhcsr = 0x00020003
+        swd.stlink.Stlink(swd_frequency='auto', com=com)
+        self.assertEqual(com.dhcsr_writes, [])
+
+    def test_configured_address(self):
+        """test pattern test at selected address"""
+        com = FreqComMock(min_divisor=0)
+        swd.stlink.Stlink(swd_frequency='auto', com=com, auto_frequency_address=0x100)
+        self.assertEqual(com.write_addresses, {0x100})
+
+    def test_no_ram(self):
+        """test clear error when test memory can not be accessed"""
+        com = FreqComMock(min_divisor=0)
+        com.rw_status = 0x14
+        with self.assertRaises(swd.stlink.StlinkException) as context:
+            swd.stlink.Stlink(swd_frequency='auto', com=com)
+        self.assertIn('0x20000000', str(context.exception))
+        # core runs again after failed test
+        self.assertEqual(com.dhcsr_writes, [0xa05f0003, 0xa05f0001])
+
+    def test_attach_read_only(self):
+        """test attach mode does not write memory nor halt core"""
+        com = FreqComMock(min_divisor=3)
+        com.mode = 0x02
+        stlink = swd.stlink.Stlink(swd_frequency='auto', com=com, attach=True)
+        self.assertEqual(stlink.get_swd_frequency(), 4000000)
+        self.assertEqual(com.halted_writes, [])
+        self.assertEqual(com.dhcsr_writes, [])
+
+    def test_cached(self):
+        """test cached frequency is used without pattern test"""
+        swd._cache.put('frequency', '0123456789AB:0bb11477', 480000)
+        com = FreqComMock(min_divisor=3)
+        stlink = swd.stlink.Stlink(swd_frequency='auto', com=com)
+        self.assertEqual(stlink.get_swd_frequency(), 480000)
+        self.assertEqual(com.divisors, [1, 7])
+
+    def test_16bit_divisor(self):
+        """test frequency with 16 bit divisor"""
+        com = FreqComMock(min_divisor=0)
+        stlink = swd.stlink.Stlink(swd_frequency=15000, com=com)
+        self.assertEqual(stlink.get_swd_frequency(), 15000)
+        self.assertEqual(com.divisors, [265])
+
+
 class TestStlinkVersion(_TestStlink):
     """Tests for Stlink.get_version()"""
 
@@ -154,6 +602,27 @@ class TestStlinkGetReg(_TestStlink):
         self.assertEqual(coreid, 0x20001000)
 
 
+class TestStlinkGetRegList(_TestStlink):
+    """Tests for Stlink.get_reg_list()"""
+
+    def test(self):
+        """test getting list of registers"""
+        self._com.xfer_mock.set_return_data([
+            [0x80, 0x00, 0x00, 0x00, 0x04, 0x00, 0x00, 0x00],
+            [0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x80, 0x3f],
+        ])
+        regs = self._stlink.get_reg_list([20, 64])
+        self.assertEqual(self._com.xfer_mock.get_call_log(), [
+            {'command': [
+                0xf2, 0x33, 0x14,
+            ], 'data': None, 'rx_length': 8, 'tout': 200},
+            {'command': [
+                0xf2, 0x33, 0x40,
+            ], 'data': None, 'rx_length': 8, 'tout': 200},
+        ])
+        self.assertEqual(regs, [0x00000004, 0x3f800000])
+
+
 class TestStlinkSetReg(_TestStlink):
     """Tests for Stlink.set_reg()"""
 
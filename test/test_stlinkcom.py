@@ -0,0 +1,80 @@
+"""Unit tests for stlinkcom.py"""
+import threading
+import time
+import unittest
+import unittest.mock
+import swd._lock
+import swd.stlinkcom
+
+
+class DevMock():
+    """USB device mock which logs writes and reads"""
+
+    def __init__(self):
+        self.log = []
+
+    def write(self, data, tout=200):
+        """Mock write"""
+        self.log.append(('write', data[0]))
+        time.sleep(0.0005)
+
+    def read(self, size, tout=200):
+        """Mock read"""
+        self.log.append(('read', size))
+        return [0] * size
+
+
+def _create_com():
+    com = swd.stlinkcom.StlinkCom.__new__(swd.stlinkcom.StlinkCom)
+    com.transfers = 0
+    com.lock = swd._lock.ProbeLock()
+    com._dev = DevMock()
+    return com
+
+
+class TestStlinkComThreads(unittest.TestCase):
+    """Tests for transfers from more threads"""
+
+    def test_not_interleaved(self):
+        """test command, data and response of transfer are not interleaved"""
+        com = _create_com()
+
+        def worker(command):
+            for _ in range(20):
+                com.xfer([command], data=[command], rx_length=command)
+
+        threads = [threading.Thread(target=worker, args=(cmd, )) for cmd in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log = com._dev.log
+        self.assertEqual(com.transfers, 60)
+        for index in range(0, len(log), 3):
+            command = log[index][1]
+            self.assertEqual(
+                log[index:index + 3],
+                [('write', command), ('write', command), ('read', command)])
+        self.assertEqual(com.lock.acquisitions, 60)
+
+
+class SerialDevMock(DevMock):
+    """USB device mock with serial number"""
+
+    def __init__(self, serial_no):
+        super().__init__()
+        self.serial_no = serial_no
+
+
+class TestStlinkComReconnect(unittest.TestCase):
+    """Tests for opening same device again"""
+
+    def test_same_serial(self):
+        """test device opened without serial number is opened again by its serial number"""
+        devices = [SerialDevMock('066DFF535')]
+        with unittest.mock.patch.object(
+                swd.stlinkcom.StlinkCom, '_find_all_devices', lambda: devices):
+            com = swd.stlinkcom.StlinkCom()
+            devices = [SerialDevMock('0670FF484'), SerialDevMock('066DFF535')]
+            com.reconnect()
+        self.assertIs(com._dev, devices[1])
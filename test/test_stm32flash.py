@@ -0,0 +1,277 @@
+"""Unit tests for stm32flash.py"""
+import unittest
+import swd.cortexm
+import swd.stm32flash
+import swd.stubs
+
+
+class Stm32Mock():
+    """Swd Mock class simulating STM32 for testing Stm32Flash class
+
+    Loader is not executed, it is simulated by Python code.
+    """
+
+    DHCSR = swd.cortexm.CortexM.DHCSR_REG
+
+    def __init__(self, dev_id, flash_size, family):
+        """MOCK CONSTRUCTOR"""
+        self._family = family
+        self.dev_id = dev_id
+        self.flash = bytearray(b'\xff' * flash_size)
+        self.sram = bytearray(0x1000)
+        self.regs = [0] * 21
+        self.flash_regs = {family.CR: family.CR_LOCK, family.SR: 0}
+        self.flash_size_reg = flash_size // 1024
+        self.halted = False
+        self.reset = False
+        self.erased = []
+        self.log = []
+
+    def _mem(self, address):
+        if 0x08000000 <= address < 0x08000000 + len(self.flash):
+            return self.flash, address - 0x08000000
+        if 0x20000000 <= address < 0x20000000 + len(self.sram):
+            return self.sram, address - 0x20000000
+        raise IndexError("address 0x%08x out of memory" % address)
+
+    def read_mem(self, address, size):
+        """Mock read_mem"""
+        if size == 2 and address in (0x1ffff7e0, 0x1fff7a22):
+            return iter(self.flash_size_reg.to_bytes(2, byteorder='little'))
+        mem, offset = self._mem(address)
+        return iter(mem[offset:offset + size])
+
+    def write_mem(self, address, data, retry=False):
+        """Mock write_mem"""
+        data = bytes(data)
+        self.log.append(('write_mem', address, len(data)))
+        mem, offset = self._mem(address)
+        mem[offset:offset + len(data)] = data
+
+    def get_mem32(self, address):
+        """Mock get_mem32"""
+        if address == 0xe0042000:
+            return 0x10000000 | self.dev_id
+        if address == self.DHCSR:
+            self.log.append(('is_halted', ))
+            dhcsr = swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT if self.halted else 0
+            if self.reset:
+                # S_RESET_ST is cleared by read
+                dhcsr |= swd.cortexm.CortexM.DHCSR_STATUS_RESET_BIT
+                self.reset = False
+            return dhcsr
+        return self.flash_regs.get(address, 0)
+
+    def set_mem32(self, address, data):
+        """Mock set_mem32"""
+        family = self._family
+        if address == swd.cortexm.CortexM.AIRCR_REG:
+            self.reset = True
+        elif address == self.DHCSR:
+            if data & swd.cortexm.CortexM.DHCSR_HALT_BIT:
+                self.halted = True
+            elif data & swd.cortexm.CortexM.DHCSR_DEBUGEN_BIT:
+                self.log.append(('run', self.regs[0]))
+                self._run_loader()
+        elif address == family.KEYR:
+            if data == 0xcdef89ab:
+                self.flash_regs[family.CR] = 0
+        elif address == family.CR:
+            self.flash_regs[family.CR] = data
+            if data & family.CR_STRT:
+                self._erase(data)
+        elif address == family.SR:
+            self.flash_regs[family.SR] &= ~data
+        elif address == getattr(family, 'AR', None):
+            self.flash_regs[address] = data
+
+    def _erase(self, cr_value):
+        family = self._family
+        if cr_value & family.CR_MER:
+            self.flash[:] = b'\xff' * len(self.flash)
+            self.erased.append('all')
+            return
+        if hasattr(family, 'AR'):
+            address = self.flash_regs[family.AR]
+            sector = [s for s in self._sectors if s.address == address][0]
+        else:
+            number = (cr_value >> family.CR_SNB_SHIFT) & 0x1f
+            sector = [s for s in self._sectors if s.number == number][0]
+        offset = sector.address - 0x08000000
+        self.flash[offset:offset + sector.size] = b'\xff' * sector.size
+        self.erased.append(sector.number)
+
+    def _run_loader(self):
+        """simulate loader: program R2 bytes from R0 to R1"""
+        self.halted = False
+        src, dst, size = self.regs[0], self.regs[1], self.regs[2]
+        data = bytes(self.read_mem(src, size))
+        offset = dst - 0x08000000
+        for index, byte in enumerate(data):
+            self.flash[offset + index] &= byte
+        self.halted = True
+
+    def set_reg(self, register, data):
+        """Mock set_reg"""
+        self.regs[register] = data
+
+    def get_reg_all(self):
+        """Mock get_reg_all"""
+        return list(self.regs)
+
+
+class _TestStm32Flash(unittest.TestCase):
+    """Base class for testing Stm32Flash class"""
+
+    DEV_ID = 0x413
+    FLASH_SIZE = 1024 * 1024
+    FAMILY = swd.stm32flash._FamilyF4
+
+    def setUp(self):
+        self._swd = Stm32Mock(self.DEV_ID, self.FLASH_SIZE, self.FAMILY)
+        self._flash = swd.stm32flash.Stm32Flash(self._swd, buffer_size=0x100)
+        self._swd._sectors = self._flash.sectors
+
+
+class TestStm32FlashF4(_TestStm32Flash):
+    """Tests for STM32F4"""
+
+    def test_device(self):
+        """test device detection and sector map"""
+        self.assertEqual(self._flash.name, 'STM32F405/F407')
+        self.assertEqual(self._flash.flash_size, 1024 * 1024)
+        self.assertEqual(len(self._flash.sectors), 12)
+        self.assertEqual(self._flash.sectors[4].address, 0x08010000)
+        self.assertEqual(self._flash.sectors[4].size, 0x10000)
+        self.assertEqual(self._flash.sectors[11].address, 0x080e0000)
+
+    def test_get_sectors(self):
+        """test sectors overlapping range"""
+        sectors = self._flash.get_sectors(0x08003ff0, 0x20)
+        self.assertEqual([s.number for s in sectors], [0, 1])
+
+    def test_write(self):
+        """test erase and program with double buffering"""
+        self._swd.flash[0x4000:0x4100] = bytes(0x100)
+        data = bytes(range(256)) * 3 + b'\x01\x02'
+        with self._flash as flash:
+            flash.write(0x08004000, data)
+        self.assertEqual(self._swd.erased, [1])
+        self.assertEqual(bytes(self._swd.flash[0x4000:0x4000 + len(data)]), data)
+        self.assertEqual(self._swd.flash[0x4000 + len(data):0x4000 + len(data) + 2], b'\xff\xff')
+        self.assertEqual(self._swd.flash_regs[self.FAMILY.CR], self.FAMILY.CR_LOCK)
+        # next buffer is written before waiting for finish of previous
+        log = self._swd.log
+        runs = [index for index, entry in enumerate(log) if entry[0] == 'run']
+        self.assertEqual(len(runs), 4)
+        self.assertEqual(log[runs[0] + 1], ('write_mem', 0x20000140, 0x100))
+        self.assertEqual(log[runs[1] + 1], ('write_mem', 0x20000040, 0x100))
+
+    def test_out_of_flash(self):
+        """test program data out of flash"""
+        with self.assertRaises(swd.stm32flash.FlashException):
+            self._flash.program(0x080ffff0, bytes(0x20))
+
+    def test_erase_all(self):
+        """test mass erase"""
+        self._swd.flash[0:4] = bytes(4)
+        self._flash.erase_all()
+        self.assertEqual(self._swd.erased, ['all'])
+        self.assertEqual(self._swd.flash[0:4], b'\xff' * 4)
+
+
+class TestStm32FlashF1(_TestStm32Flash):
+    """Tests for STM32F1"""
+
+    DEV_ID = 0x410
+    FLASH_SIZE = 128 * 1024
+    FAMILY = swd.stm32flash._FamilyF1
+
+    def test_device(self):
+        """test device detection and sector map"""
+        self.assertEqual(self._flash.family, 'F0/F1/F3')
+        self.assertEqual(len(self._flash.sectors), 128)
+
+    def test_write_unaligned(self):
+        """test write to unaligned address"""
+        self._swd.flash[0x400:0x800] = bytes(0x400)
+        self._flash.write(0x08000401, b'\x11\x22\x33')
+        self.assertEqual(self._swd.erased, [1])
+        self.assertEqual(bytes(self._swd.flash[0x400:0x405]), b'\xff\x11\x22\x33\xff')
+
+
+class TestStm32FlashLoader(unittest.TestCase):
+    """Tests for flash loader code"""
+
+    def test_size(self):
+        """test loaders fit into reserved space and end with BKPT"""
+        for family in (
+                swd.stm32flash._FamilyF1,
+                swd.stm32flash._FamilyF4,
+                swd.stm32flash._FamilyL4):
+            self.assertLessEqual(len(family.LOADER), swd.stm32flash.Stm32Flash.LOADER_SIZE)
+            self.assertEqual(family.LOADER[-2:], b'\x00\xbe')
+
+    def test_f1_loader(self):
+        """test F1 loader instructions"""
+        self.assertEqual(swd.stm32flash._FamilyF1.LOADER, swd.stubs.thumb(
+            0x8804, 0x800c, 0x681c, 0x0864, 0xd2fc, 0x3002, 0x3102, 0x3a02, 0xd1f6, 0xbe00))
+
+
+class TestStm32FlashUnsupported(unittest.TestCase):
+    """Tests for unsupported device"""
+
+    def test(self):
+        """test unsupported device"""
+        mock = Stm32Mock(0x999, 1024, swd.stm32flash._FamilyF1)
+        with self.assertRaises(swd.stm32flash.FlashException):
+            swd.stm32flash.Stm32Flash(mock)
+
+
+class TestStm32FlashPlan(_TestStm32Flash):
+    """Tests for Stm32Flash.plan()"""
+
+    DEV_ID = 0x410
+    FLASH_SIZE = 64 * 1024
+    FAMILY = swd.stm32flash._FamilyF1
+
+    def test_plan(self):
+        """test blank, same and erased sectors"""
+        self._swd.flash[0x400:0x410] = b'\x11' * 16
+        self._swd.flash[0x800:0x810] = b'\x22' * 16
+        self._swd.flash[0xc08:0xc10] = b'\x33' * 8
+        plan = self._flash.plan([
+            (0x08000400, b'\x11' * 16),
+            (0x08000800, b'\x44' * 16),
+            (0x08000c00, b'\x55' * 8),
+            (0x08001000, b'\x66' * 0x400),
+        ])
+        self.assertEqual([s.number for s in plan.same], [1])
+        self.assertEqual([s.number for s in plan.erase], [2])
+        self.assertEqual([s.number for s in plan.blank], [3, 4])
+        self.assertEqual([(a, len(d)) for a, d in plan.segments], [
+            (0x08000800, 16), (0x08000c00, 8), (0x08001000, 0x400)])
+        self.assertAlmostEqual(plan.time_saved, 3 * 0.02 + 8 * 0.0000525)
+
+    def test_unit_not_blank(self):
+        """test programming unit partially covered by data must be blank"""
+        self._swd.flash[0x400] = 0
+        plan = self._flash.plan([(0x08000401, b'\x01')])
+        self.assertEqual([s.number for s in plan.erase], [1])
+
+    def test_write_segments(self):
+        """test only needed sectors are erased"""
+        self._swd.flash[0x800:0x810] = b'\x22' * 16
+        self._flash.write_segments([
+            (0x08000000, b'\x01' * 0x10),
+            (0x08000800, b'\x02' * 0x10),
+        ])
+        self.assertEqual(self._swd.erased, [2])
+        self.assertEqual(bytes(self._swd.flash[0x800:0x810]), b'\x02' * 16)
+        self.assertEqual(bytes(self._swd.flash[0:0x10]), b'\x01' * 16)
+
+    def test_is_blank(self):
+        """test blank check"""
+        self.assertTrue(self._flash.is_blank(0x08000000, 0x2000))
+        self._swd.flash[0x1fff] = 0
+        self.assertFalse(self._flash.is_blank(0x08000000, 0x2000))
@@ -1,6 +1,10 @@
 """Unit tests for stlink.py"""
+import hashlib
+import threading
 import unittest
+import zlib
 import swd
+import swd._lock
 
 
 class FncMock():
@@ -875,3 +879,241 @@ class TestFillMemUnalignedAddress(_TestSwd):
         self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
             {'address': 0x76000058, 'data': data[63:1087]},
         ])
+
+
+class Mem16DrvMock(DrvMock):
+    """Driver Mock class with 16 bit memory access"""
+
+    MAXIMUM_16BIT_DATA = 1024
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        super().__init__()
+        self.read_mem16_mock = FncMock(list())
+        self.write_mem16_mock = FncMock()
+
+    def read_mem16(self, address, size):
+        """Mock read_mem16"""
+        return self.read_mem16_mock.fnc(
+            address=address,
+            size=size)
+
+    def write_mem16(self, address, data):
+        """Mock write_mem16"""
+        return self.write_mem16_mock.fnc(
+            address=address,
+            data=data)
+
+
+class TestMem16(unittest.TestCase):
+    """Tests for Swd.read_mem16 and Swd.write_mem16"""
+
+    def test_capabilities(self):
+        """test capabilities of driver without get_capabilities"""
+        self.assertEqual(swd.Swd(driver=DrvMock()).get_capabilities(), {
+            'maximum_8bit_data': 64,
+            'maximum_16bit_data': 0,
+            'maximum_32bit_data': 1024,
+        })
+
+    def test_read(self):
+        """test 16 bit read is split by maximum transfer size"""
+        drv = Mem16DrvMock()
+        drv.read_mem16_mock.set_return_data([[1] * 1024, [2] * 6])
+        data = list(swd.Swd(driver=drv).read_mem16(0x40000002, 1030))
+        self.assertEqual(data, [1] * 1024 + [2] * 6)
+        self.assertEqual(drv.read_mem16_mock.get_call_log(), [
+            {'address': 0x40000002, 'size': 1024},
+            {'address': 0x40000402, 'size': 6},
+        ])
+
+    def test_write(self):
+        """test 16 bit write"""
+        drv = Mem16DrvMock()
+        swd.Swd(driver=drv).write_mem16(0x40000002, [1, 2])
+        self.assertEqual(drv.write_mem16_mock.get_call_log(), [
+            {'address': 0x40000002, 'data': [1, 2]},
+        ])
+        self.assertEqual(drv.write_mem8_mock.get_call_log(), [])
+
+    def test_write_fallback(self):
+        """test driver without 16 bit access use write_mem"""
+        drv = DrvMock()
+        swd.Swd(driver=drv).write_mem16(0x40000000, [1, 2, 3, 4])
+        self.assertEqual(drv.write_mem32_mock.get_call_log(), [
+            {'address': 0x40000000, 'data': [1, 2, 3, 4]},
+        ])
+
+    def test_unaligned(self):
+        """test unaligned address"""
+        with self.assertRaises(swd.swd.SwdException):
+            swd.Swd(driver=Mem16DrvMock()).write_mem16(0x40000001, [1, 2])
+
+
+class MemDrvMock():
+    """Driver Mock class with memory for testing streaming reads"""
+
+    MAXIMUM_8BIT_DATA = 64
+    MAXIMUM_32BIT_DATA = 1024
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        self._address = address
+        self.memory = bytearray(size)
+        self.read_log = []
+
+    def _read(self, address, size):
+        self.read_log.append((address, size))
+        offset = address - self._address
+        return list(self.memory[offset:offset + size])
+
+    def read_mem8(self, address, size):
+        """Mock read_mem8"""
+        return self._read(address, size)
+
+    def read_mem32(self, address, size):
+        """Mock read_mem32"""
+        return self._read(address, size)
+
+
+class LockedMemDrvMock(MemDrvMock):
+    """Driver Mock class which hold probe lock for every read (like StlinkCom)"""
+
+    def __init__(self, address, size):
+        """MOCK CONSTRUCTOR"""
+        super().__init__(address, size)
+        self.lock = swd._lock.ProbeLock()
+
+    def _read(self, address, size):
+        with self.lock:
+            return super()._read(address, size)
+
+
+class _TestSwdMemory(unittest.TestCase):
+    """Base class for testing Swd class with memory"""
+
+    RAM = 0x20000000
+
+    def setUp(self):
+        self._drv = MemDrvMock(self.RAM, 0x4000)
+        self._drv.memory[:] = bytes(range(256)) * 64
+        self._swd = swd.Swd(driver=self._drv)
+
+
+class TestReadChunks(_TestSwdMemory):
+    """Tests for Swd.read_chunks"""
+
+    def test_prefetch(self):
+        """test chunks are same with and without prefetch"""
+        for prefetch in (False, True):
+            chunks = list(self._swd.read_chunks(self.RAM + 2, 0x900, prefetch=prefetch))
+            self.assertEqual([(a, len(d)) for a, d in chunks], [
+                (self.RAM + 2, 1022), (self.RAM + 1024, 1024), (self.RAM + 2048, 258)])
+            self.assertEqual(b''.join(d for _, d in chunks), bytes(self._drv.memory[2:0x902]))
+
+    def test_caller_holds_lock(self):
+        """test checksum inside with lock does not wait for prefetch thread"""
+        drv = LockedMemDrvMock(self.RAM, 0x4000)
+        dev = swd.Swd(driver=drv)
+        result = []
+
+        def worker():
+            with dev.lock:
+                result.append(dev.checksum(self.RAM, 0x4000))
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(result, ['%08x' % zlib.crc32(bytes(0x4000))])
+
+    def test_stop(self):
+        """test prefetch stops when iteration is closed"""
+        chunks = self._swd.read_chunks(self.RAM, 0x4000)
+        next(chunks)
+        chunks.close()
+        self.assertLess(len(self._drv.read_log), 4)
+
+
+class TestVerify(_TestSwdMemory):
+    """Tests for Swd.verify"""
+
+    def test_same(self):
+        """test verify of same data"""
+        self.assertEqual(self._swd.verify(self.RAM, bytes(self._drv.memory)), [])
+
+    def test_mismatches(self):
+        """test mismatching ranges are merged over chunk boundary"""
+        data = bytearray(self._drv.memory[:0x1000])
+        data[0x3fe:0x402] = b'\xaa' * 4
+        data[0x800] ^= 0xff
+        self.assertEqual(self._swd.verify(self.RAM, data), [
+            (self.RAM + 0x3fe, 4), (self.RAM + 0x800, 1)])
+
+    def test_max_mismatches(self):
+        """test reading stops after max_mismatches"""
+        data = bytes(0x4000)
+        self.assertEqual(len(self._swd.verify(self.RAM, data, max_mismatches=3)), 3)
+        self.assertLess(len(self._drv.read_log), 4)
+
+
+class TestChecksum(_TestSwdMemory):
+    """Tests for Swd.checksum"""
+
+    def test_crc32(self):
+        """test CRC32 of memory"""
+        self.assertEqual(
+            self._swd.checksum(self.RAM, 0x3000),
+            '%08x' % zlib.crc32(bytes(self._drv.memory[:0x3000])))
+
+    def test_sha256(self):
+        """test SHA-256 of memory"""
+        self.assertEqual(
+            self._swd.checksum(self.RAM + 1, 0x1001, 'sha256'),
+            hashlib.sha256(bytes(self._drv.memory[1:0x1002])).hexdigest())
+
+    def test_unsupported(self):
+        """test unsupported hash algorithm"""
+        with self.assertRaises(swd.swd.SwdException):
+            self._swd.checksum(self.RAM, 4, 'nothing')
+
+
+class TestFind(_TestSwdMemory):
+    """Tests for Swd.find"""
+
+    def test_all(self):
+        """test all matches are found"""
+        self.assertEqual(
+            self._swd.find(b'\x10\x11', self.RAM, self.RAM + 0x400),
+            [self.RAM + 0x10, self.RAM + 0x110, self.RAM + 0x210, self.RAM + 0x310])
+
+    def test_chunk_boundary(self):
+        """test match crossing chunk boundary"""
+        self._drv.memory[0x3fe:0x402] = b'SWD!'
+        self.assertEqual(
+            self._swd.find(b'SWD!', self.RAM, self.RAM + 0x800), [self.RAM + 0x3fe])
+
+    def test_count(self):
+        """test reading stops on first match"""
+        self._drv.memory[0x20:0x24] = b'\xef\xbe\xad\xde'
+        self.assertEqual(
+            self._swd.find(b'\xef\xbe\xad\xde', self.RAM, self.RAM + 0x4000, count=1,
+                           prefetch=False),
+            [self.RAM + 0x20])
+        self.assertEqual(len(self._drv.read_log), 1)
+
+    def test_wildcard_and_mask(self):
+        """test wildcard bytes and masked nibbles"""
+        self.assertEqual(
+            self._swd.find([0x41, None, 0x43], self.RAM, self.RAM + 0x200),
+            [self.RAM + 0x41, self.RAM + 0x141])
+        self.assertEqual(
+            self._swd.find(b'\x00\x0f', self.RAM, self.RAM + 0x100, mask=b'\x00\x0f'),
+            [self.RAM + offset for offset in range(0x0e, 0x100, 0x10)])
+
+    def test_align(self):
+        """test only aligned matches are reported"""
+        self._drv.memory[0x181:0x183] = b'\x00\x01'
+        self.assertEqual(
+            self._swd.find(b'\x00\x01', self.RAM, self.RAM + 0x200, align=4),
+            [self.RAM, self.RAM + 0x100])
@@ -0,0 +1,91 @@
+"""Unit tests for tracer.py"""
+import os
+import tempfile
+import unittest
+import swd.cortexm
+import swd.tracer
+
+
+class SwdMock():
+    """Swd Mock class simulating stepping core for testing StepTracer class"""
+
+    def __init__(self):
+        """MOCK CONSTRUCTOR"""
+        self.regs = [0] * 21
+        self.regs[15] = 0x08000100
+        self.dhcsr = 0
+        self.transfers = 0
+
+    def get_reg_all(self):
+        """Mock get_reg_all"""
+        self.transfers += 1
+        return list(self.regs)
+
+    def get_mem32(self, address):
+        """Mock get_mem32"""
+        self.transfers += 1
+        return self.dhcsr
+
+    def set_mem32(self, address, data):
+        """Mock set_mem32"""
+        self.transfers += 1
+        if data & swd.cortexm.CortexM.DHCSR_HALT_BIT:
+            self.dhcsr = swd.cortexm.CortexM.DHCSR_STATUS_HALT_BIT
+        elif data & swd.cortexm.CortexM.DHCSR_STEP_BIT:
+            self.regs[15] += 2
+            self.regs[0] += 1
+
+
+class _TestStepTracer(unittest.TestCase):
+    """Base class for testing StepTracer class"""
+
+    def setUp(self):
+        self._swd = SwdMock()
+        self._cortexm = swd.cortexm.CortexM(self._swd)
+
+
+class TestStepTracer(_TestStepTracer):
+    """Tests for StepTracer.trace()"""
+
+    def test_trace(self):
+        """test tracing PC with two transfers for each step"""
+        trace = swd.tracer.StepTracer(self._cortexm).trace(100)
+        self.assertEqual(len(trace), 100)
+        self.assertEqual(trace.pc[0], 0x08000102)
+        self.assertEqual(trace.pc[-1], 0x080001c8)
+        # is_halted, halt confirmed by DHCSR read and two transfers for each step
+        self.assertEqual(self._swd.transfers, 3 + 2 * 100)
+
+    def test_registers(self):
+        """test tracing selected registers"""
+        trace = swd.tracer.StepTracer(self._cortexm, ['r0']).trace(3)
+        self.assertEqual(trace.registers, ['PC', 'R0'])
+        self.assertEqual(trace[1], {'PC': 0x08000104, 'R0': 2})
+        self.assertEqual(trace[-1], {'PC': 0x08000106, 'R0': 3})
+
+    def test_stop_address(self):
+        """test stop on address"""
+        trace = swd.tracer.StepTracer(self._cortexm).trace(100, stop_addresses=[0x08000108])
+        self.assertEqual(len(trace), 4)
+
+    def test_stop_condition(self):
+        """test stop on condition"""
+        trace = swd.tracer.StepTracer(self._cortexm, ['R0']).trace(
+            100, stop=lambda regs: regs['R0'] == 10)
+        self.assertEqual(len(trace), 10)
+
+    def test_wrong_register(self):
+        """test wrong register name"""
+        with self.assertRaises(swd.tracer.TracerException):
+            swd.tracer.StepTracer(self._cortexm, ['X0'])
+
+    def test_save_load(self):
+        """test saving and loading trace"""
+        trace = swd.tracer.StepTracer(self._cortexm, ['R0']).trace(5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'trace.bin')
+            trace.save(filename)
+            self.assertEqual(os.path.getsize(filename), 16 + 2 * 8 + 5 * 2 * 4)
+            loaded = swd.tracer.Trace.load(filename)
+        self.assertEqual(loaded.registers, ['PC', 'R0'])
+        self.assertEqual(list(loaded.data), list(trace.data))